@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import dataclasses
+import json
+import logging
+import multiprocessing as mp
+import os
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+from app.config import AppConfig
+from app.db import ConversationRepository, Database
+
+AUDIO_EXTENSIONS = {".wav", ".mp3", ".flac", ".ogg", ".m4a"}
+
+logger = logging.getLogger(__name__)
+
+# Per-worker state, filled by _init_worker in each pool process
+_worker: dict[str, Any] = {}
+
+
+def iter_inputs(source: Path) -> list[str]:
+    """
+    Resolve a batch source into audio paths.
+
+    `source` is a directory (searched recursively for audio files) or a
+    manifest: `.jsonl` with a `path` field per line, or plain text with one
+    path per line. Relative manifest paths are resolved against its folder.
+    """
+    source = Path(source)
+    if source.is_dir():
+        return sorted(
+            str(p) for p in source.rglob("*") if p.suffix.lower() in AUDIO_EXTENSIONS
+        )
+
+    paths = []
+    with open(source, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if source.suffix == ".jsonl":
+                line = json.loads(line)["path"]
+            path = Path(line)
+            if not path.is_absolute():
+                path = source.parent / path
+            paths.append(str(path))
+    return paths
+
+
+def _init_worker(config: AppConfig, num_threads: int) -> None:
+    """Load one Whisper model + NLU/decision layer per worker process."""
+    from app.decision.engine import DecisionEngine
+    from app.nlu.intent_classifier import build_intent_classifier
+    from stt_module.stt import WhisperSTT
+
+    _worker["stt"] = WhisperSTT(
+        model_size=config.stt_model_size,
+        quantization=config.stt_quantization,
+        num_threads=num_threads,
+    )
+    # The vector model is trained by the parent (or earlier) and only memory-mapped here
+    _worker["nlu"] = build_intent_classifier(config)
+    _worker["decision"] = DecisionEngine(config.decision_tree_path)
+
+
+def _process_clip(path: str) -> dict[str, Any]:
+    import whisper
+
+    timings: dict[str, float] = {}
+    started = time.perf_counter()
+    try:
+        audio = whisper.load_audio(path)
+        timings["load_s"] = time.perf_counter() - started
+
+        t = time.perf_counter()
+        text, language = _worker["stt"].transcribe_buffer(audio)
+        timings["stt_s"] = time.perf_counter() - t
+        timings["audio_s"] = len(audio) / 16000
+
+        t = time.perf_counter()
+        nlu_result = _worker["nlu"].predict(text)
+        decision = _worker["decision"].decide(text, nlu_result)
+        timings["decision_s"] = time.perf_counter() - t
+    except Exception as e:
+        return {"path": path, "error": f"{type(e).__name__}: {e}", "worker": os.getpid()}
+
+    timings = {k: round(v, 4) for k, v in timings.items()}
+    return {
+        "path": path,
+        "text": text.strip(),
+        "language": language,
+        "intent": decision["intent"],
+        "decision": decision,
+        "timings": timings,
+        "worker": os.getpid(),
+    }
+
+
+def _completed_paths(output: Optional[Path], repo: Optional[ConversationRepository]) -> dict[str, set[str]]:
+    # Clips already stored, per enabled sink ("jsonl", "db")
+    done: dict[str, set[str]] = {}
+    if output:
+        done["jsonl"] = set()
+        if output.exists():
+            with open(output, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        row = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # line torn by an interruption; the clip is redone
+                    if not row.get("error"):
+                        done["jsonl"].add(row["path"])
+    if repo is not None:
+        done["db"] = repo.list_batch_sources()
+    return done
+
+
+def run_batch(
+    config: AppConfig,
+    source: Path,
+    output: Optional[Path] = None,
+    to_db: bool = False,
+    workers: Optional[int] = None,
+    db_batch_size: int = 50,
+    resume: bool = True,
+) -> dict[str, Any]:
+    """
+    Transcribe and classify every clip of `source` with a process pool.
+
+    Results stream to `output` (JSONL, appended and flushed per clip) and/or
+    to the `transcripts`/`decisions` tables, `db_batch_size` clips per
+    transaction. With `resume`, clips already present in every enabled sink
+    are skipped, so an interrupted run can simply be restarted; a clip
+    missing from one sink (after a hard kill the JSONL can be up to a DB
+    batch ahead) is redone and written only to the sink that lacks it.
+    """
+    if output is None and not to_db:
+        raise ValueError("run_batch needs an output JSONL path and/or to_db=True")
+
+    repo = ConversationRepository(Database(config.db_path)) if to_db else None
+    paths = iter_inputs(source)
+    done = _completed_paths(output, repo) if resume else {}
+    pending = [p for p in paths if not done or not all(p in sink for sink in done.values())]
+    in_jsonl, in_db = done.get("jsonl", set()), done.get("db", set())
+
+    workers = workers or max(1, (os.cpu_count() or 2) // 2)
+    num_threads = config.stt_num_threads or max(1, (os.cpu_count() or 1) // workers)
+    logger.info(
+        "Batch: %d clips, %d already done, %d workers x %d torch threads",
+        len(paths), len(paths) - len(pending), workers, num_threads,
+    )
+
+    summary = {"total": len(paths), "skipped": len(paths) - len(pending), "ok": 0, "failed": 0}
+    if not pending:
+        return summary
+
+    if config.nlu_backend == "vector":
+        # Train (if needed) once here; the workers only memory-map the saved model
+        from app.nlu.intent_classifier import build_intent_classifier
+
+        build_intent_classifier(config, repo=repo)
+        config = dataclasses.replace(config, nlu_retrain=False)
+
+    out_file = open(output, "a", encoding="utf-8") if output else None
+    db_buffer: list[dict[str, Any]] = []
+    started = time.perf_counter()
+    audio_s = 0.0
+    ctx = mp.get_context("spawn")
+    try:
+        with ctx.Pool(workers, initializer=_init_worker, initargs=(config, num_threads)) as pool:
+            for result in pool.imap_unordered(_process_clip, pending):
+                if result.get("error"):
+                    summary["failed"] += 1
+                    logger.warning("Batch: %s failed: %s", result["path"], result["error"])
+                else:
+                    summary["ok"] += 1
+                    audio_s += result["timings"].get("audio_s", 0.0)
+                    if repo is not None and result["path"] not in in_db:
+                        db_buffer.append(result)
+                        if len(db_buffer) >= db_batch_size:
+                            repo.save_batch_results(db_buffer)
+                            db_buffer.clear()
+
+                if out_file and result["path"] not in in_jsonl:
+                    out_file.write(json.dumps(result, ensure_ascii=False) + "\n")
+                    out_file.flush()
+
+                processed = summary["ok"] + summary["failed"]
+                if processed % 100 == 0:
+                    logger.info("Batch: %d/%d clips", processed, len(pending))
+    finally:
+        if repo is not None:
+            if db_buffer:
+                repo.save_batch_results(db_buffer)
+            repo.db.close()
+        if out_file:
+            out_file.close()
+
+    elapsed = time.perf_counter() - started
+    summary["elapsed_s"] = round(elapsed, 2)
+    summary["rtf"] = round(elapsed / audio_s, 3) if audio_s else None
+    logger.info("Batch finished: %s", summary)
+    return summary
@@ -16,7 +16,33 @@ class AppConfig:
     log_dir: Path = Path("logs")
     log_level: str = os.getenv("LOG_LEVEL", "INFO")
     stt_model_size: str = os.getenv("STT_MODEL_SIZE", "small")
+    stt_quantization: Optional[str] = None
+    stt_num_threads: Optional[int] = None
+    stt_inference_process: bool = False
     tts_voice_path: Optional[str] = "tts_module/models/en_US-ryan-low.onnx"
+    tts_cache_dir: Optional[Path] = Path("data/tts_cache")
+    tts_cache_max_mb: int = 200
+    tts_streaming: bool = True
+    barge_in: bool = False
+    lane_mic_devices: tuple[Optional[int], ...] = ()
+    lane_speaker_devices: tuple[Optional[int], ...] = ()
+    lane_max_listen: int = 4
+    lane_max_logic: int = 4
+    prefetch_ttl_s: float = 30.0
+    tree_reload_s: float = 2.0
+    trace_sink: str = ""
+    sentiment_model: str = "philschmid/tiny-bert-sst2-distilled"
+    sentiment_backend: str = "torch"
+    sentiment_quantization: Optional[str] = None
+    sentiment_cache_size: int = 1024
+    sentiment_preload: bool = True
+    nlu_backend: str = "rules"
+    nlu_model_dir: Path = Path("data/intent_model")
+    nlu_retrain: bool = False
+    vad_threshold_db: float = -45.0
+    vad_min_speech_ms: int = 120
+    vad_trailing_silence_ms: int = 600
+    vad_max_utterance_s: float = 15.0
 
     @classmethod
     def from_env(cls) -> "AppConfig":
@@ -29,7 +55,52 @@ class AppConfig:
         log_dir = Path(os.getenv("LOG_DIR", cls.log_dir))
         log_level = os.getenv("LOG_LEVEL", cls.log_level)
         stt_model_size = os.getenv("STT_MODEL_SIZE", cls.stt_model_size)
+        stt_quantization = os.getenv("STT_QUANTIZATION") or cls.stt_quantization
+        stt_num_threads = int(os.getenv("STT_NUM_THREADS", 0)) or cls.stt_num_threads
+        stt_inference_process = os.getenv("STT_INFERENCE_PROCESS", "0").lower() in ("1", "true", "yes")
         tts_voice_path = os.getenv("TTS_VOICE_PATH", cls.tts_voice_path)
+        # TTS_CACHE_DIR="" disables the prompt audio cache
+        tts_cache_dir = os.getenv("TTS_CACHE_DIR", str(data_dir / "tts_cache"))
+        tts_cache_dir = Path(tts_cache_dir) if tts_cache_dir else None
+        tts_cache_max_mb = int(os.getenv("TTS_CACHE_MAX_MB", cls.tts_cache_max_mb))
+        tts_streaming = os.getenv("TTS_STREAMING", "1").lower() in ("1", "true", "yes")
+        barge_in = os.getenv("BARGE_IN", "0").lower() in ("1", "true", "yes")
+        # LANE_MIC_DEVICES="1,2,,4": PyAudio input device per lane (empty = default device)
+        lane_mic_devices = tuple(
+            int(d) if d.strip() else None
+            for d in os.getenv("LANE_MIC_DEVICES", "").split(",")
+        ) if os.getenv("LANE_MIC_DEVICES") else cls.lane_mic_devices
+        # LANE_SPEAKER_DEVICES="3,5": PyAudio output device per lane, same format
+        lane_speaker_devices = tuple(
+            int(d) if d.strip() else None
+            for d in os.getenv("LANE_SPEAKER_DEVICES", "").split(",")
+        ) if os.getenv("LANE_SPEAKER_DEVICES") else cls.lane_speaker_devices
+        lane_max_listen = int(os.getenv("LANE_MAX_LISTEN", cls.lane_max_listen))
+        lane_max_logic = int(os.getenv("LANE_MAX_LOGIC", cls.lane_max_logic))
+        # PREFETCH_TTL_S=0 disables speculative lookups on car detection
+        prefetch_ttl_s = float(os.getenv("PREFETCH_TTL_S", cls.prefetch_ttl_s))
+        # TREE_RELOAD_S=0 disables watching decision_tree.json
+        tree_reload_s = float(os.getenv("TREE_RELOAD_S", cls.tree_reload_s))
+        # TRACE_SINK: "" - no dialogue traces, "db" - the traces table, else a JSONL file path
+        trace_sink = os.getenv("TRACE_SINK", cls.trace_sink)
+        # Yes/no fallback model (app/nlu/confirmation.py); SENTIMENT_BACKEND=onnx needs optimum[onnxruntime]
+        sentiment_model = os.getenv("SENTIMENT_MODEL", cls.sentiment_model)
+        sentiment_backend = os.getenv("SENTIMENT_BACKEND", cls.sentiment_backend)
+        sentiment_quantization = os.getenv("SENTIMENT_QUANTIZATION") or cls.sentiment_quantization
+        sentiment_cache_size = int(os.getenv("SENTIMENT_CACHE_SIZE", cls.sentiment_cache_size))
+        sentiment_preload = os.getenv("SENTIMENT_PRELOAD", "1").lower() in ("1", "true", "yes")
+        # NLU_BACKEND=vector: NumPy n-gram TF-IDF classifier (app/nlu/vector_classifier.py)
+        nlu_backend = os.getenv("NLU_BACKEND", cls.nlu_backend)
+        nlu_model_dir = Path(os.getenv("NLU_MODEL_DIR", data_dir / "intent_model"))
+        nlu_retrain = os.getenv("NLU_RETRAIN", "0").lower() in ("1", "true", "yes")
+        vad_threshold_db = float(os.getenv("VAD_THRESHOLD_DB", cls.vad_threshold_db))
+        vad_min_speech_ms = int(os.getenv("VAD_MIN_SPEECH_MS", cls.vad_min_speech_ms))
+        vad_trailing_silence_ms = int(
+            os.getenv("VAD_TRAILING_SILENCE_MS", cls.vad_trailing_silence_ms)
+        )
+        vad_max_utterance_s = float(
+            os.getenv("VAD_MAX_UTTERANCE_S", cls.vad_max_utterance_s)
+        )
 
         return cls(
             data_dir=data_dir,
@@ -38,9 +109,44 @@ class AppConfig:
             log_dir=log_dir,
             log_level=log_level,
             stt_model_size=stt_model_size,
+            stt_quantization=stt_quantization,
+            stt_num_threads=stt_num_threads,
+            stt_inference_process=stt_inference_process,
             tts_voice_path=tts_voice_path,
+            tts_cache_dir=tts_cache_dir,
+            tts_cache_max_mb=tts_cache_max_mb,
+            tts_streaming=tts_streaming,
+            barge_in=barge_in,
+            lane_mic_devices=lane_mic_devices,
+            lane_speaker_devices=lane_speaker_devices,
+            lane_max_listen=lane_max_listen,
+            lane_max_logic=lane_max_logic,
+            prefetch_ttl_s=prefetch_ttl_s,
+            tree_reload_s=tree_reload_s,
+            trace_sink=trace_sink,
+            sentiment_model=sentiment_model,
+            sentiment_backend=sentiment_backend,
+            sentiment_quantization=sentiment_quantization,
+            sentiment_cache_size=sentiment_cache_size,
+            sentiment_preload=sentiment_preload,
+            nlu_backend=nlu_backend,
+            nlu_model_dir=nlu_model_dir,
+            nlu_retrain=nlu_retrain,
+            vad_threshold_db=vad_threshold_db,
+            vad_min_speech_ms=vad_min_speech_ms,
+            vad_trailing_silence_ms=vad_trailing_silence_ms,
+            vad_max_utterance_s=vad_max_utterance_s,
         )
 
+    def vad_options(self) -> dict:
+        """Keyword arguments for the STT endpointing stage (EnergyVAD)."""
+        return {
+            "threshold_db": self.vad_threshold_db,
+            "min_speech_ms": self.vad_min_speech_ms,
+            "trailing_silence_ms": self.vad_trailing_silence_ms,
+            "max_utterance_s": self.vad_max_utterance_s,
+        }
+
     def prepare_directories(self) -> None:
         """Create folders for DB/logs if missing."""
         self.data_dir.mkdir(parents=True, exist_ok=True)
@@ -4,4 +4,4 @@ Database layer built on top of SQLite.
 
 from app.db.database import Database  # noqa: F401
 from app.db.repository import ConversationRepository  # noqa: F401
-
+from app.db.writer import DBWriter  # noqa: F401
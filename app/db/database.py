@@ -1,27 +1,161 @@
 from __future__ import annotations
 
+import logging
+import os
 import sqlite3
+import threading
+import time
 from pathlib import Path
 from typing import Iterable, Optional
 
+# Connection defaults: memory-mapped reads up to 256 MB, 16 MB page cache per connection
+MMAP_SIZE = 256 * 1024 * 1024
+CACHE_KIB = 16 * 1024
+CACHED_STATEMENTS = 256
+# sqlite3.connect's default busy timeout (5 s), and the one used while another
+# process may be migrating: the HISTORY_PLATES backfill of 10M rows takes ~50 s
+BUSY_TIMEOUT_MS = 5000
+MIGRATION_BUSY_TIMEOUT_MS = 10 * 60 * 1000
+
+logger = logging.getLogger(__name__)
+
+# HISTORY columns a plate can be in; HISTORY_PLATES mirrors them upper-cased
+PLATE_COLUMNS = ("BE_N_LICPLA", "BS_N_LICPLA", "BE_N_LICPLA_CR", "BS_N_LICPLA_CR", "N_LICPLA_BIS")
+
+
+def _plates_of(row: str) -> str:
+    # One (plate) row per non-empty plate column of `row` (NEW/OLD in a trigger)
+    return " UNION ALL ".join(f"SELECT UPPER({row}.{col}) AS plate" for col in PLATE_COLUMNS)
+
+
+def _plate_list(row: str) -> str:
+    return ", ".join(f"UPPER({row}.{col})" for col in PLATE_COLUMNS)
+
+
+def _statements(script: str) -> list[str]:
+    # Split a script on ";" without cutting trigger bodies (BEGIN ... END)
+    statements, pending = [], ""
+    for part in script.split(";"):
+        pending += part + ";"
+        if sqlite3.complete_statement(pending):
+            if pending.strip(" \n;"):
+                statements.append(pending.strip())
+            pending = ""
+    return statements
+
+
+# Schema migrations after the base schema, applied in order; PRAGMA user_version
+# is the number applied so far. Each one runs in a transaction and is idempotent.
+MIGRATIONS = [
+    # 1: HISTORY_PLATES (normalized plate -> ID_HISTORY), kept by triggers, backfilled
+    f"""
+    CREATE TABLE IF NOT EXISTS HISTORY_PLATES (
+        plate TEXT NOT NULL,
+        ID_HISTORY INTEGER NOT NULL,
+        PRIMARY KEY (plate, ID_HISTORY)
+    ) WITHOUT ROWID;
+
+    CREATE TRIGGER IF NOT EXISTS history_plates_insert AFTER INSERT ON HISTORY BEGIN
+        INSERT OR IGNORE INTO HISTORY_PLATES(plate, ID_HISTORY)
+        SELECT plate, NEW.ID_HISTORY FROM ({_plates_of("NEW")}) WHERE plate IS NOT NULL;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS history_plates_update
+    AFTER UPDATE OF ID_HISTORY, {", ".join(PLATE_COLUMNS)} ON HISTORY BEGIN
+        DELETE FROM HISTORY_PLATES
+        WHERE ID_HISTORY = OLD.ID_HISTORY AND plate IN ({_plate_list("OLD")});
+        INSERT OR IGNORE INTO HISTORY_PLATES(plate, ID_HISTORY)
+        SELECT plate, NEW.ID_HISTORY FROM ({_plates_of("NEW")}) WHERE plate IS NOT NULL;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS history_plates_delete AFTER DELETE ON HISTORY BEGIN
+        DELETE FROM HISTORY_PLATES
+        WHERE ID_HISTORY = OLD.ID_HISTORY AND plate IN ({_plate_list("OLD")});
+    END;
+
+    INSERT OR IGNORE INTO HISTORY_PLATES(plate, ID_HISTORY)
+    SELECT plate, ID_HISTORY FROM (
+        {" UNION ALL ".join(f"SELECT UPPER({col}) AS plate, ID_HISTORY FROM HISTORY" for col in PLATE_COLUMNS)}
+    ) WHERE plate IS NOT NULL ORDER BY plate, ID_HISTORY;
+    """,
+]
+
 
 class Database:
     """
     Thin wrapper around SQLite to keep connection options in one place.
+
+    Connections are pooled per thread: a thread opens one on first use and
+    keeps it until `close()`, so calls skip the file open and schema parse
+    and reuse the compiled statement cache. Every connection runs with
+    journal_mode=WAL (readers and the writer do not block each other),
+    synchronous=NORMAL (no fsync per commit; a power loss can drop the last
+    commits but not corrupt the file), a memory-mapped file and a larger
+    page cache.
     """
 
-    def __init__(self, db_path: Path):
+    def __init__(
+        self,
+        db_path: Path,
+        mmap_size: int = MMAP_SIZE,
+        cache_kib: int = CACHE_KIB,
+        cached_statements: int = CACHED_STATEMENTS,
+    ):
         self.db_path = Path(db_path)
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.mmap_size = mmap_size
+        self.cache_kib = cache_kib
+        self.cached_statements = cached_statements
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections: list[sqlite3.Connection] = []
+        # close() bumps the generation: threads then reopen instead of using a closed connection
+        self._generation = 0
+        self._pid = os.getpid()
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.db_path, check_same_thread=False, cached_statements=self.cached_statements
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+        conn.execute(f"PRAGMA cache_size=-{int(self.cache_kib)}")
+        return conn
 
     def connect(self) -> sqlite3.Connection:
         """
-        Return a connection configured for row access by column name.
+        Return this thread's connection, configured for row access by column name.
+        Use it as `with db.connect() as conn:` - the block commits (or rolls
+        back) but does not close the connection.
         """
-        conn = sqlite3.connect(self.db_path, check_same_thread=False)
-        conn.row_factory = sqlite3.Row
+        if self._pid != os.getpid():
+            # Forked child: the parent's connections must not be used here
+            self._local = threading.local()
+            self._connections = []
+            self._pid = os.getpid()
+        cached: Optional[tuple[int, sqlite3.Connection]] = getattr(self._local, "conn", None)
+        if cached is not None and cached[0] == self._generation:
+            return cached[1]
+        conn = self._open()
+        with self._lock:
+            self._connections.append(conn)
+            self._local.conn = (self._generation, conn)
         return conn
 
+    def close(self) -> None:
+        """
+        Close every pooled connection (of all threads). The last one to close
+        checkpoints the WAL into the main file. The Database stays usable:
+        the next `connect()` opens a new connection.
+        """
+        with self._lock:
+            connections, self._connections = self._connections, []
+            self._generation += 1
+        for conn in connections:
+            conn.close()
+
     def execute(self, query: str, params: Iterable = ()) -> None:
         with self.connect() as conn:
             conn.execute(query, tuple(params))
@@ -35,8 +169,21 @@ class Database:
     def initialize(self) -> None:
         """
         Idempotent schema initialization.
+
+        Safe to run from several processes at once: they wait for each
+        other's schema changes and migrations (up to
+        `MIGRATION_BUSY_TIMEOUT_MS`) instead of failing with "database is locked".
         """
-        with self.connect() as conn:
+        conn = self.connect()
+        conn.execute(f"PRAGMA busy_timeout = {MIGRATION_BUSY_TIMEOUT_MS}")
+        try:
+            self._create_schema(conn)
+            self._migrate(conn)
+        finally:
+            conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+
+    def _create_schema(self, conn: sqlite3.Connection) -> None:
+        with conn:
             conn.executescript(
                 """
                 CREATE TABLE IF NOT EXISTS transcripts (
@@ -55,6 +202,28 @@ class Database:
                     FOREIGN KEY (transcript_id) REFERENCES transcripts(id)
                 );
 
+                CREATE TABLE IF NOT EXISTS traces (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    decision_id INTEGER NOT NULL,
+                    trace TEXT NOT NULL,
+                    created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (decision_id) REFERENCES decisions(id)
+                );
+
+                CREATE INDEX IF NOT EXISTS idx_decisions_transcript ON decisions(transcript_id);
+
+                CREATE TABLE IF NOT EXISTS decisions_shadow (
+                    run_id TEXT NOT NULL,
+                    transcript_id INTEGER NOT NULL,
+                    decision_id INTEGER,
+                    old_intent TEXT,
+                    intent TEXT,
+                    confidence REAL,
+                    payload TEXT,
+                    created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (run_id, transcript_id)
+                );
+
                 CREATE TABLE IF NOT EXISTS car_events (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     plate TEXT NOT NULL,
@@ -116,4 +285,26 @@ class Database:
                 );
                 """
             )
-            conn.commit()
+
+    def _migrate(self, conn: sqlite3.Connection) -> None:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for target in range(version + 1, len(MIGRATIONS) + 1):
+            started = time.perf_counter()
+            # Statement by statement: executescript would commit the IMMEDIATE lock away
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Another process may have migrated while we waited for the lock
+                if conn.execute("PRAGMA user_version").fetchone()[0] >= target:
+                    conn.rollback()
+                    continue
+                for statement in _statements(MIGRATIONS[target - 1]):
+                    conn.execute(statement)
+                conn.execute(f"PRAGMA user_version = {target}")
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            logger.info(
+                "Database %s migrated to version %d in %.2fs",
+                self.db_path, target, time.perf_counter() - started,
+            )
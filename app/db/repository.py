@@ -34,6 +34,126 @@ class ConversationRepository:
             conn.commit()
             return int(cursor.lastrowid)
 
+    def save_session(
+        self,
+        text: str,
+        language: str | None,
+        intent: str,
+        payload: dict[str, Any],
+        trace: dict[str, Any] | None = None,
+    ) -> int:
+        #Insert a dialogue transcript, its decision and (optionally) its span trace in one transaction.
+        #Returns the decision id.
+        with self.db.connect() as conn:
+            cursor = conn.execute(
+                "INSERT INTO transcripts(text, language) VALUES (?, ?)", (text, language)
+            )
+            cursor = conn.execute(
+                "INSERT INTO decisions(transcript_id, intent, payload) VALUES (?, ?, ?)",
+                (cursor.lastrowid, intent, json.dumps(payload, ensure_ascii=False)),
+            )
+            decision_id = int(cursor.lastrowid)
+            if trace is not None:
+                conn.execute(
+                    "INSERT INTO traces(decision_id, trace) VALUES (?, ?)",
+                    (decision_id, json.dumps(trace, ensure_ascii=False)),
+                )
+            conn.commit()
+            return decision_id
+
+    def get_trace(self, decision_id: int) -> dict[str, Any] | None:
+        #Chrome trace of a dialogue (TRACE_SINK=db), None if it was not traced.
+        rows = self.db.fetchall("SELECT trace FROM traces WHERE decision_id = ?", (decision_id,))
+        return json.loads(rows[0]["trace"]) if rows else None
+
+    def save_batch_results(self, results: list[dict[str, Any]]) -> None:
+        #Insert transcripts + decisions of offline batch results in one transaction.
+        with self.db.connect() as conn:
+            for result in results:
+                cursor = conn.execute(
+                    "INSERT INTO transcripts(text, language) VALUES (?, ?)",
+                    (result["text"], result.get("language")),
+                )
+                payload = dict(result["decision"])
+                payload["source_path"] = result["path"]
+                payload["timings"] = result.get("timings", {})
+                conn.execute(
+                    "INSERT INTO decisions(transcript_id, intent, payload) VALUES (?, ?, ?)",
+                    (cursor.lastrowid, result["intent"], json.dumps(payload, ensure_ascii=False)),
+                )
+            conn.commit()
+
+    def list_labeled_transcripts(self, limit: int | None = None) -> list[dict[str, Any]]:
+        #Transcript text + intent of decisions with a real intent (fallback excluded), newest first.
+        #Training data of the vector intent classifier.
+        rows = self.db.fetchall(
+            "SELECT t.text, d.intent FROM decisions d JOIN transcripts t ON t.id = d.transcript_id "
+            "WHERE d.intent IS NOT NULL AND d.intent != 'fallback' AND TRIM(t.text) != '' "
+            "ORDER BY d.id DESC LIMIT ?",
+            (limit if limit is not None else -1,),
+        )
+        return [dict(row) for row in rows]
+
+    def iter_transcript_page(self, after_id: int = 0, limit: int = 500) -> list[dict[str, Any]]:
+        #Keyset page of transcripts with id > after_id, oldest first, each with its latest decision.
+        #Pass the last row's id as the next after_id; pages cost the same at any depth (no OFFSET).
+        rows = self.db.fetchall(
+            "SELECT t.id AS transcript_id, t.text, d.id AS decision_id, d.intent AS old_intent "
+            "FROM transcripts t LEFT JOIN decisions d ON d.id = "
+            "(SELECT MAX(id) FROM decisions WHERE transcript_id = t.id) "
+            "WHERE t.id > ? ORDER BY t.id LIMIT ?",
+            (after_id, limit),
+        )
+        return [dict(row) for row in rows]
+
+    def save_shadow_decisions(self, run_id: str, rows: list[dict[str, Any]]) -> None:
+        #Bulk insert re-classification results of one run into decisions_shadow, one transaction.
+        #A transcript already stored for the run is overwritten.
+        with self.db.connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO decisions_shadow"
+                "(run_id, transcript_id, decision_id, old_intent, intent, confidence, payload) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        run_id,
+                        row["transcript_id"],
+                        row["decision_id"],
+                        row["old_intent"],
+                        row["intent"],
+                        row["confidence"],
+                        json.dumps(row["payload"], ensure_ascii=False),
+                    )
+                    for row in rows
+                ],
+            )
+            conn.commit()
+
+    def last_shadow_transcript(self, run_id: str) -> int:
+        #Highest transcript id re-classified by a run (0 if none): where a resumed run continues.
+        rows = self.db.fetchall(
+            "SELECT COALESCE(MAX(transcript_id), 0) AS last FROM decisions_shadow WHERE run_id = ?",
+            (run_id,),
+        )
+        return int(rows[0]["last"])
+
+    def shadow_diff(self, run_id: str) -> list[dict[str, Any]]:
+        #(old_intent, intent, count) of a run, largest groups first; computed by SQLite, not in memory.
+        rows = self.db.fetchall(
+            "SELECT old_intent, intent, COUNT(*) AS count FROM decisions_shadow WHERE run_id = ? "
+            "GROUP BY old_intent, intent ORDER BY count DESC, old_intent, intent",
+            (run_id,),
+        )
+        return [dict(row) for row in rows]
+
+    def list_batch_sources(self) -> set[str]:
+        #Source paths of clips already stored by the offline batch mode.
+        rows = self.db.fetchall(
+            "SELECT json_extract(payload, '$.source_path') AS source_path FROM decisions "
+            "WHERE json_extract(payload, '$.source_path') IS NOT NULL"
+        )
+        return {row["source_path"] for row in rows}
+
     def save_car_event(self, plate: str, source: str | None = None) -> int:
         #Insert a camera event and return its id.
         query = "INSERT INTO car_events(plate, source) VALUES (?, ?)"
@@ -133,19 +253,15 @@ class ConversationRepository:
     def find_history_by_plate(self, plate: str) -> list[dict[str, Any]]:
 
     #Find HISTORY records where plate matches entry/exit/alternate plate fields (case-insensitive).
+    #Goes through the HISTORY_PLATES index (upper-cased plates of all five columns, kept by triggers).
 
         normalized = plate.strip().upper()
         query = """
         SELECT * FROM HISTORY
-        WHERE UPPER(BE_N_LICPLA) = ?
-           OR UPPER(BS_N_LICPLA) = ?
-           OR UPPER(BE_N_LICPLA_CR) = ?
-           OR UPPER(BS_N_LICPLA_CR) = ?
-           OR UPPER(N_LICPLA_BIS) = ?
+        WHERE ID_HISTORY IN (SELECT ID_HISTORY FROM HISTORY_PLATES WHERE plate = ?)
+        ORDER BY ID_HISTORY
         """
-        rows = self.db.fetchall(
-            query, (normalized, normalized, normalized, normalized, normalized)
-        )
+        rows = self.db.fetchall(query, (normalized,))
         return [dict(row) for row in rows]
 
     def find_history_by_ticket(self, ticket_number: str) -> list[dict[str, Any]]:
@@ -160,24 +276,24 @@ class ConversationRepository:
         normalized = plate.strip().upper()
         query = """
         SELECT * FROM HISTORY
-        WHERE MT_TELBAD IS NOT NULL
+        WHERE ID_HISTORY IN (SELECT ID_HISTORY FROM HISTORY_PLATES WHERE plate = ?)
+          AND MT_TELBAD IS NOT NULL
           AND MT_TELBAD > 0
-          AND (
-                UPPER(BE_N_LICPLA) = ?
-             OR UPPER(BS_N_LICPLA) = ?
-             OR UPPER(BE_N_LICPLA_CR) = ?
-             OR UPPER(BS_N_LICPLA_CR) = ?
-             OR UPPER(N_LICPLA_BIS) = ?
-          )
+        ORDER BY ID_HISTORY
         """
-        rows = self.db.fetchall(
-            query, (normalized, normalized, normalized, normalized, normalized)
-        )
+        rows = self.db.fetchall(query, (normalized,))
         return [dict(row) for row in rows]
 
     def has_no_debt(self, plate: str) -> bool:
         #Convenience: True если по номеру нет записей с MT_TELBAD > 0.
-        return len(self.find_history_debts_by_plate(plate)) == 0
+        #Stops at the first debt instead of fetching the rows.
+        rows = self.db.fetchall(
+            "SELECT 1 FROM HISTORY "
+            "WHERE ID_HISTORY IN (SELECT ID_HISTORY FROM HISTORY_PLATES WHERE plate = ?) "
+            "AND MT_TELBAD > 0 LIMIT 1",
+            (plate.strip().upper(),),
+        )
+        return not rows
 
     def get_history_by_id(self, history_id: int) -> dict[str, Any] | None:
         #Fetch a single HISTORY record by its primary key.
@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class DBWriter:
+    """
+    Single thread that owns all SQLite writes of a process.
+
+    SQLite allows one writer at a time; with several dialogues (parking
+    lanes) committing concurrently, each would otherwise wait on the file
+    lock. Writes are queued here instead and run one by one on the writer
+    thread, so callers never block on the database. Reads stay on the
+    caller's thread.
+    """
+
+    def __init__(self, name: str = "db-writer", max_queue: int = 1000):
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self.written = 0
+        self.failed = 0
+        self.latency_s = 0.0  # sum of submit -> done over all jobs
+        self._thread.start()
+
+    def submit(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+        """
+        Queue `fn(*args, **kwargs)` for the writer thread. Returns a Future
+        with the result; blocks only when `max_queue` jobs are pending.
+        """
+        future: Future = Future()
+        self._queue.put((future, time.perf_counter(), fn, args, kwargs))
+        return future
+
+    def _run(self) -> None:
+        while True:
+            job = self._queue.get()
+            if job is _STOP:
+                return
+            future, submitted, fn, args, kwargs = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn(*args, **kwargs))
+                self.written += 1
+            except Exception as e:
+                logger.exception("DB write failed: %s", getattr(fn, "__name__", fn))
+                self.failed += 1
+                future.set_exception(e)
+            self.latency_s += time.perf_counter() - submitted
+
+    @property
+    def stats(self) -> dict[str, Any]:
+        done = self.written + self.failed
+        return {
+            "written": self.written,
+            "failed": self.failed,
+            "pending": self._queue.qsize(),
+            "mean_latency_s": round(self.latency_s / done, 4) if done else None,
+        }
+
+    def close(self, timeout: Optional[float] = 10) -> None:
+        """Finish the queued writes and stop the thread."""
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
@@ -10,9 +10,20 @@ class DecisionEngine:
     Converts NLU output into concrete system actions.
     """
 
-    def __init__(self, decision_tree_path: Optional[Path] = None):
+    def __init__(self, decision_tree_path: Optional[Path] = None, store=None):
+        """
+        With `store` (`app.decision.tree_store.TreeStore`) the tree comes from
+        the shared store and follows its reloads instead of being read here.
+        """
         self.decision_tree_path = decision_tree_path
-        self.decision_tree = self._load_tree(decision_tree_path) if decision_tree_path else {}
+        if store is not None:
+            self.decision_tree = store.current.tree
+            store.subscribe(self._on_reload)
+        else:
+            self.decision_tree = self._load_tree(decision_tree_path) if decision_tree_path else {}
+
+    def _on_reload(self, old, new) -> None:
+        self.decision_tree = new.tree
 
     def _load_tree(self, path: Path) -> dict[str, Any]:
         if not path.exists():
@@ -0,0 +1,314 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+
+from app.config import AppConfig
+from app.db import ConversationRepository, Database, DBWriter
+from app.decision.tree_actions import TreeActions
+from app.decision.tree_compiler import CompiledNode
+from app.decision.tree_engine import DecisionTreeEngine
+from app.decision.tree_store import TreeStore
+from app.nlu.confirmation import get_confirmation_model
+from app.tracing import open_trace_sink
+
+logger = logging.getLogger(__name__)
+
+STAGES = ("say", "listen", "logic", "finish")
+
+
+def node_stage(node: CompiledNode) -> str:
+    """
+    Which shared resource a node step mostly waits on.
+
+    "listen": microphone + Whisper; "say": the TTS worker queue;
+    "finish": last phrase + session commit; "logic": actions and
+    conditions (DB lookups).
+    """
+    if node.listen:
+        return "listen"
+    if node.kind == "end" or (node.kind != "say" and node.condition is None and node.next is None):
+        return "finish"
+    if node.kind == "say":
+        return "say"
+    return "logic"
+
+
+def percentile(values: list[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile (q in 0..100) of `values`, None when empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = math.ceil(q / 100 * len(ordered))
+    return ordered[max(0, min(len(ordered), rank) - 1)]
+
+
+@dataclass
+class LaneStats:
+    dialogues_s: list[float] = field(default_factory=list)
+    # stage -> [steps, queued_s (waiting for a slot), run_s]
+    stages: dict[str, list] = field(default_factory=lambda: {s: [0, 0.0, 0.0] for s in STAGES})
+    speech_s: float = 0.0
+    tts_queue_s: float = 0.0
+    errors: int = 0
+    # node -> wall time of every visit, unrounded (the timing report rounds to ms)
+    node_walls: dict[str, list[float]] = field(default_factory=dict)
+
+    def add_step(self, stage: str, queued_s: float, run_s: float) -> None:
+        entry = self.stages[stage]
+        entry[0] += 1
+        entry[1] += queued_s
+        entry[2] += run_s
+
+    def add_session(self, payload: dict[str, Any], node_timings: list[tuple]) -> None:
+        for tts in payload.get("tts", []):
+            self.tts_queue_s += tts.get("queued_s") or 0.0
+        self.speech_s += payload.get("timing", {}).get("speech_s", 0.0)
+        for name, started, ended in node_timings:
+            if ended is not None:
+                self.node_walls.setdefault(name, []).append(ended - started)
+
+    def report(self) -> dict[str, Any]:
+        n = len(self.dialogues_s)
+        return {
+            "dialogues": n,
+            "errors": self.errors,
+            "dialogue_p50_s": _round(percentile(self.dialogues_s, 50)),
+            "dialogue_p95_s": _round(percentile(self.dialogues_s, 95)),
+            "stages": {
+                stage: {"steps": steps, "queued_s": round(queued, 3), "run_s": round(run, 3)}
+                for stage, (steps, queued, run) in self.stages.items()
+                if steps
+            },
+            "speech_s": round(self.speech_s, 3),
+            "tts_queue_s": round(self.tts_queue_s, 3),
+        }
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return None if value is None else round(value, 3)
+
+
+@dataclass
+class Lane:
+    name: str
+    engine: DecisionTreeEngine
+    stats: LaneStats = field(default_factory=LaneStats)
+
+
+class LaneEngine:
+    """
+    Runs the decision tree for several parking lanes in one process.
+
+    Each lane is a coroutine with its own `TreeActions` (context, session
+    payload, microphone) over the current `TreeStore` version, picked up
+    between dialogues when the file is reloaded. The lanes share the
+    Whisper models (`stt_module.registry`), one TTS worker and one DB writer
+    thread (`app.db.DBWriter`). Node steps are blocking (audio, SQLite), so
+    each one runs on a thread pool with one thread per lane; `max_listen`
+    bounds how many lanes record/transcribe at once and `max_logic` how many
+    run actions/conditions (DB reads) at once. Speech is queued by the TTS
+    worker itself.
+
+    `report()` gives a per-lane latency breakdown: dialogue p50/p95 and, per
+    stage, steps, time waiting for a slot and time running, plus speech time
+    and time queued behind other lanes' prompts.
+    """
+
+    def __init__(
+        self,
+        json_path,
+        stts: list[Any],
+        tts=None,
+        repo: Optional[ConversationRepository] = None,
+        barge_in: bool = False,
+        max_listen: int = 4,
+        max_logic: int = 4,
+        names: Optional[list[str]] = None,
+        prefetch_ttl_s: float = 30.0,
+        store: Optional[TreeStore] = None,
+        on_dialogue: Optional[Callable[["Lane"], None]] = None,
+        trace_sink: str = "",
+        speaker_devices: Optional[list[Optional[int]]] = None,
+    ):
+        """
+        `on_dialogue(lane)` is called before each dialogue, after the lane's
+        context is reset (the simulator loads the next script there).
+        `speaker_devices[i]` is lane i's PyAudio output device, sent with each
+        of its prompts to the shared TTS worker (missing/None - default device).
+        `trace_sink` as `TRACE_SINK`; a JSONL file is shared by the lanes
+        (its writes go through the DB writer thread).
+        """
+        if not stts:
+            raise ValueError("LaneEngine needs at least one lane")
+        if repo is None:
+            repo = ConversationRepository(Database(AppConfig.from_env().db_path))
+        if store is None:
+            store = TreeStore(json_path)
+        tree = store.current.tree
+
+        self.repo = repo
+        self.writer = DBWriter()
+        self.tts = tts
+        self.max_listen = max_listen
+        self.max_logic = max_logic
+        self.on_dialogue = on_dialogue
+        self._slots: dict[str, asyncio.Semaphore] = {}
+        self.wall_s = 0.0
+        names = names or [f"lane-{i + 1}" for i in range(len(stts))]
+        trace_file = open_trace_sink(trace_sink)
+
+        speakers = list(speaker_devices or []) + [None] * len(stts)
+
+        def actions(i: int) -> TreeActions:
+            return TreeActions(
+                tree=tree, stt=stts[i], tts=tts, repo=repo, db_writer=self.writer,
+                prefetch_ttl_s=prefetch_ttl_s, trace_sink=trace_file or trace_sink,
+                speaker_device=speakers[i],
+            )
+
+        # The tree is compiled once per version (TreeStore); every lane gets its own actions and timings
+        template = DecisionTreeEngine(barge_in=barge_in, actions=actions(0), store=store)
+        self.store = store
+        self.template = template
+        self.lanes = [
+            Lane(name, template if i == 0 else template.with_actions(actions(i)))
+            for i, name in enumerate(names[: len(stts)])
+        ]
+        for lane in self.lanes:
+            lane.engine.actions.tracer.name = lane.name
+        self._executor = ThreadPoolExecutor(max_workers=len(self.lanes), thread_name_prefix="lane")
+
+    @classmethod
+    def from_config(cls, config: AppConfig, lanes: int, tts=None, repo=None, store=None) -> "LaneEngine":
+        """
+        `lanes` lanes with one WhisperSTT each (own microphone from
+        `config.lane_mic_devices`, shared models) and their own speaker from
+        `config.lane_speaker_devices`. The inference process mode
+        is not used here: it would load one model per lane again.
+        """
+        from stt_module.stt import WhisperSTT
+
+        devices = list(config.lane_mic_devices) + [None] * lanes
+        stts = [
+            WhisperSTT(
+                model_size=config.stt_model_size,
+                vad_options=config.vad_options(),
+                quantization=config.stt_quantization,
+                num_threads=config.stt_num_threads,
+                preload="lazy",
+                input_device=devices[i],
+            )
+            for i in range(lanes)
+        ]
+        return cls(
+            config.decision_tree_path,
+            stts,
+            tts=tts,
+            repo=repo,
+            barge_in=config.barge_in,
+            max_listen=config.lane_max_listen,
+            max_logic=config.lane_max_logic,
+            prefetch_ttl_s=config.prefetch_ttl_s,
+            store=store,
+            trace_sink=config.trace_sink,
+            speaker_devices=list(config.lane_speaker_devices),
+        )
+
+    def stt_model_sizes(self) -> list[str]:
+        return self.template.stt_model_sizes()
+
+    def static_prompts(self) -> list[str]:
+        return self.template.static_prompts()
+
+    async def run(self, dialogues: Optional[int] = None) -> dict[str, Any]:
+        """
+        Run every lane concurrently; `dialogues` per lane (None - until cancelled).
+        Returns `report()`.
+        """
+        self._slots = {
+            "listen": asyncio.Semaphore(self.max_listen),
+            "logic": asyncio.Semaphore(self.max_logic),
+        }
+        started = time.perf_counter()
+        try:
+            await asyncio.gather(*(self._lane_loop(lane, dialogues) for lane in self.lanes))
+        finally:
+            self.wall_s = time.perf_counter() - started
+        return self.report()
+
+    async def _lane_loop(self, lane: Lane, dialogues: Optional[int]) -> None:
+        done = 0
+        while dialogues is None or done < dialogues:
+            started = time.perf_counter()
+            try:
+                await self._dialogue(lane)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # One broken dialogue must not stop the other lanes
+                logger.exception("Lane %s: dialogue failed", lane.name)
+                lane.stats.errors += 1
+            lane.stats.dialogues_s.append(time.perf_counter() - started)
+            done += 1
+
+    async def _dialogue(self, lane: Lane) -> None:
+        loop = asyncio.get_running_loop()
+        engine = lane.engine
+        # A reloaded tree is picked up here, between dialogues
+        engine.begin_dialogue()
+        engine.actions.reset_context()
+        if self.on_dialogue is not None:
+            self.on_dialogue(lane)
+        # The payload object is replaced on commit; keep it for the lane stats
+        payload = engine.actions.session_payload
+        current: Optional[str] = "start"
+        while current is not None:
+            stage = node_stage(engine.nodes[current])
+            slots = self._slots.get(stage)
+            queued = time.perf_counter()
+            if slots is not None:
+                await slots.acquire()
+            try:
+                started = time.perf_counter()
+                current = await loop.run_in_executor(self._executor, engine.step, current)
+            finally:
+                if slots is not None:
+                    slots.release()
+            lane.stats.add_step(stage, started - queued, time.perf_counter() - started)
+        lane.stats.add_session(payload, engine.node_timings)
+
+    @staticmethod
+    def _lane_report(lane: Lane) -> dict[str, Any]:
+        report = lane.stats.report()
+        prefetcher = lane.engine.actions.prefetcher
+        if prefetcher is not None:
+            report["prefetch"] = prefetcher.stats
+        return report
+
+    def report(self) -> dict[str, Any]:
+        dialogues = sum(len(lane.stats.dialogues_s) for lane in self.lanes)
+        wall_s = self.wall_s
+        return {
+            "lanes": {lane.name: self._lane_report(lane) for lane in self.lanes},
+            "dialogues": dialogues,
+            "wall_s": round(wall_s, 3),
+            "dialogues_per_s": round(dialogues / wall_s, 3) if wall_s else None,
+            "db_writer": self.writer.stats,
+            "sentiment": get_confirmation_model().stats,
+        }
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.writer.close()
+        for lane in self.lanes:
+            if lane.engine.actions.prefetcher is not None:
+                lane.engine.actions.prefetcher.close()
+            stt = lane.engine.actions.stt
+            if stt is not None and hasattr(stt, "close"):
+                stt.close()
@@ -0,0 +1,222 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Hashable, Optional
+
+from app.decision.prompts import is_static_prompt, render_segments
+from app.decision.tree_compiler import CompiledNode, successors
+
+logger = logging.getLogger(__name__)
+
+# TreeActions method -> ConversationRepository lookups it makes (all take the plate)
+PREFETCH_QUERIES: dict[str, tuple[str, ...]] = {
+    "check_plate_recognized": ("find_history_by_plate",),
+    "check_payment_status": ("has_no_debt", "find_history_debts_by_plate"),
+}
+
+# Actions after which the plate is known and the next steps can be started early
+PREFETCH_TRIGGERS = {"detect_car"}
+
+# How many steps ahead of the trigger node to look
+PREFETCH_DEPTH = 3
+
+
+@dataclass(frozen=True)
+class PrefetchPlan:
+    queries: tuple[str, ...]  # repository lookups of the likely next nodes
+    prompts: tuple[str, ...]  # say: templates of the likely next nodes
+
+
+def _method_name(node: CompiledNode) -> Optional[str]:
+    if node.kind == "action":
+        return node.action
+    if node.source:
+        name = node.source.strip().removesuffix("()")
+        if name.isidentifier():
+            return name
+    return None
+
+
+def plan_prefetch(nodes: dict[str, CompiledNode], start: str, depth: int = PREFETCH_DEPTH) -> PrefetchPlan:
+    """
+    Lookups and prompts of the nodes reachable from `start` within `depth` steps,
+    nearest first (breadth-first over every branch).
+    """
+    queries: list[str] = []
+    prompts: list[str] = []
+    seen = {start}
+    frontier = deque((target, 1) for target in successors(nodes[start]))
+    while frontier:
+        name, level = frontier.popleft()
+        if name in seen or level > depth:
+            continue
+        seen.add(name)
+        node = nodes[name]
+        for query in PREFETCH_QUERIES.get(_method_name(node), ()):
+            if query not in queries:
+                queries.append(query)
+        if node.kind == "say" and node.text not in prompts:
+            prompts.append(node.text)
+        frontier.extend((target, level + 1) for target in successors(node))
+    return PrefetchPlan(tuple(queries), tuple(prompts))
+
+
+def prefetch_plans(nodes: dict[str, CompiledNode]) -> dict[str, PrefetchPlan]:
+    """
+    Plans for every node after which the plate is known: the car detection
+    action and listening nodes that capture a spelled plate.
+    """
+    return {
+        name: plan_prefetch(nodes, name)
+        for name, node in nodes.items()
+        if node.action in PREFETCH_TRIGGERS or (node.listen and node.expect_plate)
+    }
+
+
+class TTLMemo:
+    """Thread-safe key -> Future memo; entries expire `ttl_s` after they are stored."""
+
+    def __init__(self, ttl_s: float):
+        self.ttl_s = ttl_s
+        self._entries: dict[Hashable, list] = {}  # key -> [expires_at, future, used]
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Future]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                return None
+            entry[2] = True
+            return entry[1]
+
+    def __contains__(self, key: Hashable) -> bool:
+        # Existence check only: unlike get, does not mark the entry as used
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry[0] >= time.monotonic()
+
+    def put(self, key: Hashable, future: Future) -> None:
+        with self._lock:
+            self._entries[key] = [time.monotonic() + self.ttl_s, future, False]
+
+    def purge(self) -> int:
+        """Drop expired entries; returns how many of them were never used."""
+        now = time.monotonic()
+        with self._lock:
+            expired = [key for key, entry in self._entries.items() if entry[0] < now]
+            unused = sum(1 for key in expired if not self._entries[key][2])
+            for key in expired:
+                del self._entries[key]
+        return unused
+
+    def clear(self) -> int:
+        """Drop every entry; returns how many of them were never used."""
+        with self._lock:
+            unused = sum(1 for entry in self._entries.values() if not entry[2])
+            self._entries.clear()
+        return unused
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class Prefetcher:
+    """
+    Speculative lookups and prompt renders for one lane.
+
+    `start(plan, context, tts)` runs the plan's repository lookups for the
+    current plate and renders its prompts into the TTS cache in the
+    background. `lookup(query, plate)` then serves the memoized result (waiting
+    for it if still running) or, on a miss, queries the repository directly.
+    Results live `ttl_s` seconds and are dropped when the next dialogue
+    starts (`reset`), so a new car never sees another car's lookups.
+    """
+
+    def __init__(self, repo, ttl_s: float = 30.0, max_workers: int = 2):
+        self.repo = repo
+        self.memo = TTLMemo(ttl_s)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prefetch")
+        self._totals = self._empty_counts()
+        self._dialogue = self._empty_counts()
+
+    @staticmethod
+    def _empty_counts() -> dict[str, int]:
+        return {"prefetched": 0, "hits": 0, "waited": 0, "misses": 0, "unused": 0, "prompts": 0}
+
+    def _count(self, field: str, n: int = 1) -> None:
+        self._totals[field] += n
+        self._dialogue[field] += n
+
+    def _submit(self, tracer, name: str, cat: str, fn, *args) -> Future:
+        # Background work shows up on the trace's "prefetch" track
+        if tracer is None:
+            return self._executor.submit(fn, *args)
+
+        def traced():
+            with tracer.span(name, cat, track="prefetch"):
+                return fn(*args)
+
+        return self._executor.submit(traced)
+
+    def start(self, plan: PrefetchPlan, context: dict[str, Any], tts=None, tracer=None) -> None:
+        self._count("unused", self.memo.purge())
+        plate = context.get("BS_N_LICPLA")
+        if plate:
+            for query in plan.queries:
+                key = (query, plate)
+                if key not in self.memo:
+                    future = self._submit(tracer, "prefetch:" + query, "db", getattr(self.repo, query), plate)
+                    self.memo.put(key, future)
+                    self._count("prefetched")
+
+        prerender = getattr(tts, "prerender", None)
+        if prerender is not None and plan.prompts:
+            texts: list[str] = []
+            for template in plan.prompts:
+                if is_static_prompt(template):
+                    texts.append(template.format())
+                else:
+                    # Static pieces plus the characters of this plate, not the whole alphabet
+                    texts.extend(seg["text"] for seg in render_segments(template, context) if seg["cache"])
+            texts = list(dict.fromkeys(texts))
+            self._count("prompts", len(texts))
+            self._submit(tracer, "tts.prerender", "tts", prerender, texts)
+
+    def reset(self) -> None:
+        self._count("unused", self.memo.clear())
+
+    def lookup(self, query: str, plate: str) -> Any:
+        future = self.memo.get((query, plate))
+        if future is not None:
+            self._count("hits" if future.done() else "waited")
+            try:
+                return future.result()
+            except Exception as e:
+                logger.warning("Prefetched %s(%r) failed, querying again: %s", query, plate, e)
+        else:
+            self._count("misses")
+        return getattr(self.repo, query)(plate)
+
+    @staticmethod
+    def _with_rate(counts: dict[str, int]) -> dict[str, Any]:
+        used = counts["hits"] + counts["waited"]
+        total = used + counts["misses"]
+        return dict(counts, hit_rate=round(used / total, 3) if total else None)
+
+    def end_dialogue(self) -> dict[str, Any]:
+        """Counts of the dialogue just finished (with hit rate); starts new ones."""
+        counts = self._with_rate(self._dialogue)
+        self._dialogue = self._empty_counts()
+        return counts
+
+    @property
+    def stats(self) -> dict[str, Any]:
+        return self._with_rate(self._totals)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+from string import Formatter
+from typing import Any
+
+# Slot name in a say: template -> (context key, spoken as single characters)
+SLOTS: dict[str, tuple[str, bool]] = {
+    "PLATE": ("BS_N_LICPLA", True),
+}
+
+# Characters a spelled slot can contain; pre-rendered with the static segments
+SPELL_ALPHABET = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
+
+SPELL_GAP_MS = 120
+
+
+def split_template(template: str) -> list[tuple[str, str]]:
+    """
+    Split a say: template into ("text", literal) and ("slot", name) parts.
+
+    "Is your plate: {PLATE} correct?" ->
+    [("text", "Is your plate:"), ("slot", "PLATE"), ("text", "correct?")]
+    Literals are whitespace-trimmed; empty ones are dropped.
+    """
+    parts: list[tuple[str, str]] = []
+    for literal, field, _, _ in Formatter().parse(template):
+        literal = literal.strip()
+        if literal:
+            parts.append(("text", literal))
+        if field is not None:
+            parts.append(("slot", field))
+    return parts
+
+
+def spell(value: str) -> list[str]:
+    """Characters of a slot value to be spoken one by one (spaces/dashes dropped)."""
+    return [ch for ch in value.upper() if ch.isalnum()]
+
+
+def is_static_prompt(text: str) -> bool:
+    """A template without {slots} sounds the same in every dialogue."""
+    return not any(field is not None for _, field, _, _ in Formatter().parse(text))
+
+
+def render_segments(template: str, context: dict[str, Any]) -> list[dict[str, Any]]:
+    """
+    Turn a template into TTS segments for `TTSService.speak_segments`.
+
+    Static literals and spelled characters are cacheable (`cache=True`), so
+    only free-form slot values are synthesized per turn. Spelled characters
+    are separated by a short pause instead of a crossfade.
+    """
+    segments: list[dict[str, Any]] = []
+    for kind, value in split_template(template):
+        if kind == "text":
+            segments.append({"text": value, "cache": True, "gap_ms": 0})
+            continue
+        key, spelled = SLOTS.get(value, (value, False))
+        slot_value = context.get(key)
+        slot_value = "" if slot_value is None else str(slot_value)
+        if spelled:
+            for i, ch in enumerate(spell(slot_value)):
+                segments.append({"text": ch, "cache": True, "gap_ms": SPELL_GAP_MS if i else 0})
+        elif slot_value.strip():
+            segments.append({"text": slot_value.strip(), "cache": False, "gap_ms": 0})
+    return segments
+
+
+def cacheable_fragments(template: str) -> list[str]:
+    """
+    Every cacheable text of a template: its static literals plus the spell
+    alphabet when it has a spelled slot. Used to pre-render the tree.
+    """
+    fragments = []
+    for kind, value in split_template(template):
+        if kind == "text":
+            fragments.append(value)
+        elif SLOTS.get(value, (value, False))[1]:
+            fragments.extend(SPELL_ALPHABET)
+    return fragments
@@ -1,28 +1,81 @@
+import itertools
+import threading
 import time
 import re
 
 from app.config import AppConfig
 from app.db.database import Database
 from app.db.repository import ConversationRepository
+from app.decision.prefetch import Prefetcher
+from app.decision.prompts import is_static_prompt, render_segments
+from app.nlu.confirmation import get_confirmation_model
+from app.tracing import Tracer, open_trace_sink
+
+# Метки фраз для адресного прерывания: TTS-воркер общий для всех дорожек
+_speech_tokens = itertools.count(1)
+
+
 class TreeActions:
-    def __init__(self, tree: dict, stt=None, tts=None):
+    def __init__(self, tree: dict, stt=None, tts=None, repo=None, db_writer=None, prefetch_ttl_s=None,
+                 trace_sink=None, speaker_device=None):
+        """
+        repo/db_writer передаются снаружи, когда диалогов несколько (дорожки
+        app.decision.lanes): один репозиторий и один поток записи на процесс.
+        С db_writer сессия сохраняется в фоне, commit_session не ждёт БД.
+        prefetch_ttl_s: сколько живут результаты упреждающих запросов
+        (app.decision.prefetch); 0 - без упреждения, None - из конфига.
+        trace_sink: куда писать трассу диалога (app.tracing): "" - никуда,
+        "db" - таблица traces, иначе путь к JSONL; None - из конфига.
+        speaker_device: выходное устройство PyAudio дорожки (None - по умолчанию).
+        """
         self.session_payload = {
             "interactions": []  # каждый элемент: {"action": ..., "response": ..., "raw_text": ...}
         }
-        cfg = AppConfig.from_env()
-        db = Database(cfg.db_path)
-        self.repo = ConversationRepository(db)
+        if repo is None or prefetch_ttl_s is None or trace_sink is None:
+            cfg = AppConfig.from_env()
+            repo = repo or ConversationRepository(Database(cfg.db_path))
+            prefetch_ttl_s = cfg.prefetch_ttl_s if prefetch_ttl_s is None else prefetch_ttl_s
+            trace_sink = cfg.trace_sink if trace_sink is None else trace_sink
+        self.repo = repo
+        self.db_writer = db_writer
+        # Мемо упреждающих запросов - в контексте дорожки, с TTL; сбрасывается с контекстом
+        self.prefetcher = Prefetcher(repo, ttl_s=prefetch_ttl_s) if prefetch_ttl_s > 0 else None
+        # Спаны диалога копятся в памяти и уходят вместе с сессией в commit_session
+        self.tracer = Tracer(enabled=bool(trace_sink))
+        self.trace_to_db = trace_sink == "db"
+        self.trace_file = open_trace_sink(trace_sink)
         self.tree = tree
         self.stt = stt
         self.tts = tts
-        self._sentiment_analyzer = None  # lazy init transformers pipeline
+        self.speaker_device = speaker_device
+        # Фоновое воспроизведение say(wait=False): поток, флаг "тишины",
+        # интервалы речи и интервалы, когда диалог просто ждал конца фразы
+        self._speech = None
+        self._speech_token = None
+        self._speech_done = threading.Event()
+        self._speech_done.set()
+        self.speech_intervals = []
+        self.wait_intervals = []
         # Определяем стартовый узел
         self.start_node = "start"
         if self.start_node not in tree:
             raise ValueError("В дереве отсутствует узел 'start'")
 
         # Контекст переменных
-        self.context = {
+        self.reset_context()
+
+    def reset_context(self):
+        """Контекст нового диалога (дорожка ведёт много диалогов подряд)."""
+        if getattr(self, "prefetcher", None) is not None:
+            self.prefetcher.reset()
+        if getattr(self, "tracer", None) is not None:
+            self.tracer.drain()  # спаны недоведённого диалога не попадают в следующий
+        self.context = self.initial_context()
+
+    @classmethod
+    def initial_context(cls):
+        """Переменные контекста со значениями по умолчанию (их имена проверяет компилятор дерева)."""
+        return {
             "plate_recognized": False,
             "failures": 0,
             "BS_N_LICPLA": "",
@@ -36,6 +89,12 @@ class TreeActions:
             "plate_confirmation": None,  # итог да/нет на подтверждении номера
         }
 
+    # Методы, которые может назвать дерево (их тоже проверяет компилятор дерева):
+    # действия узлов ("action"), счётчики ветвлений ("counter") и условия ("condition")
+    TREE_ACTIONS = frozenset({"detect_car", "open_barrier", "call_operator"})
+    TREE_COUNTERS = frozenset({"increment_failures"})
+    TREE_CONDITIONS = frozenset({"check_plate_recognized", "check_payment_status", "plate_confirmed"})
+
     # ----- ДЕЙСТВИЯ -----
 
     def detect_car(self):
@@ -51,42 +110,131 @@ class TreeActions:
             self.context["plate_recognized"] = False
             return False
 
-        history = self.repo.find_history_by_plate(plate)
+        history = self._lookup("find_history_by_plate", plate)
         recognized = len(history) > 0
         self.context["plate_recognized"] = recognized
         print(f"[CHECK] plate_recognized = {recognized}")
         self.context["T_MONTANT"] = history[0].get("T_MONTANT", 0) if recognized else 0
         return recognized
 
+    def prefetch(self, plan):
+        """
+        Номер известен (машина подъехала / номер продиктован): запросы и фразы
+        вероятных следующих узлов запускаются в фоне. Вызывает движок после
+        узлов из prefetch_plans.
+        """
+        if self.prefetcher is not None:
+            self.prefetcher.start(plan, self.context, tts=self.tts, tracer=self.tracer)
+
+    def _lookup(self, query, plate):
+        # Запрос к репозиторию через мемо упреждения (если оно включено)
+        with self.tracer.span("db:" + query, "db", plate=plate):
+            if self.prefetcher is not None:
+                return self.prefetcher.lookup(query, plate)
+            return getattr(self.repo, query)(plate)
+
     # def detect_plate(self):
     #     print("[ACTION] detect_plate")
     #     self.context["plate_recognized"] = True
     #     return True
 
-    def say(self, text: str):
+    def say(self, text: str, wait: bool = True):
+        """
+        wait=False - фраза играет в фоне, а диалог идёт дальше (проверки, БД);
+        дождаться её можно через wait_speech(), listen открывает микрофон
+        заранее и начинает слушать по окончании фразы.
+        """
         # Подставляем номер авто в фразы вида {PLATE}
         formatted = text.format(PLATE=self.context.get("BS_N_LICPLA", ""))
 
         print("[SAY]", formatted)
         if self.tts:
-            try:
-                import threading
-                t = threading.Thread(target=self.tts.speak, args=(formatted,))
-                t.start()
-                t.join() 
-            except Exception as e:
-                print("[ERROR] TTS failed:", e)
+            self.wait_speech()  # фразы не накладываются друг на друга
+            self._speech_done.clear()
+            # Метка выдаётся здесь, а не когда воркер возьмёт фразу: barge-in,
+            # пришедший, пока фраза ждёт очереди, не потеряется
+            self._speech_token = next(_speech_tokens)
+            self._speech = threading.Thread(
+                target=self._speak, args=(text, formatted, self._speech_token), name="tts-say", daemon=True
+            )
+            self._speech.start()
+            if wait:
+                self.wait_speech()
         return True
 
+    def _speak(self, text: str, formatted: str, token: int):
+        started = time.perf_counter()
+        try:
+            if is_static_prompt(text):
+                stats = self.tts.speak(formatted, cache=True, token=token, device=self.speaker_device)
+            else:
+                # Статичные куски шаблона — из кэша, синтезируется только слот
+                stats = self.tts.speak_segments(
+                    render_segments(text, self.context), token=token, device=self.speaker_device
+                )
+        except Exception as e:
+            print("[ERROR] TTS failed:", e)
+            stats = None
+        finally:
+            finished = time.perf_counter()
+            self.speech_intervals.append((started, finished))
+            self._speech_done.set()
+        if stats:
+            # Время до первого звука: от запроса до первого сэмпла (stream) / старта плеера (file)
+            first = stats["first_audio_s"]
+            print(
+                f"[TTS] first_audio={first:.2f}s total={stats['total_s']:.2f}s "
+                f"mode={stats['mode']} cache={stats['cache']}"
+                + (" interrupted" if stats["interrupted"] else "")
+                if first is not None else f"[TTS] no audio ({stats['error'] or 'playback failed'})"
+            )
+            stats = {k: v for k, v in stats.items() if k != "cache_stats"}
+            # Ожидание своей очереди к общему TTS-воркеру (несколько дорожек)
+            stats["queued_s"] = round(max(0.0, finished - started - (stats["total_s"] or 0.0)), 3)
+            self.session_payload.setdefault("tts", []).append({"text": formatted, **stats})
+            self._trace_speech(formatted, started, finished, stats)
+        else:
+            self.tracer.add("say", "tts", started, finished, track="speech", text=formatted, error=True)
+
+    def _trace_speech(self, formatted, started, finished, stats):
+        # Фраза на дорожке речи: очередь к воркеру -> до первого звука -> воспроизведение
+        tracer = self.tracer
+        tracer.add(
+            "say", "tts", started, finished, track="speech",
+            text=formatted, mode=stats["mode"], cache=stats["cache"],
+            synth_s=stats["synth_s"], interrupted=stats["interrupted"],
+        )
+        # total_s считает сам TTS-воркер; всё, что до него, - ожидание очереди
+        served_at = max(started, finished - (stats["total_s"] or 0.0))
+        if served_at > started:
+            tracer.add("tts.queue", "tts", started, served_at, track="speech")
+        if stats["first_audio_s"] is not None:
+            first_audio_at = min(finished, served_at + stats["first_audio_s"])
+            tracer.add("tts.synth", "tts", served_at, first_audio_at, track="speech")
+            tracer.add("tts.playback", "tts", first_audio_at, finished, track="speech")
+
+    def wait_speech(self):
+        """Ждёт окончания фразы, запущенной say(wait=False)."""
+        if self._speech is not None:
+            started = time.perf_counter()
+            self._speech.join()
+            self.wait_intervals.append((started, time.perf_counter()))
+            self._speech = None
+
+    def interrupt_speech(self):
+        """Barge-in: обрывает текущую фразу этой дорожки (фразы других не трогает)."""
+        if self.tts and self._speech is not None:
+            self.tts.interrupt(self._speech_token)
+
     def check_payment_status(self):
         print("[ACTION] check_payment_status")
         # Проверяем контекст на наличие неоплаченного долга
-        has_no_debt = self.repo.has_no_debt(self.context.get("BS_N_LICPLA", ""))
+        has_no_debt = self._lookup("has_no_debt", self.context.get("BS_N_LICPLA", ""))
         self.context["T_MONTANT"] = has_no_debt
         if has_no_debt:
             print("[CHECK] Долга нет")
         else:
-            debt = self.repo.find_history_debts_by_plate(self.context.get("BS_N_LICPLA", ""))
+            debt = self._lookup("find_history_debts_by_plate", self.context.get("BS_N_LICPLA", ""))
             print(f"[CHECK] Есть долг: {debt}")
             return False
         
@@ -100,22 +248,48 @@ class TreeActions:
         print("[ACTION] call_operator")
         return True
 
-    def listen(self, duration=7, timeout=10, expect_plate=True):
+    def listen(self, duration=7, timeout=10, expect_plate=True, stt_profile=None, barge_in=False):
         if self.stt is None:
             raise ValueError("STT-модуль не инициализирован!")
 
+        # Если фраза ещё играет — микрофон открывается сразу ("предвзведён"),
+        # а слушать начинаем по её окончании; barge_in - речь клиента обрывает фразу
+        gate = self._speech_done if self._speech is not None else None
+
         result_queue = []
+        early_confirmation = []
+        heard_at = []
+        stats_before = getattr(self.stt, "last_utterance_stats", None)
+        listen_started = time.perf_counter()
 
         def on_transcript(text: str, lang: str) -> None:
+            heard_at.append(time.perf_counter())
             print(f"[LISTEN] Распознано [{lang}]: {text}")
             result_queue.append(text)
 
-        print(f"[LISTEN] Слушаю микрофон {duration} секунд...")
+        def on_partial(committed: str, tentative: str, lang: str) -> None:
+            # Для да/нет не ждём конца фразы: как только ответ зафиксирован — стоп
+            if early_confirmation or not committed:
+                return
+            if self._parse_confirmation(committed) is not None:
+                print(f"[LISTEN] Стабильный ответ [{lang}]: {committed}")
+                early_confirmation.append(committed)
+                result_queue.append(committed)
+                self.stt.request_stop()
+
+        print(f"[LISTEN] Слушаю микрофон (до {duration} секунд, до конца фразы)...")
         self.stt.transcribe_microphone(
             duration=duration,
             callback=on_transcript,
-            show_resources=False
+            show_resources=False,
+            stop_on_utterance=True,
+            partial_callback=None if expect_plate else on_partial,
+            cascade=stt_profile,
+            gate=gate,
+            barge_in=self.interrupt_speech if gate is not None and barge_in else None,
         )
+        self.wait_speech()
+        self._trace_listen(listen_started, heard_at, stats_before, expect_plate)
 
         waited = 0
         while not result_queue and waited < timeout:
@@ -146,6 +320,20 @@ class TreeActions:
         print(f"[LISTEN] Подтверждение номера: {confirmation}")
         return user_input
 
+    def _trace_listen(self, started, heard_at, stats_before, expect_plate):
+        # Спан прослушивания и, если STT отдал статистику фразы, декодирования внутри него
+        ended = time.perf_counter()
+        self.tracer.add("listen", "stt", started, ended, expect_plate=expect_plate)
+        stats = getattr(self.stt, "last_utterance_stats", None)
+        if not heard_at or not stats or stats is stats_before or stats.get("decode_s") is None:
+            return
+        decoded_at = heard_at[0]
+        self.tracer.add(
+            "stt.decode", "stt", max(started, decoded_at - stats["decode_s"]), decoded_at,
+            model=stats.get("model"), audio_s=stats.get("audio_s"),
+            reason=stats.get("reason"), escalations=stats.get("escalations"),
+        )
+
     def _parse_confirmation(self, text: str):
         normalized = text.strip().lower()
         yes_words = {
@@ -192,36 +380,21 @@ class TreeActions:
             return False
         return None
 
-    def _get_sentiment_analyzer(self):
-        if self._sentiment_analyzer is False:
-            return None
-        if self._sentiment_analyzer is None:
-            try:
-                from transformers import pipeline
-                self._sentiment_analyzer = pipeline("sentiment-analysis")
-            except Exception as e:
-                print(f"[WARN] Sentiment analyzer unavailable: {e}")
-                self._sentiment_analyzer = False
-        return self._sentiment_analyzer or None
-
     def _predict_confirmation_with_transformers(self, text: str):
-        analyzer = self._get_sentiment_analyzer()
-        if analyzer is None:
-            return None
-        try:
-            # pipeline может принимать строку или список; отдаёт label + score
-            result = analyzer(text)[0]
-            label = str(result.get("label", "")).lower()
-            score = float(result.get("score", 0))
-            if score < 0.55:
-                return None
-            if "pos" in label or label.endswith("1"):
-                return True
-            if "neg" in label or label.endswith("0"):
-                return False
-        except Exception as e:
-            print(f"[WARN] Sentiment inference failed: {e}")
-        return None
+        # Модель общая на процесс и грузится в фоне при старте (app.nlu.confirmation);
+        # повторные ответы берутся из LRU-кэша без инференса
+        started = time.perf_counter()
+        result = get_confirmation_model().classify(text)
+        self.tracer.add(
+            "nlu.sentiment", "nlu", started, time.perf_counter(),
+            cached=result["cached"], confirmation=result["confirmation"],
+        )
+        print(
+            f"[SENTIMENT] {result['label']} score={result['score']} "
+            f"inference={result['inference_s'] * 1000:.1f}ms cached={result['cached']}"
+        )
+        self.session_payload.setdefault("sentiment", []).append({"text": text, **result})
+        return result["confirmation"]
 
     # ----- СЧЕТЧИКИ -----
 
@@ -247,16 +420,6 @@ class TreeActions:
         print(f"[CHECK] plate_confirmation = {result}")
         return result is True
 
-    def evaluate_condition(self, expression: str) -> bool:
-        # Если expression — имя метода класса
-        if hasattr(self, expression.replace("()", "")):
-            return getattr(self, expression.replace("()", ""))()
-        try:
-            return bool(eval(expression, {}, self.context))
-        except Exception as e:
-            print("[ERROR] eval:", expression, e)
-            return False
-
 #логирование взаимодействий с пользователем
     def buffer_interaction(self, action: str, response: str):
         """
@@ -272,24 +435,39 @@ class TreeActions:
         Сохраняем все накопленные взаимодействия за проход в один decision
         """
         slots = slots or {}
+        prefetch = self.prefetcher.end_dialogue() if self.prefetcher is not None else None
+        if prefetch is not None:
+            self.session_payload["prefetch"] = prefetch
         payload = {
             "intent": final_intent,
             "payload": self.session_payload, 
             "slots": slots
         }
 
-        # Сохраняем как один transcript и decision
-        transcript_id = self.repo.save_transcript(
-            text=" | ".join([i["raw_text"] for i in self.session_payload["interactions"]]),
-            language=self.stt.last_detected_language if hasattr(self.stt, "last_detected_language") else None
-        )
-
-        self.repo.save_decision(
-            transcript_id=transcript_id,
-            intent=final_intent,
-            payload=payload
+        text = " | ".join([i["raw_text"] for i in self.session_payload["interactions"]])
+        language = self.stt.last_detected_language if hasattr(self.stt, "last_detected_language") else None
+        trace = self.tracer.drain(
+            intent=final_intent, tree_version=self.session_payload.get("tree_version"), lane=self.tracer.name
         )
+        db_trace = trace if self.trace_to_db else None
+        if self.db_writer is not None:
+            # Запись идёт в общем потоке записи, диалог не ждёт БД
+            self.db_writer.submit(self.repo.save_session, text, language, final_intent, payload, db_trace)
+            if trace is not None and self.trace_file is not None:
+                self.db_writer.submit(self.trace_file.write, trace)
+        else:
+            # Сохраняем как один transcript и decision (и трассу) одной транзакцией
+            self.repo.save_session(text, language, final_intent, payload, db_trace)
+            if trace is not None and self.trace_file is not None:
+                self.trace_file.write(trace)
 
         print(f"[LOG] Session committed with intent '{final_intent}'")
+        if prefetch is not None:
+            print(
+                f"[PREFETCH] hits={prefetch['hits']} waited={prefetch['waited']} "
+                f"misses={prefetch['misses']} hit_rate={prefetch['hit_rate']}"
+            )
         # Очищаем буфер
         self.session_payload = {"interactions": []}
+        self.speech_intervals = []
+        self.wait_intervals = []
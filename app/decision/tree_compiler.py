@@ -0,0 +1,281 @@
+from __future__ import annotations
+
+import ast
+import operator
+from dataclasses import dataclass
+from typing import Any, Callable, Optional, Union
+
+# A compiled condition: called with the TreeActions instance, returns bool
+Condition = Callable[[Any], bool]
+
+_BIN_OPS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+}
+_CMP_OPS = {
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+}
+_UNARY_OPS = {
+    ast.USub: operator.neg,
+    ast.UAdd: operator.pos,
+    ast.Not: operator.not_,
+}
+
+
+class TreeCompileError(ValueError):
+    """Raised when decision_tree.json is inconsistent (bad refs, unknown actions, bad conditions)."""
+
+
+@dataclass(frozen=True)
+class Branch:
+    """
+    Where a condition leads: a node id, or a nested
+    {"counter", "condition", "yes", "no"} step evaluated in place.
+    """
+
+    target: Optional[str] = None
+    counter: Optional[str] = None
+    condition: Optional[Condition] = None
+    yes: Optional["Branch"] = None
+    no: Optional["Branch"] = None
+
+    def resolve(self, actions: Any) -> str:
+        if self.counter:
+            getattr(actions, self.counter)()
+        if self.condition is None:
+            return self.target
+        return (self.yes if self.condition(actions) else self.no).resolve(actions)
+
+
+@dataclass(frozen=True)
+class CompiledNode:
+    name: str
+    kind: Optional[str] = None  # "say" | "action" | "end" | None
+    text: Optional[str] = None  # say: text, already split off the action string
+    action: Optional[str] = None  # TreeActions method name
+    listen: bool = False
+    expect_plate: bool = True
+    stt: Optional[dict] = None
+    barge_in: Optional[bool] = None
+    condition: Optional[Condition] = None
+    source: Optional[str] = None  # condition as written, for logs
+    yes: Optional[Branch] = None
+    no: Optional[Branch] = None
+    next: Optional[str] = None
+
+
+def compile_condition(expression: str, actions_cls: type, names: set[str]) -> Condition:
+    """
+    Parse a condition once into a closure.
+
+    Two forms are accepted, matching the legacy interpreter:
+    `method()` / `method` - a method listed in `actions_cls.TREE_CONDITIONS`, and arithmetic/comparison
+    expressions over context variables (`CUR_TIME - DHMP < N`). Only names,
+    numeric/string constants, arithmetic, comparisons and and/or/not are
+    allowed; anything else (calls, attributes, subscripts) is rejected.
+    """
+    if not isinstance(expression, str):
+        raise TreeCompileError(f"condition {expression!r}: expected a string")
+    method = expression.strip().removesuffix("()")
+    if method.isidentifier() and callable(getattr(actions_cls, method, None)):
+        if method not in getattr(actions_cls, "TREE_CONDITIONS", ()):
+            raise TreeCompileError(f"condition {expression!r}: {method!r} is not a tree condition")
+        call = operator.methodcaller(method)
+        return lambda actions: bool(call(actions))
+
+    try:
+        tree = ast.parse(expression, mode="eval")
+    except SyntaxError as e:
+        raise TreeCompileError(f"condition {expression!r}: {e.msg}") from None
+    evaluate = _compile_expr(tree.body, expression, names)
+
+    def condition(actions: Any) -> bool:
+        try:
+            return bool(evaluate(actions.context))
+        except Exception as e:
+            # Same runtime contract as the legacy eval: report and take the "no" branch
+            print("[ERROR] condition:", expression, e)
+            return False
+
+    return condition
+
+
+def _compile_expr(node: ast.AST, source: str, names: set[str]) -> Callable[[dict], Any]:
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float, str, bool, type(None))):
+        value = node.value
+        return lambda ctx: value
+    if isinstance(node, ast.Name):
+        if node.id not in names:
+            raise TreeCompileError(f"condition {source!r}: unknown variable {node.id!r}")
+        key = node.id
+        return lambda ctx: ctx[key]
+    if isinstance(node, ast.BinOp) and type(node.op) in _BIN_OPS:
+        op = _BIN_OPS[type(node.op)]
+        left = _compile_expr(node.left, source, names)
+        right = _compile_expr(node.right, source, names)
+        return lambda ctx: op(left(ctx), right(ctx))
+    if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY_OPS:
+        op = _UNARY_OPS[type(node.op)]
+        operand = _compile_expr(node.operand, source, names)
+        return lambda ctx: op(operand(ctx))
+    if isinstance(node, ast.BoolOp):
+        values = [_compile_expr(v, source, names) for v in node.values]
+        if isinstance(node.op, ast.And):
+            return lambda ctx: all(v(ctx) for v in values)
+        return lambda ctx: any(v(ctx) for v in values)
+    if isinstance(node, ast.Compare) and all(type(op) in _CMP_OPS for op in node.ops):
+        if len(node.ops) == 1:
+            op = _CMP_OPS[type(node.ops[0])]
+            left = _compile_expr(node.left, source, names)
+            right = _compile_expr(node.comparators[0], source, names)
+            return lambda ctx: op(left(ctx), right(ctx))
+        ops = [_CMP_OPS[type(op)] for op in node.ops]
+        operands = [_compile_expr(n, source, names) for n in [node.left, *node.comparators]]
+
+        def chained(ctx: dict) -> bool:
+            values = [operand(ctx) for operand in operands]
+            return all(op(a, b) for op, a, b in zip(ops, values, values[1:]))
+
+        return chained
+    raise TreeCompileError(
+        f"condition {source!r}: {type(node).__name__} is not allowed in tree conditions"
+    )
+
+
+class _TreeCompiler:
+    def __init__(self, tree: dict[str, Any], actions_cls: type, names: set[str]) -> None:
+        self.tree = tree
+        self.actions_cls = actions_cls
+        self.names = names
+        # The same condition text (e.g. "failures >= 2") is parsed once per tree
+        self._conditions: dict[str, Condition] = {}
+
+    def condition(self, expression: str) -> Condition:
+        if not isinstance(expression, str):
+            raise TreeCompileError(f"condition {expression!r}: expected a string")
+        compiled = self._conditions.get(expression)
+        if compiled is None:
+            compiled = compile_condition(expression, self.actions_cls, self.names)
+            self._conditions[expression] = compiled
+        return compiled
+
+    def has_method(self, name: str, allowed: str) -> bool:
+        # Only the methods the actions class lists for the tree (`allowed`: TREE_ACTIONS / TREE_COUNTERS)
+        return (
+            isinstance(name, str)
+            and name in getattr(self.actions_cls, allowed, ())
+            and callable(getattr(self.actions_cls, name, None))
+        )
+
+    def branch(self, spec: Union[str, dict], where: str) -> Branch:
+        if isinstance(spec, str):
+            if spec not in self.tree:
+                raise TreeCompileError(f"{where}: unknown node {spec!r}")
+            return Branch(target=spec)
+        if not isinstance(spec, dict):
+            raise TreeCompileError(f"{where}: branch must be a node id or an object, got {spec!r}")
+
+        counter = spec.get("counter")
+        if counter is not None and not self.has_method(counter, "TREE_COUNTERS"):
+            raise TreeCompileError(f"{where}: unknown counter {counter!r}")
+        if "condition" not in spec or "yes" not in spec or "no" not in spec:
+            raise TreeCompileError(f"{where}: nested branch needs condition, yes and no")
+        return Branch(
+            counter=counter,
+            condition=self.condition(spec["condition"]),
+            yes=self.branch(spec["yes"], f"{where}.yes"),
+            no=self.branch(spec["no"], f"{where}.no"),
+        )
+
+    def node(self, name: str, raw: dict) -> CompiledNode:
+        if not isinstance(raw, dict):
+            raise TreeCompileError(f"node {name!r}: expected an object")
+        fields: dict[str, Any] = {"name": name}
+
+        action = raw.get("action")
+        if action is not None:
+            if not isinstance(action, str):
+                raise TreeCompileError(f"node {name!r}: action must be a string, got {action!r}")
+            if action.startswith("say:"):
+                fields.update(kind="say", text=action.split("say:", 1)[1].strip())
+            elif action == "end":
+                fields["kind"] = "end"
+            elif self.has_method(action, "TREE_ACTIONS"):
+                fields.update(kind="action", action=action)
+            else:
+                raise TreeCompileError(f"node {name!r}: unknown action {action!r}")
+
+        if raw.get("listen"):
+            fields.update(
+                listen=True,
+                expect_plate=raw.get("listen_for", "plate") == "plate",
+                stt=raw.get("stt"),
+                barge_in=raw.get("barge_in"),
+            )
+
+        if "condition" in raw:
+            if "yes" not in raw or "no" not in raw:
+                raise TreeCompileError(f"node {name!r}: condition needs both yes and no")
+            fields.update(
+                condition=self.condition(raw["condition"]),
+                source=raw["condition"],
+                yes=self.branch(raw["yes"], f"node {name!r}.yes"),
+                no=self.branch(raw["no"], f"node {name!r}.no"),
+            )
+        elif "next" in raw:
+            if not isinstance(raw["next"], str) or raw["next"] not in self.tree:
+                raise TreeCompileError(f"node {name!r}: unknown next node {raw['next']!r}")
+            fields["next"] = raw["next"]
+
+        return CompiledNode(**fields)
+
+
+def _branch_targets(branch: Optional[Branch]) -> list[str]:
+    if branch is None:
+        return []
+    if branch.condition is None:
+        return [branch.target]
+    return _branch_targets(branch.yes) + _branch_targets(branch.no)
+
+
+def successors(node: CompiledNode) -> list[str]:
+    """Node ids a node can lead to (next, and every leaf of its yes/no branches)."""
+    return [t for t in [node.next, *_branch_targets(node.yes), *_branch_targets(node.no)] if t]
+
+
+def unreachable_nodes(nodes: dict[str, CompiledNode], start: str = "start") -> list[str]:
+    seen = {start}
+    stack = [start]
+    while stack:
+        for target in successors(nodes[stack.pop()]):
+            if target not in seen:
+                seen.add(target)
+                stack.append(target)
+    return [name for name in nodes if name not in seen]
+
+
+def compile_tree(tree: dict[str, Any], actions_cls: type, context_names: set[str],
+                 start: str = "start") -> dict[str, CompiledNode]:
+    """
+    Validate a decision tree and compile every node once.
+
+    `actions_cls` is the TreeActions class: actions, counters and
+    method-conditions must be listed in its `TREE_ACTIONS`, `TREE_COUNTERS`
+    and `TREE_CONDITIONS`; `context_names` are the variables
+    expression conditions may use. Raises TreeCompileError on the first
+    problem (unknown node reference, action, counter, variable, or a
+    condition outside the allowed grammar).
+    """
+    if start not in tree:
+        raise TreeCompileError(f"tree has no {start!r} node")
+    compiler = _TreeCompiler(tree, actions_cls, set(context_names))
+    return {name: compiler.node(name, raw) for name, raw in tree.items()}
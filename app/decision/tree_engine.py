@@ -1,84 +1,202 @@
 # tree_engine.py
-import json
+import copy
+import time
 from app.decision.tree_actions import TreeActions
+from app.decision.tree_store import TreeStore, stt_model_sizes
+from app.tracing import NULL_TRACER
 
 class DecisionTreeEngine:
-    def __init__(self, json_path):
-        with open(json_path, "r", encoding="utf-8") as f:
-            self.tree = json.load(f)
-
-        self.actions = TreeActions(tree=self.tree)
+    def __init__(self, json_path=None, barge_in=False, actions=None, store=None):
+        """
+        store: общий TreeStore процесса (горячая перезагрузка дерева); без него
+        дерево из json_path загружается и компилируется здесь, один раз.
+        """
+        # actions можно подставить снаружи (бенчмарки, тесты без БД/аудио)
+        if store is None:
+            # Дерево проверяется и компилируется при загрузке: ссылки на узлы, имена
+            # action/counter, условия -> замыкания. Ошибка в дереве - исключение здесь.
+            store = TreeStore(
+                json_path,
+                actions_cls=type(actions) if actions is not None else TreeActions,
+                context_names=set(actions.context) if actions is not None else None,
+            )
+        self.store = store
+        self.actions = actions if actions is not None else TreeActions(tree=store.current.tree)
+        # Прерывание фразы речью клиента; узел может переопределить ("barge_in": true/false)
+        self.barge_in = barge_in
+        self.node_timings = []
+        self._use_version(store.current)
+
+    def _use_version(self, version):
+        self.version = version
+        self.tree = version.tree
+        self.nodes = version.nodes
+        # Узлы, после которых известен номер: отсюда запускается упреждение
+        # (запросы к БД и фразы вероятных следующих узлов)
+        self.prefetch_plans = version.prefetch_plans if hasattr(self.actions, "prefetch") else {}
+
+    def begin_dialogue(self):
+        """
+        Берёт актуальную версию дерева из store: новая версия подхватывается
+        только здесь, между диалогами, никогда посреди диалога.
+        """
+        version = self.store.current
+        if version is not self.version:
+            print(f"[TREE] {self.version.version} -> {version.version}")
+            self._use_version(version)
+        self.node_timings = []
+
+    def stt_model_sizes(self):
+        """
+        Все модели Whisper, упомянутые в каскадах узлов ("stt": {"models": [...]}).
+        """
+        return stt_model_sizes(self.tree)
+
+    def static_prompts(self):
+        """
+        Всё, что можно отрендерить заранее: say:-фразы без подстановок целиком,
+        у шаблонов — статичные куски (и алфавит для слотов, читаемых по буквам).
+        """
+        return list(self.version.prompts)
+
+    def _enter_node(self, node_name):
+        """
+        Закрывает интервал предыдущего узла и открывает новый (node_name=None - конец).
+        """
+        now = time.perf_counter()
+        if self.node_timings and self.node_timings[-1][2] is None:
+            name, started, _ = self.node_timings[-1]
+            self.node_timings[-1] = (name, started, now)
+            self._tracer().add(name, "node", started, now)
+        if node_name is not None:
+            self.node_timings.append((node_name, now, None))
+
+    def _tracer(self):
+        # Трасса диалога живёт в TreeActions; у подставных actions её может не быть
+        return getattr(self.actions, "tracer", NULL_TRACER)
+
+    def timing_report(self):
+        """
+        Время узлов и перекрытие с речью: overlap - сколько времени узел
+        работал (проверки, БД, предвзведённый микрофон), пока играла фраза;
+        ожидание конца фразы (wait_speech) в перекрытие не входит.
+        """
+        speech = self.actions.speech_intervals
+        waits = self.actions.wait_intervals
+
+        def intersect(start, end, intervals):
+            return sum(max(0.0, min(end, i_end) - max(start, i_start)) for i_start, i_end in intervals)
+
+        nodes = []
+        for name, started, ended in self.node_timings:
+            ended = ended if ended is not None else time.perf_counter()
+            overlap = max(0.0, intersect(started, ended, speech) - intersect(started, ended, waits))
+            nodes.append({"node": name, "wall_s": round(ended - started, 3), "overlap_s": round(overlap, 3)})
+        dialogue_s = (
+            (self.node_timings[-1][2] or time.perf_counter()) - self.node_timings[0][1]
+            if self.node_timings else 0.0
+        )
+        return {
+            "nodes": nodes,
+            "dialogue_s": round(dialogue_s, 3),
+            "speech_s": round(sum(e - s for s, e in speech), 3),
+            "overlap_s": round(sum(n["overlap_s"] for n in nodes), 3),
+        }
+
+    def _finish(self, final_intent):
+        """
+        Дожидается последней фразы, пишет отчёт по времени и сохраняет сессию.
+        """
+        self.actions.wait_speech()
+        self._enter_node(None)
+        if self.node_timings:
+            self._tracer().add(
+                "dialogue", "dialogue", self.node_timings[0][1], self.node_timings[-1][2],
+                intent=final_intent, tree_version=self.version.version,
+            )
+        report = self.timing_report()
+        for n in report["nodes"]:
+            print(f"[TIMING] {n['node']}: wall={n['wall_s']}s overlap={n['overlap_s']}s")
+        print(
+            f"[TIMING] dialogue={report['dialogue_s']}s speech={report['speech_s']}s "
+            f"overlap={report['overlap_s']}s"
+        )
+        self.actions.session_payload["timing"] = report
+        self.actions.session_payload["tree_version"] = self.version.version
+        self.actions.commit_session(final_intent=final_intent)
+
+    def with_actions(self, actions):
+        """
+        Движок над тем же скомпилированным деревом, но со своим TreeActions
+        и своими таймингами (дорожки app.decision.lanes: дерево одно на процесс).
+        """
+        engine = copy.copy(self)
+        engine.actions = actions
+        engine.node_timings = []
+        return engine
 
     def run(self, start_node="start", final_intent="fallback"):
         current = start_node
-
-        while True:
-            node = self.tree[current]
-            print(f"\n=== NODE: {current} ===")
-
-            # ----- 1. Выполнить action -----
-            if "action" in node:
-                action = node["action"]
-
-                if action.startswith("say:"):
-                    text = action.split("say:", 1)[1].strip()
-                    self.actions.say(text)
-                    self.actions.buffer_interaction(action="say", response=text)
-
-                elif hasattr(self.actions, action):
-                    getattr(self.actions, action)()
-                    self.actions.buffer_interaction(action=action, response="")
-
-                elif action == "end":
-                    # Конец диалога — сохраняем всю сессию одним решением
-                    self.actions.commit_session(final_intent=final_intent)
-                    print("\n[DONE] Dialogue finished.")
-                    return
-
-                else:
-                    print("[WARNING] Unknown action:", action)
-
-            # ----- 2. Слушаем пользователя -----
-            if node.get("listen"):
-                listen_for = node.get("listen_for", "plate")
-                expect_plate = listen_for == "plate"
-                user_input = self.actions.listen(expect_plate=expect_plate)
-                print(f"[CONTEXT] last_input = {user_input}")
-                self.actions.buffer_interaction(action="listen", response="")
-
-            # ----- 3. Проверка условий -----
-            if "condition" in node:
-                condition = node["condition"]
-                result = self.actions.evaluate_condition(condition)
-
-                if result:
-                    next_node = node["yes"]
-                else:
-                    next_node = node["no"]
-
-                # Если ветка "no" — вложенный объект с counter/condition
-                if isinstance(next_node, dict):
-                    if "counter" in next_node:
-                        getattr(self.actions, next_node["counter"])()
-
-                    cond2 = next_node.get("condition")
-                    if cond2:
-                        if self.actions.evaluate_condition(cond2):
-                            current = next_node["yes"]
-                        else:
-                            current = next_node["no"]
-                        continue
-                else:
-                    current = next_node
-                    continue
-
-            # ----- 4. Просто next -----
-            elif "next" in node:
-                current = node["next"]
-                continue
-
-            else:
-                # Нет next и нет action — диалог закончился
-                self.actions.commit_session(final_intent=final_intent)
-                print("[ERROR] Node has no next step, committing session:", current)
-                return
+        self.begin_dialogue()
+        while current is not None:
+            current = self.step(current, final_intent)
+
+    def step(self, current, final_intent="fallback"):
+        """
+        Выполняет один узел; возвращает имя следующего или None, если диалог завершён.
+        """
+        node = self.nodes[current]
+        actions = self.actions
+        self._enter_node(current)
+        print(f"\n=== NODE: {current} ===")
+
+        # ----- 1. Выполнить action -----
+        if node.kind == "say":
+            # Фраза играет в фоне; следующий say/listen/end её дождётся
+            actions.say(node.text, wait=False)
+            actions.buffer_interaction(action="say", response=node.text)
+
+        elif node.kind == "action":
+            getattr(actions, node.action)()
+            actions.buffer_interaction(action=node.action, response="")
+
+        elif node.kind == "end":
+            # Конец диалога — сохраняем всю сессию одним решением
+            self._finish(final_intent)
+            print("\n[DONE] Dialogue finished.")
+            return None
+
+        # ----- 2. Слушаем пользователя -----
+        if node.listen:
+            user_input = actions.listen(
+                expect_plate=node.expect_plate,
+                stt_profile=node.stt,
+                barge_in=self.barge_in if node.barge_in is None else node.barge_in,
+            )
+            print(f"[CONTEXT] last_input = {user_input}")
+            actions.buffer_interaction(action="listen", response="")
+
+        plan = self.prefetch_plans.get(current)
+        if plan is not None:
+            actions.prefetch(plan)
+
+        # ----- 3. Проверка условий (скомпилированы при загрузке) -----
+        if node.condition is not None:
+            started = time.perf_counter()
+            result = node.condition(actions)
+            # Вложенная ветка с counter/condition разрешается тут же
+            next_node = (node.yes if result else node.no).resolve(actions)
+            self._tracer().add(
+                "condition", "condition", started, time.perf_counter(),
+                condition=node.source, result=bool(result), next=next_node,
+            )
+            return next_node
+
+        # ----- 4. Просто next -----
+        if node.next is not None:
+            return node.next
+
+        # Нет next и нет action — диалог закончился
+        self._finish(final_intent)
+        print("[ERROR] Node has no next step, committing session:", current)
+        return None
@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+from app.decision.prefetch import PrefetchPlan, prefetch_plans
+from app.decision.prompts import cacheable_fragments, is_static_prompt
+from app.decision.tree_compiler import CompiledNode, TreeCompileError, compile_tree, unreachable_nodes
+
+logger = logging.getLogger(__name__)
+
+# listener(old, new), called on the watcher thread after a swap
+Listener = Callable[["TreeVersion", "TreeVersion"], None]
+
+
+def static_prompts(tree: dict[str, Any]) -> list[str]:
+    """
+    Everything that can be rendered ahead: whole say: texts without slots and,
+    for templates, their static pieces (plus the alphabet of spelled slots).
+    """
+    prompts: list[str] = []
+    for node in tree.values():
+        action = node.get("action", "") if isinstance(node, dict) else ""
+        if action.startswith("say:"):
+            text = action.split("say:", 1)[1].strip()
+            texts = [text.format()] if is_static_prompt(text) else cacheable_fragments(text)
+            prompts.extend(t for t in texts if t not in prompts)
+    return prompts
+
+
+def stt_model_sizes(tree: dict[str, Any]) -> list[str]:
+    """Every Whisper model named in node cascades ("stt": {"models": [...]})."""
+    sizes: list[str] = []
+    for node in tree.values():
+        if not isinstance(node, dict):
+            continue
+        for size in node.get("stt", {}).get("models", []):
+            if size not in sizes:
+                sizes.append(size)
+    return sizes
+
+
+@dataclass(frozen=True)
+class TreeVersion:
+    version: str  # sha256 of the file content, first 12 hex chars
+    tree: dict[str, Any]
+    nodes: dict[str, CompiledNode]
+    prefetch_plans: dict[str, PrefetchPlan]
+    prompts: list[str]
+    loaded_at: float = field(default_factory=time.time)
+
+
+class TreeStore:
+    """
+    Single owner of decision_tree.json for the whole process.
+
+    The file is read, validated and compiled into an immutable `TreeVersion`.
+    `start()` launches a watcher thread that polls the file's mtime/size every
+    `poll_s` seconds and, when the content hash changed, compiles the new
+    version on that thread and swaps `current` in one assignment. A tree that
+    fails to parse or compile is logged and ignored; the previous version
+    keeps serving.
+
+    Consumers read `current` once per unit of work (a dialogue, an NLU call)
+    and keep that object, so a swap never changes a dialogue in progress.
+    `subscribe(listener)` is notified with (old, new) after each swap, e.g.
+    to re-render prompts that changed.
+    """
+
+    def __init__(
+        self,
+        path,
+        actions_cls: Optional[type] = None,
+        context_names: Optional[set[str]] = None,
+        poll_s: float = 2.0,
+    ):
+        if actions_cls is None:
+            from app.decision.tree_actions import TreeActions
+
+            actions_cls = TreeActions
+        if context_names is None:
+            context_names = set(actions_cls.initial_context())
+        self.path = Path(path)
+        self.actions_cls = actions_cls
+        self.context_names = set(context_names)
+        self.poll_s = poll_s
+        self.reloads = 0
+        self.failed_reloads = 0
+        self._listeners: list[Listener] = []
+        self._stat = self._file_stat()
+        # A bad initial tree is an error right away, as before the store
+        self._current = self._compile(self.path.read_bytes())
+        self._rejected: Optional[str] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def current(self) -> TreeVersion:
+        return self._current
+
+    def subscribe(self, listener: Listener) -> None:
+        self._listeners.append(listener)
+
+    def _file_stat(self) -> tuple[float, int]:
+        stat = self.path.stat()
+        return stat.st_mtime, stat.st_size
+
+    def _compile(self, data: bytes) -> TreeVersion:
+        tree = json.loads(data.decode("utf-8"))
+        nodes = compile_tree(tree, self.actions_cls, self.context_names)
+        unreachable = unreachable_nodes(nodes)
+        if unreachable:
+            logger.warning("Unreachable nodes: %s", ", ".join(unreachable))
+        return TreeVersion(
+            version=hashlib.sha256(data).hexdigest()[:12],
+            tree=tree,
+            nodes=nodes,
+            prefetch_plans=prefetch_plans(nodes),
+            prompts=static_prompts(tree),
+        )
+
+    def check(self) -> bool:
+        """
+        Reload the file if it changed. Returns True when a new version was
+        swapped in. Called by the watcher thread; safe to call directly.
+        """
+        try:
+            stat = self._file_stat()
+            if stat == self._stat:
+                return False
+            self._stat = stat
+            data = self.path.read_bytes()
+        except OSError as e:
+            # Editors often replace the file (delete + rename); try again next poll
+            logger.debug("Tree file not readable yet: %s", e)
+            return False
+
+        digest = hashlib.sha256(data).hexdigest()[:12]
+        if digest in (self._current.version, self._rejected):
+            return False
+        started = time.perf_counter()
+        try:
+            new = self._compile(data)
+        except Exception as e:
+            # JSONDecodeError is a ValueError; anything else is a compiler bug on odd
+            # input (e.g. a non-string "action"), so log it with the traceback
+            self._rejected = digest
+            self.failed_reloads += 1
+            logger.error(
+                "Decision tree %s rejected, keeping %s: %s", digest, self._current.version, e,
+                exc_info=not isinstance(e, (ValueError, TreeCompileError)),
+            )
+            return False
+
+        old, self._current = self._current, new
+        self.reloads += 1
+        logger.info(
+            "Decision tree %s -> %s (compiled in %.1f ms)",
+            old.version, new.version, (time.perf_counter() - started) * 1000,
+        )
+        for listener in self._listeners:
+            try:
+                listener(old, new)
+            except Exception:
+                logger.exception("Tree reload listener failed")
+        return True
+
+    def start(self) -> None:
+        """Start the watcher thread (no-op when poll_s <= 0 or already running)."""
+        if self.poll_s <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name="tree-watcher", daemon=True)
+        self._thread.start()
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self.poll_s):
+            try:
+                self.check()
+            except Exception:
+                # The watcher must outlive any single bad poll
+                logger.exception("Decision tree check failed")
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,253 @@
+from __future__ import annotations
+
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# 4M-parameter BERT distilled on SST-2 (~17 MB): loads in well under a second on CPU
+DEFAULT_MODEL = "philschmid/tiny-bert-sst2-distilled"
+
+BACKENDS = ("torch", "onnx")
+
+
+def normalize_text(text: str) -> str:
+    """Cache key of an answer: lower case, punctuation dropped, single spaces."""
+    return " ".join(re.sub(r"[^\w\s']", " ", text.lower()).split())
+
+
+class ConfirmationModel:
+    """
+    Sentiment-based yes/no fallback for answers the word lists of
+    `TreeActions._parse_confirmation` do not cover.
+
+    One instance per process (`get_confirmation_model`), shared by every lane.
+    `preload()` loads the transformers pipeline on a background thread at
+    startup, so the first ambiguous answer does not wait for the model; a
+    call made while it is still loading waits only for the rest of the load.
+    `backend="onnx"` exports the model to ONNX Runtime (optimum), and
+    `quantization="int8"` applies dynamic int8 quantization (torch Linear
+    layers, or the exported ONNX graph). Results are kept in an LRU cache
+    keyed on `normalize_text`, so repeated answers skip inference.
+    A missing/broken backend makes every prediction None (unknown).
+    """
+
+    def __init__(
+        self,
+        model_name: str = DEFAULT_MODEL,
+        backend: str = "torch",
+        quantization: Optional[str] = None,
+        cache_size: int = 1024,
+        min_score: float = 0.55,
+        cache_dir: Optional[Path] = None,
+    ):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown sentiment backend: {backend}")
+        if quantization not in (None, "int8"):
+            raise ValueError(f"Unsupported sentiment quantization: {quantization}")
+        self.model_name = model_name
+        self.backend = backend
+        self.quantization = quantization
+        self.cache_size = cache_size
+        self.min_score = min_score
+        self.cache_dir = Path(cache_dir) if cache_dir else Path("data/sentiment_onnx")
+        self._pipeline = None
+        self._load_error: Optional[str] = None
+        self._load_lock = threading.Lock()
+        self._infer_lock = threading.Lock()
+        self._cache: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.load_s: Optional[float] = None
+        self.calls = 0
+        self.cache_hits = 0
+        self.inferences = 0
+        self.inference_s = 0.0
+
+    @property
+    def ready(self) -> bool:
+        return self._pipeline is not None or self._load_error is not None
+
+    def preload(self) -> threading.Thread:
+        """Start loading in the background (once); returns the loader thread."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.load, name="sentiment-load", daemon=True)
+            self._thread.start()
+        return self._thread
+
+    def load(self):
+        """Build the pipeline (blocking, idempotent); None if it is unavailable."""
+        with self._load_lock:
+            if self.ready:
+                return self._pipeline
+            started = time.perf_counter()
+            try:
+                self._pipeline = self._build()
+            except Exception as e:
+                self._load_error = str(e)
+                logger.warning("Sentiment analyzer unavailable: %s", e)
+                return None
+            self.load_s = time.perf_counter() - started
+            logger.info(
+                "Sentiment analyzer %s (%s%s) loaded in %.2fs",
+                self.model_name, self.backend, f", {self.quantization}" if self.quantization else "", self.load_s,
+            )
+            return self._pipeline
+
+    def _build(self):
+        from transformers import AutoTokenizer, pipeline
+
+        tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+        if self.backend == "onnx":
+            model = self._onnx_model()
+        else:
+            from transformers import AutoModelForSequenceClassification
+
+            model = AutoModelForSequenceClassification.from_pretrained(self.model_name).eval()
+            if self.quantization == "int8":
+                import torch
+
+                model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        return pipeline("sentiment-analysis", model=model, tokenizer=tokenizer, device=-1)
+
+    def _onnx_model(self):
+        from optimum.onnxruntime import ORTModelForSequenceClassification
+
+        # The export is done once and kept next to the other data
+        export_dir = self.cache_dir / self.model_name.replace("/", "--")
+        if not (export_dir / "model.onnx").exists():
+            model = ORTModelForSequenceClassification.from_pretrained(self.model_name, export=True)
+            model.save_pretrained(export_dir)
+        if self.quantization != "int8":
+            return ORTModelForSequenceClassification.from_pretrained(export_dir)
+
+        quantized = export_dir / "model_quantized.onnx"
+        if not quantized.exists():
+            from optimum.onnxruntime import ORTQuantizer
+            from optimum.onnxruntime.configuration import AutoQuantizationConfig
+
+            quantizer = ORTQuantizer.from_pretrained(export_dir)
+            quantizer.quantize(
+                save_dir=export_dir,
+                quantization_config=AutoQuantizationConfig.avx2(is_static=False, per_channel=False),
+            )
+        return ORTModelForSequenceClassification.from_pretrained(export_dir, file_name=quantized.name)
+
+    def _to_confirmation(self, label: str, score: float) -> Optional[bool]:
+        label = label.lower()
+        if score < self.min_score:
+            return None
+        if "pos" in label or label.endswith("1"):
+            return True
+        if "neg" in label or label.endswith("0"):
+            return False
+        return None
+
+    def _cached(self, key: str) -> Optional[tuple[str, float]]:
+        with self._cache_lock:
+            hit = self._cache.get(key)
+            if hit is not None:
+                self._cache.move_to_end(key)
+            return hit
+
+    def _remember(self, key: str, result: tuple[str, float]) -> None:
+        if self.cache_size <= 0:
+            return
+        with self._cache_lock:
+            self._cache[key] = result
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def classify_many(self, texts: list[str]) -> list[dict[str, Any]]:
+        """
+        One result per text: confirmation (True/False/None), label, score,
+        cached and inference_s (shared by the batch of uncached texts).
+        """
+        keys = [normalize_text(t) for t in texts]
+        results: list[Optional[tuple[str, float]]] = [self._cached(k) if k else None for k in keys]
+        cached = [r is not None for r in results]
+        todo = list(dict.fromkeys(k for k, r in zip(keys, results) if r is None and k))
+        inference_s = 0.0
+        if todo:
+            analyzer = self.load()
+            if analyzer is not None:
+                started = time.perf_counter()
+                try:
+                    with self._infer_lock:
+                        outputs = analyzer(todo)
+                except Exception as e:
+                    logger.warning("Sentiment inference failed: %s", e)
+                    outputs = []
+                inference_s = time.perf_counter() - started
+                if outputs:
+                    self.inferences += 1
+                    self.inference_s += inference_s
+                fresh = {}
+                for key, out in zip(todo, outputs):
+                    fresh[key] = (str(out.get("label", "")), float(out.get("score", 0)))
+                    self._remember(key, fresh[key])
+                results = [r if r is not None else fresh.get(k) for k, r in zip(keys, results)]
+
+        self.calls += len(texts)
+        self.cache_hits += sum(cached)
+        return [
+            {
+                "confirmation": self._to_confirmation(*result) if result else None,
+                "label": result[0] if result else None,
+                "score": round(result[1], 4) if result else None,
+                "cached": hit,
+                "inference_s": 0.0 if hit else round(inference_s, 4),
+            }
+            for result, hit in zip(results, cached)
+        ]
+
+    def classify(self, text: str) -> dict[str, Any]:
+        return self.classify_many([text])[0]
+
+    def predict(self, text: str) -> Optional[bool]:
+        """True - yes, False - no, None - not confident / model unavailable."""
+        return self.classify(text)["confirmation"]
+
+    @property
+    def stats(self) -> dict[str, Any]:
+        return {
+            "model": self.model_name,
+            "backend": self.backend,
+            "quantization": self.quantization,
+            "load_s": round(self.load_s, 3) if self.load_s is not None else None,
+            "load_error": self._load_error,
+            "calls": self.calls,
+            "cache_hits": self.cache_hits,
+            "cached": len(self._cache),
+            "inferences": self.inferences,
+            "mean_inference_ms": round(self.inference_s / self.inferences * 1000, 2) if self.inferences else None,
+        }
+
+
+_model: Optional[ConfirmationModel] = None
+_model_lock = threading.Lock()
+
+
+def get_confirmation_model(config=None) -> ConfirmationModel:
+    """Process-wide `ConfirmationModel`, configured from `config` (or the env) on first use."""
+    global _model
+    with _model_lock:
+        if _model is None:
+            if config is None:
+                from app.config import AppConfig
+
+                config = AppConfig.from_env()
+            _model = ConfirmationModel(
+                model_name=config.sentiment_model,
+                backend=config.sentiment_backend,
+                quantization=config.sentiment_quantization,
+                cache_size=config.sentiment_cache_size,
+                cache_dir=config.data_dir / "sentiment_onnx",
+            )
+        return _model
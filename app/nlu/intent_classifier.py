@@ -1,10 +1,14 @@
 from __future__ import annotations
 
 import json
-import re
+import logging
 from pathlib import Path
 from typing import Any, Optional
 
+from app.nlu.matcher import IntentMatcher
+
+logger = logging.getLogger(__name__)
+
 
 class IntentClassifier:
     """
@@ -12,11 +16,29 @@ class IntentClassifier:
 
     For now it is a simple rule-based matcher that can be replaced with a
     transformer-based classifier later without touching the orchestrator.
+    The patterns of `intents` are compiled once per rules version into an
+    `IntentMatcher` (one scan of the text for all intents).
     """
 
-    def __init__(self, rules_path: Optional[Path] = None):
+    def __init__(self, rules_path: Optional[Path] = None, store=None):
+        """
+        With `store` (`app.decision.tree_store.TreeStore`) the rules come from
+        the shared store and follow its reloads instead of being read here.
+        """
         self.rules_path = rules_path
-        self.rules = self._load_rules(rules_path) if rules_path else {}
+        if store is not None:
+            self._use_rules(store.current.tree)
+            store.subscribe(self._on_reload)
+        else:
+            self._use_rules(self._load_rules(rules_path) if rules_path else {})
+
+    def _use_rules(self, rules: dict[str, Any]) -> None:
+        # Compiled first, then swapped: predict() never sees a half-built matcher
+        matcher = IntentMatcher(rules.get("intents", {}))
+        self.rules, self.matcher = rules, matcher
+
+    def _on_reload(self, old, new) -> None:
+        self._use_rules(new.tree)
 
     def _load_rules(self, path: Path) -> dict[str, Any]:
         if not path.exists():
@@ -26,20 +48,44 @@ class IntentClassifier:
 
     def predict(self, text: str) -> dict[str, Any]:
         """
-        Return a lightweight intent payload.
+        Return a lightweight intent payload: the best intent with its
+        confidence and slots (named groups of the patterns that matched),
+        plus every matched intent under `matches`, best first. Confidence
+        grows with the number of the intent's patterns that matched (0.8 for
+        one); ties go to the intent declared first.
         """
         lowered = text.lower().strip()
 
-        # Rule-based fallback
-        for intent, pattern_config in self.rules.get("intents", {}).items():
-            patterns = (
-                pattern_config
-                if isinstance(pattern_config, list)
-                else pattern_config.get("patterns", [])
-            )
-            for pattern in patterns:
-                if re.search(pattern, lowered):
-                    return {"intent": intent, "confidence": 0.8, "slots": {}}
+        # Rule-based fallback; sorted() is stable, so declaration order breaks ties
+        matches = sorted(self.matcher.match(lowered), key=lambda m: -m.hits)
+        if matches:
+            return dict(matches[0].as_dict(), matches=[m.as_dict() for m in matches])
 
         # Default intent when nothing matches
-        return {"intent": "fallback", "confidence": 0.2, "slots": {}}
+        return {"intent": "fallback", "confidence": 0.2, "slots": {}, "matches": []}
+
+
+def build_intent_classifier(config, store=None, repo=None):
+    """
+    NLU layer selected by `config.nlu_backend`: "rules" - `IntentClassifier`;
+    "vector" - `VectorIntentClassifier` loaded from `config.nlu_model_dir`
+    (memory-mapped) or trained there from the tree intents and the labeled
+    `decisions` of `repo`. Without training data it falls back to the rules.
+    """
+    if config.nlu_backend == "vector":
+        from app.nlu.vector_classifier import load_or_train
+
+        if store is not None:
+            tree = store.current.tree
+        elif config.decision_tree_path.exists():
+            with open(config.decision_tree_path, "r", encoding="utf-8") as f:
+                tree = json.load(f)
+        else:
+            tree = {}
+        try:
+            return load_or_train(config.nlu_model_dir, tree, repo, retrain=config.nlu_retrain)
+        except ValueError as e:
+            logger.warning("Vector intent classifier unavailable, using rules: %s", e)
+    elif config.nlu_backend != "rules":
+        raise ValueError(f"Unknown NLU backend: {config.nlu_backend}")
+    return IntentClassifier(rules_path=config.decision_tree_path, store=store)
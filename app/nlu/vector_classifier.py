@@ -0,0 +1,320 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import time
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MODEL_VERSION = 1
+DEFAULT_DIM = 1 << 14
+DEFAULT_NGRAMS = (2, 4)
+# File in the model directory naming the live version subdirectory
+CURRENT = "CURRENT"
+
+_PRIME = np.uint64(1099511628211)  # FNV-1a 64-bit prime, as a polynomial base
+_REGEX_SYNTAX = re.compile(r"\(\?P<\w+>|\(\?[:!=]|\\[a-zA-Z]|[\^$*+?{}\[\]|()\\.]")
+
+
+def normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def pattern_example(pattern: str) -> str:
+    """Rough text of a rule pattern: regex syntax dropped, the words kept."""
+    return normalize(_REGEX_SYNTAX.sub(" ", pattern))
+
+
+def hashed_ngrams(text: str, ngrams: tuple[int, int] = DEFAULT_NGRAMS, dim: int = DEFAULT_DIM) -> np.ndarray:
+    """
+    Feature ids of every character n-gram of the (space padded) text.
+
+    A polynomial hash over the code points, computed for all positions at
+    once with uint64 arithmetic: stable across processes (unlike `hash`),
+    so a saved model keeps meaning the same features.
+    """
+    codes = np.frombuffer(f" {text} ".encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    hashes = [h for _, h in _ngram_hashes(codes, ngrams)]
+    if not hashes:
+        return np.empty(0, dtype=np.int64)
+    return _feature_ids(np.concatenate(hashes), dim)
+
+
+def _ngram_hashes(codes: np.ndarray, ngrams: tuple[int, int]) -> Iterator[tuple[int, np.ndarray]]:
+    # (n, hash of the n-gram starting at every position) for each n
+    for n in range(ngrams[0], ngrams[1] + 1):
+        count = len(codes) - n + 1
+        if count <= 0:
+            break
+        h = np.full(count, n, dtype=np.uint64)
+        for k in range(n):
+            h = h * _PRIME + codes[k:k + count]
+        yield n, h
+
+
+def _feature_ids(h: np.ndarray, dim: int) -> np.ndarray:
+    h ^= h >> np.uint64(29)  # fold the high bits in before the modulo
+    return (h % np.uint64(dim)).astype(np.int64)
+
+
+class VectorIntentClassifier:
+    """
+    NumPy-only intent classifier with the `IntentClassifier.predict` interface.
+
+    Texts become TF-IDF vectors over hashed character n-grams (robust to STT
+    spelling noise). Each intent is the normalized centroid of its training
+    examples; all centroids form one (features x intents) matrix, so scoring
+    an utterance is one matrix-vector product over its non-zero features and
+    `predict_many` one matrix product per chunk. Scores are cosine
+    similarities; below `min_score` the intent is "fallback".
+
+    `save(dir)` writes the matrix and IDF as .npy files plus meta.json into
+    a new version subdirectory and switches `CURRENT` to it; `load(dir)`
+    memory-maps them, so startup does not depend on model size.
+    """
+
+    def __init__(
+        self,
+        labels: list[str],
+        weights: np.ndarray,
+        idf: np.ndarray,
+        ngrams: tuple[int, int] = DEFAULT_NGRAMS,
+        min_score: float = 0.3,
+        meta: Optional[dict[str, Any]] = None,
+    ):
+        self.labels = list(labels)
+        self.weights = weights  # (dim, intents) float32
+        self.idf = idf  # (dim,) float32
+        self.dim = int(idf.shape[0])
+        self.ngrams = tuple(ngrams)
+        self.min_score = min_score
+        self.meta = meta or {}
+
+    # ----- features -----
+
+    def _sparse(self, text: str) -> tuple[np.ndarray, np.ndarray]:
+        ids, counts = np.unique(hashed_ngrams(normalize(text), self.ngrams, self.dim), return_counts=True)
+        values = (1.0 + np.log(counts)).astype(np.float32) * self.idf[ids]
+        norm = float(np.linalg.norm(values))
+        return ids, values / norm if norm else values
+
+    def _sparse_many(self, texts: list[str]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        `_sparse` of a whole batch without a per-text loop: the padded texts
+        are hashed as one buffer (n-grams crossing two texts are dropped) and
+        (row, feature) pairs counted with one `np.unique`. Returns row, feature
+        id and value arrays sorted by row.
+        """
+        padded = [f" {normalize(text)} " for text in texts]
+        lengths = np.array([len(p) for p in padded])
+        codes = np.frombuffer("".join(padded).encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+        row_of = np.repeat(np.arange(len(texts)), lengths)
+        offset = np.arange(len(codes)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        hashes, rows = [], []
+        for n, h in _ngram_hashes(codes, self.ngrams):
+            inside = offset[:len(h)] + n <= lengths[row_of[:len(h)]]
+            hashes.append(h[inside])
+            rows.append(row_of[:len(h)][inside])
+        keys, counts = np.unique(
+            np.concatenate(rows) * self.dim + _feature_ids(np.concatenate(hashes), self.dim), return_counts=True
+        )
+        rows, ids = keys // self.dim, keys % self.dim
+        values = (1.0 + np.log(counts)).astype(np.float32) * self.idf[ids]
+        norms = np.sqrt(np.bincount(rows, weights=values * values, minlength=len(texts))).astype(np.float32)
+        return rows, ids, values / np.where(norms > 0, norms, 1)[rows]
+
+    # ----- training -----
+
+    @classmethod
+    def train(
+        cls,
+        examples: Iterable[tuple[str, str]],
+        dim: int = DEFAULT_DIM,
+        ngrams: tuple[int, int] = DEFAULT_NGRAMS,
+        min_score: float = 0.3,
+    ) -> "VectorIntentClassifier":
+        """Fit on (text, intent) pairs."""
+        started = time.perf_counter()
+        docs = [(normalize(text), intent) for text, intent in examples if text and text.strip()]
+        if not docs:
+            raise ValueError("no training examples")
+        labels = list(dict.fromkeys(intent for _, intent in docs))
+        column = {label: i for i, label in enumerate(labels)}
+
+        features = [np.unique(hashed_ngrams(text, ngrams, dim), return_counts=True) for text, _ in docs]
+        df = np.zeros(dim, dtype=np.float64)
+        for ids, _ in features:
+            df[ids] += 1
+        idf = (np.log((1 + len(docs)) / (1 + df)) + 1).astype(np.float32)
+
+        weights = np.zeros((dim, len(labels)), dtype=np.float32)
+        for (ids, counts), (_, intent) in zip(features, docs):
+            values = (1.0 + np.log(counts)).astype(np.float32) * idf[ids]
+            weights[ids, column[intent]] += values / np.linalg.norm(values)
+        norms = np.linalg.norm(weights, axis=0)
+        weights /= np.where(norms > 0, norms, 1)
+
+        meta = {
+            "version": MODEL_VERSION,
+            "labels": labels,
+            "dim": dim,
+            "ngrams": list(ngrams),
+            "examples": len(docs),
+            "train_s": round(time.perf_counter() - started, 3),
+        }
+        return cls(labels, weights, idf, ngrams=ngrams, min_score=min_score, meta=meta)
+
+    @classmethod
+    def train_from_sources(
+        cls, tree: dict[str, Any], repo=None, limit: Optional[int] = None, **kwargs: Any
+    ) -> "VectorIntentClassifier":
+        """
+        Train on the `intents` of decision_tree.json (their `examples` and the
+        text of their patterns) plus labeled rows of `decisions` (the
+        transcript text and its intent, fallback excluded).
+        """
+        examples: list[tuple[str, str]] = []
+        for intent, config in tree.get("intents", {}).items():
+            config = {"patterns": config} if isinstance(config, list) else config
+            examples.extend((text, intent) for text in config.get("examples", []))
+            examples.extend((pattern_example(p), intent) for p in config.get("patterns", []))
+        if repo is not None:
+            examples.extend(
+                (row["text"], row["intent"]) for row in repo.list_labeled_transcripts(limit=limit)
+            )
+        return cls.train(examples, **kwargs)
+
+    # ----- persistence -----
+
+    def save(self, model_dir) -> Path:
+        """
+        Write the model into a new version subdirectory of `model_dir`, then
+        point `CURRENT` at it with one atomic rename: a concurrent `load`
+        sees either the old model or the new one, never a mix of their files.
+        The previous version is kept for loads that already read `CURRENT`
+        (and processes that have it memory-mapped); older ones are removed.
+        Returns the version directory.
+        """
+        model_dir = Path(model_dir)
+        version_dir = model_dir / f"v{time.time_ns()}-{os.getpid()}"
+        version_dir.mkdir(parents=True)
+        np.save(version_dir / "weights.npy", np.ascontiguousarray(self.weights, dtype=np.float32))
+        np.save(version_dir / "idf.npy", np.asarray(self.idf, dtype=np.float32))
+        meta = dict(self.meta, labels=self.labels, dim=self.dim, ngrams=list(self.ngrams))
+        (version_dir / "meta.json").write_text(json.dumps(meta, ensure_ascii=False, indent=2), encoding="utf-8")
+
+        tmp = model_dir / f".{CURRENT}.{os.getpid()}.tmp"
+        tmp.write_text(version_dir.name, encoding="utf-8")
+        os.replace(tmp, model_dir / CURRENT)
+        versions = sorted(p for p in model_dir.glob("v*-*") if p.is_dir() and p != version_dir)
+        for old in versions[:-1]:
+            shutil.rmtree(old, ignore_errors=True)
+        return version_dir
+
+    @staticmethod
+    def live_dir(model_dir) -> Optional[Path]:
+        """Directory of the current saved model in `model_dir`, or None if there is none."""
+        model_dir = Path(model_dir)
+        pointer = model_dir / CURRENT
+        if pointer.exists():
+            return model_dir / pointer.read_text(encoding="utf-8").strip()
+        # Saved before versioning: the files are in model_dir itself
+        return model_dir if (model_dir / "meta.json").exists() else None
+
+    @classmethod
+    def load(cls, model_dir, min_score: float = 0.3) -> "VectorIntentClassifier":
+        """Memory-map the current saved model of `model_dir` (pages are read on first use)."""
+        while True:
+            live = cls.live_dir(model_dir)
+            if live is None:
+                raise FileNotFoundError(f"no saved intent model in {model_dir}")
+            try:
+                return cls._load_version(live, min_score)
+            except FileNotFoundError:
+                # Two newer saves removed this version while we read it: take the new one
+                if cls.live_dir(model_dir) == live:
+                    raise
+
+    @classmethod
+    def _load_version(cls, model_dir: Path, min_score: float) -> "VectorIntentClassifier":
+        meta = json.loads((model_dir / "meta.json").read_text(encoding="utf-8"))
+        if meta.get("version") != MODEL_VERSION:
+            raise ValueError(f"intent model version {meta.get('version')} != {MODEL_VERSION}")
+        weights = np.load(model_dir / "weights.npy", mmap_mode="r")
+        idf = np.load(model_dir / "idf.npy", mmap_mode="r")
+        return cls(meta["labels"], weights, idf, ngrams=tuple(meta["ngrams"]), min_score=min_score, meta=meta)
+
+    # ----- inference -----
+
+    def _result(self, scores: np.ndarray) -> dict[str, Any]:
+        hits = np.flatnonzero(scores >= self.min_score)
+        matches = [
+            {"intent": self.labels[i], "confidence": round(float(scores[i]), 4), "slots": {}}
+            for i in hits[np.argsort(-scores[hits], kind="stable")]
+        ]
+        if not matches:
+            return {"intent": "fallback", "confidence": 0.2, "slots": {}, "matches": []}
+        return dict(matches[0], matches=matches)
+
+    def scores(self, text: str) -> np.ndarray:
+        """Cosine similarity of `text` to every intent (order of `labels`)."""
+        ids, values = self._sparse(text)
+        if not len(ids):
+            return np.zeros(len(self.labels), dtype=np.float32)
+        return values @ self.weights[ids]
+
+    def predict(self, text: str) -> dict[str, Any]:
+        return self._result(self.scores(text))
+
+    def predict_many(self, texts: list[str], chunk: int = 256) -> list[dict[str, Any]]:
+        """
+        Batched `predict`: features of the whole chunk at once (`_sparse_many`)
+        and one gather of the intent-matrix rows they touch; each text is then
+        a small matrix-vector product over its slice of that block.
+        """
+        results: list[dict[str, Any]] = []
+        for offset in range(0, len(texts), chunk):
+            batch = texts[offset:offset + chunk]
+            rows, ids, values = self._sparse_many(batch)
+            block = np.asarray(self.weights[ids])
+            bounds = np.searchsorted(rows, np.arange(len(batch) + 1))
+            for start, end in zip(bounds[:-1], bounds[1:]):
+                results.append(self._result(values[start:end] @ block[start:end]))
+        return results
+
+
+def intents_hash(tree: dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps(tree.get("intents", {}), sort_keys=True).encode("utf-8")).hexdigest()[:12]
+
+
+def load_or_train(model_dir, tree: dict[str, Any], repo=None, retrain: bool = False) -> VectorIntentClassifier:
+    """
+    Saved model from `model_dir` if it was trained on the same `intents` of
+    the tree; otherwise one trained from the tree (+ decisions) and saved there.
+    """
+    model_dir = Path(model_dir)
+    source = intents_hash(tree)
+    if not retrain and VectorIntentClassifier.live_dir(model_dir) is not None:
+        try:
+            model = VectorIntentClassifier.load(model_dir)
+            if model.meta.get("intents_hash") == source:
+                return model
+            logger.info("Intent model in %s is for other intents, retraining", model_dir)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning("Intent model in %s not usable, retraining: %s", model_dir, e)
+    model = VectorIntentClassifier.train_from_sources(tree, repo)
+    model.meta["intents_hash"] = source
+    model.save(model_dir)
+    logger.info(
+        "Intent model trained on %d examples (%d intents) in %.2fs -> %s",
+        model.meta["examples"], len(model.labels), model.meta["train_s"], model_dir,
+    )
+    return model
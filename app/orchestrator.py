@@ -5,9 +5,10 @@ from typing import Optional
 
 from app.config import AppConfig
 from app.decision.engine import DecisionEngine
+from app.decision.tree_store import TreeStore
 from app.db import ConversationRepository, Database
 from app.logging_config import init_logging
-from app.nlu.intent_classifier import IntentClassifier
+from app.nlu.intent_classifier import build_intent_classifier
 from app.services.stt_service import STTService
 from app.services.tts_service import TTSService
 
@@ -27,15 +28,39 @@ class VoiceOrchestrator:
         self.repo.seed_sample_data()
         self.repo.seed_history_sample()
 
-        self.nlu = IntentClassifier(rules_path=self.config.decision_tree_path)
-        self.decision_engine = DecisionEngine(self.config.decision_tree_path)
-        self.stt_service = STTService(model_size=self.config.stt_model_size)
+        # One reader of decision_tree.json per process; reloads reach every consumer
+        self.tree_store = (
+            TreeStore(self.config.decision_tree_path, poll_s=self.config.tree_reload_s)
+            if self.config.decision_tree_path.exists()
+            else None
+        )
+        self.nlu = build_intent_classifier(self.config, store=self.tree_store, repo=self.repo)
+        if self.config.nlu_backend == "vector" and self.tree_store is not None:
+            # The trained model follows the tree: new intents/examples -> retrain
+            self.tree_store.subscribe(self._retrain_nlu)
+        self.decision_engine = DecisionEngine(self.config.decision_tree_path, store=self.tree_store)
+        self.stt_service = STTService(
+            model_size=self.config.stt_model_size,
+            vad_options=self.config.vad_options(),
+            quantization=self.config.stt_quantization,
+            num_threads=self.config.stt_num_threads,
+            inference_process=self.config.stt_inference_process,
+        )
         self.tts_service = (
-            TTSService(self.config.tts_voice_path)
+            TTSService(
+                self.config.tts_voice_path,
+                cache_dir=self.config.tts_cache_dir,
+                cache_max_mb=self.config.tts_cache_max_mb,
+                streaming=self.config.tts_streaming,
+            )
             if self.config.tts_voice_path
             else None
         )
 
+    def _retrain_nlu(self, old, new) -> None:
+        if old.tree.get("intents") != new.tree.get("intents"):
+            self.nlu = build_intent_classifier(self.config, store=self.tree_store, repo=self.repo)
+
     def handle_text(self, text: str, language: str | None = None) -> dict:
         self.logger.info("Transcript received: %s", text)
         transcript_id = self.repo.save_transcript(text=text, language=language)
@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import collections
+import dataclasses
+import json
+import logging
+import multiprocessing as mp
+import os
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+from app.config import AppConfig
+from app.db import ConversationRepository, Database
+
+logger = logging.getLogger(__name__)
+
+# Per-worker state, filled by _init_worker in each pool process
+_worker: dict[str, Any] = {}
+
+
+def _init_worker(config: AppConfig) -> None:
+    """Load the current intent classifier + decision layer once per worker."""
+    from app.decision.engine import DecisionEngine
+    from app.nlu.intent_classifier import build_intent_classifier
+
+    _worker["nlu"] = build_intent_classifier(config)
+    _worker["decision"] = DecisionEngine(config.decision_tree_path)
+
+
+def _classify_page(rows: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    nlu, decision = _worker["nlu"], _worker["decision"]
+    texts = [row["text"] or "" for row in rows]
+    if hasattr(nlu, "predict_many"):
+        predictions = nlu.predict_many(texts)
+    else:
+        predictions = [nlu.predict(text) for text in texts]
+
+    results = []
+    for row, text, prediction in zip(rows, texts, predictions):
+        payload = decision.decide(text, prediction)
+        results.append(
+            {
+                "transcript_id": row["transcript_id"],
+                "decision_id": row["decision_id"],
+                "old_intent": row["old_intent"],
+                "intent": payload["intent"],
+                "confidence": payload["confidence"],
+                "payload": payload,
+            }
+        )
+    return results
+
+
+def _pages(repo: ConversationRepository, after_id: int, page_size: int):
+    while True:
+        page = repo.iter_transcript_page(after_id, page_size)
+        if not page:
+            return
+        yield page
+        after_id = page[-1]["transcript_id"]
+
+
+def diff_report(repo: ConversationRepository, run_id: str) -> dict[str, Any]:
+    """
+    Intent changes of a run against the stored `decisions`: how many
+    transcripts kept or changed their intent, per-intent counts before and
+    after, and every (from, to) transition with its count. A transcript
+    without a stored decision counts as changed, from None.
+    """
+    groups = repo.shadow_diff(run_id)
+    intents: dict[str, dict[str, int]] = collections.defaultdict(lambda: {"before": 0, "after": 0})
+    changes = []
+    unchanged = 0
+    for group in groups:
+        if group["old_intent"] is not None:
+            intents[group["old_intent"]]["before"] += group["count"]
+        intents[group["intent"]]["after"] += group["count"]
+        if group["old_intent"] == group["intent"]:
+            unchanged += group["count"]
+        else:
+            changes.append({"from": group["old_intent"], "to": group["intent"], "count": group["count"]})
+
+    total = sum(group["count"] for group in groups)
+    return {
+        "run_id": run_id,
+        "total": total,
+        "unchanged": unchanged,
+        "changed": total - unchanged,
+        "intents": dict(sorted(intents.items())),
+        "changes": changes,
+    }
+
+
+def run_reclassify(
+    config: AppConfig,
+    run_id: Optional[str] = None,
+    workers: Optional[int] = None,
+    page_size: int = 500,
+    output: Optional[Path] = None,
+) -> dict[str, Any]:
+    """
+    Re-classify every stored transcript with the current intents/tree and
+    compare with the stored decisions.
+
+    `transcripts` is read in keyset pages of `page_size` rows (id > last id,
+    no OFFSET), so memory stays flat whatever the table size. Pages go to a
+    pool of `workers` processes (0 - in this process); at most two pages per
+    worker are in flight. Each classified page is written to
+    `decisions_shadow` under `run_id` in one transaction, in page order, so
+    restarting with the same `run_id` continues after the last stored
+    transcript. Returns the `diff_report` of the run (also written to
+    `output` as JSON), with timing.
+    """
+    repo = ConversationRepository(Database(config.db_path))
+    run_id = run_id or time.strftime("%Y%m%d-%H%M%S")
+    after_id = repo.last_shadow_transcript(run_id)
+    if after_id:
+        logger.info("Reclassify %s: resuming after transcript %d", run_id, after_id)
+
+    if config.nlu_backend == "vector":
+        # Train (if needed) once here; the workers only memory-map the saved model
+        from app.nlu.intent_classifier import build_intent_classifier
+
+        build_intent_classifier(config, repo=repo)
+        config = dataclasses.replace(config, nlu_retrain=False)
+
+    workers = max(1, (os.cpu_count() or 2) // 2) if workers is None else workers
+    processed = pages = 0
+    started = time.perf_counter()
+
+    def store(results: list[dict[str, Any]]) -> None:
+        nonlocal processed, pages
+        repo.save_shadow_decisions(run_id, results)
+        processed += len(results)
+        pages += 1
+        if pages % 20 == 0:
+            logger.info("Reclassify %s: %d transcripts", run_id, processed)
+
+    if workers == 0:
+        _init_worker(config)
+        for page in _pages(repo, after_id, page_size):
+            store(_classify_page(page))
+    else:
+        ctx = mp.get_context("spawn")
+        with ctx.Pool(workers, initializer=_init_worker, initargs=(config,)) as pool:
+            pending: collections.deque = collections.deque()
+            for page in _pages(repo, after_id, page_size):
+                pending.append(pool.apply_async(_classify_page, (page,)))
+                if len(pending) >= workers * 2:
+                    store(pending.popleft().get())
+            while pending:
+                store(pending.popleft().get())
+
+    elapsed = time.perf_counter() - started
+    report = diff_report(repo, run_id)
+    repo.db.close()
+    report["processed"] = processed
+    report["elapsed_s"] = round(elapsed, 2)
+    report["rows_per_s"] = round(processed / elapsed, 1) if elapsed else None
+    logger.info(
+        "Reclassify %s finished: %d transcripts, %d changed",
+        run_id, report["total"], report["changed"],
+    )
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return report
@@ -10,14 +10,48 @@ class STTService:
     Service wrapper around WhisperSTT to keep the orchestrator decoupled.
     """
 
-    def __init__(self, model_size: str = "small"):
-        self.engine = WhisperSTT(model_size=model_size)
+    def __init__(
+        self,
+        model_size: str = "small",
+        vad_options: Optional[dict] = None,
+        quantization: Optional[str] = None,
+        num_threads: Optional[int] = None,
+        preload: str = "eager",
+        inference_process: bool = False,
+    ):
+        """
+        `preload`: "eager", "background" or "lazy" model load; the Whisper model
+        itself is shared process-wide through `stt_module.registry`.
+        `inference_process`: run VAD + Whisper in a dedicated worker process fed
+        through shared memory, so capture never waits on inference.
+        """
+        self.engine = WhisperSTT(
+            model_size=model_size,
+            vad_options=vad_options,
+            quantization=quantization,
+            num_threads=num_threads,
+            preload=preload,
+            inference_process=inference_process,
+        )
 
     def transcribe_file(self, audio_path: str) -> str:
         return self.engine.transcribe_file(audio_path)
 
-    def start_realtime(self, callback: Optional[Callable[[str, str], None]] = None) -> None:
-        self.engine.start_realtime_transcription(callback=callback)
+    def start_realtime(
+        self,
+        callback: Optional[Callable[[str, str], None]] = None,
+        partial_callback: Optional[Callable[[str, str, str], None]] = None,
+    ) -> None:
+        """
+        Start streaming STT. `partial_callback(committed, tentative, language)`
+        receives incremental hypotheses; `committed` text never changes.
+        """
+        self.engine.start_realtime_transcription(
+            callback=callback, partial_callback=partial_callback
+        )
+
+    def request_stop(self, flush: bool = False) -> None:
+        self.engine.request_stop(flush=flush)
 
     def stop_realtime(self) -> None:
         self.engine.stop_realtime_transcription()
@@ -27,3 +61,11 @@ class STTService:
         
     def extract_plate_num(self, text: str) -> str:
         return self.engine.extract_plate_num(text)
+
+    @property
+    def capture_stats(self) -> dict:
+        """Microphone capture counters: chunks, input overflows, dropped samples."""
+        return dict(self.engine.capture_stats)
+
+    def close(self) -> None:
+        self.engine.close()
@@ -1,12 +1,13 @@
 from __future__ import annotations
 
-from typing import Optional
-import subprocess
-import sys
 import logging
 from pathlib import Path
+from typing import Any, Iterable, Optional
 
 from tts_module.tts import PiperTTS
+from tts_module.worker import TTSWorker
+
+logger = logging.getLogger(__name__)
 
 
 class TTSService:
@@ -14,41 +15,162 @@ class TTSService:
     Service wrapper around PiperTTS.
 
     To avoid crashes in the main process caused by native libraries used
-    by the TTS backend, `speak` executes a small runner script in a
-    separate subprocess. If the subprocess crashes (segfault), the main
-    application continues running and logs the failure.
+    by the TTS backend, synthesis and playback run in a separate,
+    long-lived worker process (`tts_module.worker`). The voice is loaded
+    there once; if the worker crashes (segfault), the main application
+    keeps running, logs the failure and the worker is restarted on the
+    next `speak`. The worker starts on the first request, so a voice that
+    fails to load does not stop the application from starting: each
+    `speak` logs the failure instead.
+
+    With `cache_dir`, static prompts (`speak(..., cache=True)`) are served
+    from a disk cache of rendered audio (`tts_module.cache`), capped at
+    `cache_max_mb` with LRU eviction.
+
+    With `streaming` (default), audio is written to a PyAudio output stream
+    chunk by chunk while Piper synthesizes, so playback starts after the
+    first chunk instead of after the whole sentence; no temp WAV is written.
     """
 
-    def __init__(self, voice_path: str):
+    def __init__(
+        self,
+        voice_path: str,
+        cache_dir: Optional[Path] = None,
+        cache_max_mb: int = 200,
+        streaming: bool = True,
+    ):
         self.engine = PiperTTS(voice=voice_path)
+        self.worker = TTSWorker(
+            voices=[voice_path] if voice_path else [],
+            cache_dir=str(cache_dir) if cache_dir else None,
+            cache_max_bytes=cache_max_mb * 1024 * 1024,
+            streaming=streaming,
+        )
+        self.cache_enabled = cache_dir is not None
+        self._cache_counts = {"hits": 0, "misses": 0}
+        self._cache_state: dict[str, Any] = {}
+
+    def speak(
+        self,
+        text: str,
+        voice_path: Optional[str] = None,
+        cache: bool = False,
+        token: Optional[int] = None,
+        device: Optional[int] = None,
+    ) -> Optional[dict[str, Any]]:
+        """
+        Synthesize and play the given text in the worker process.
+
+        `cache=True` marks a static prompt: it is played from the audio cache
+        and rendered into it on a miss. `token` names the phrase for
+        `interrupt(token)`; `device` is the PyAudio output device (None - the
+        default one; streamed playback only). Blocks until playback has finished and returns
+        timing stats (`first_audio_s`, `total_s`, `synth_s`, `played`,
+        `mode`, `cache`, `error`), or None when no voice is configured.
+        """
+        voice = voice_path or self.engine.voice
+        if not voice:
+            logger.warning("TTS voice not provided; skipping speak")
+            return None
+
+        stats = self.worker.request(
+            "speak", text=text, voice=str(voice), cache=cache and self.cache_enabled,
+            token=token, device=device,
+        )
+        self._count(stats)
+        if stats["error"]:
+            logger.error("TTS failed: %s", stats["error"])
+        return stats
 
-    def speak(self, text: str, voice_path: Optional[str] = None) -> None:
+    def speak_segments(
+        self,
+        segments: list[dict[str, Any]],
+        voice_path: Optional[str] = None,
+        crossfade_ms: int = 20,
+        token: Optional[int] = None,
+        device: Optional[int] = None,
+    ) -> Optional[dict[str, Any]]:
         """
-        Synthesize and play the given text in a separate process.
+        Speak a phrase assembled from segments (`app.decision.prompts.render_segments`).
 
-        This isolates native crashes (segfaults) to the child process.
+        Segments with `cache=True` come from the audio cache, the rest are
+        synthesized per call; edges are trimmed and joined with `crossfade_ms`
+        crossfades. Returns the same stats as `speak`, plus per-segment
+        counts under `segments`.
         """
         voice = voice_path or self.engine.voice
         if not voice:
-            logging.getLogger(__name__).warning("TTS voice not provided; skipping speak")
-            return
-
-        # runner script path relative to this file: project_root/tts_module/runner.py
-        # Run the runner as a module so imports inside tts_module work
-        # reliably. This requires the current working directory to include
-        # the project root (which is the typical case when running main.py).
-        cmd = [sys.executable, "-m", "tts_module.runner", text, "--voice", str(voice)]
-
-        try:
-            # Run the TTS in a separate process; capture output for diagnostics.
-            res = subprocess.run(cmd, check=False, capture_output=True, text=True, timeout=120)
-            if res.returncode != 0:
-                logging.getLogger(__name__).error(
-                    "TTS subprocess failed (code=%s). stderr=%s stdout=%s",
-                    res.returncode,
-                    (res.stderr or "").strip(),
-                    (res.stdout or "").strip(),
-                )
-        except Exception as e:
-            logging.getLogger(__name__).exception("Failed to run TTS subprocess: %s", e)
+            logger.warning("TTS voice not provided; skipping speak")
+            return None
+
+        if not self.cache_enabled:
+            segments = [dict(seg, cache=False) for seg in segments]
+        stats = self.worker.request(
+            "speak_segments", voice=str(voice), segments=segments, crossfade_ms=crossfade_ms,
+            token=token, device=device,
+        )
+        self._count(stats)
+        if stats["error"]:
+            logger.error("TTS failed: %s", stats["error"])
+        return stats
+
+    def interrupt(self, token: Optional[int] = None) -> None:
+        """
+        Cut the phrase `token` short (barge-in), or whatever is playing when
+        no token is given. A phrase still queued behind another caller's is
+        dropped before it plays; other callers' phrases are not touched.
+        Safe to call from any thread while `speak` blocks; only streamed
+        playback can be interrupted.
+        """
+        self.worker.interrupt(token)
+
+    def prerender(self, texts: Iterable[str]) -> dict[str, int]:
+        """
+        Render static prompts into the audio cache ahead of the first dialogue.
+
+        Already cached prompts cost one hash lookup, so this is cheap to run
+        on every startup. Returns {"rendered", "cached", "failed"}.
+        """
+        summary = {"rendered": 0, "cached": 0, "failed": 0}
+        if not self.cache_enabled or not self.engine.voice:
+            return summary
+        for text in texts:
+            stats = self.worker.request("render", text=text, voice=str(self.engine.voice), cache=True)
+            if self.worker.start_error:
+                # The voice does not load: every other prompt would fail the same way
+                logger.error("TTS prerender skipped: %s", self.worker.start_error)
+                summary["failed"] += 1
+                break
+            if stats["error"]:
+                logger.error("TTS prerender failed for %r: %s", text, stats["error"])
+                summary["failed"] += 1
+                continue
+            summary["cached" if stats["cache"] == "hit" else "rendered"] += 1
+            self._cache_state = stats["cache_stats"] or self._cache_state
+        logger.info("TTS prerender: %s", summary)
+        return summary
+
+    def _count(self, stats: dict[str, Any]) -> None:
+        if stats["segments"]:
+            self._cache_counts["hits"] += stats["segments"]["hits"]
+            self._cache_counts["misses"] += stats["segments"]["misses"]
+        elif stats["cache"] == "hit":
+            self._cache_counts["hits"] += 1
+        elif stats["cache"] == "miss":
+            self._cache_counts["misses"] += 1
+        self._cache_state = stats["cache_stats"] or self._cache_state
+
+    @property
+    def cache_stats(self) -> dict[str, Any]:
+        """Hit/miss counts of `speak` plus the cache size as last seen by the worker."""
+        counts = dict(self._cache_counts)
+        total = counts["hits"] + counts["misses"]
+        counts["hit_rate"] = round(counts["hits"] / total, 3) if total else None
+        for field in ("entries", "bytes", "evictions"):
+            counts[field] = self._cache_state.get(field)
+        return counts
 
+    def close(self) -> None:
+        if self.cache_enabled:
+            logger.info("TTS cache stats: %s", self.cache_stats)
+        self.worker.close()
@@ -0,0 +1,300 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import io
+import itertools
+import json
+import logging
+import math
+import re
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Optional
+
+from app.config import AppConfig
+from app.db import ConversationRepository, Database
+from app.decision.lanes import Lane, LaneEngine, percentile
+
+logger = logging.getLogger(__name__)
+
+# Built-in scenarios over the demo HISTORY rows (ABC123 / XYZ789)
+DEFAULT_SCRIPTS: list[dict[str, Any]] = [
+    # Plate read by the camera and found: straight to the payment check
+    {"camera_plate": "ABC123", "utterances": []},
+    # Plate spelled and confirmed
+    {"utterances": ["A B C 1 2 3", "yes"]},
+    # Misheard once, corrected
+    {"utterances": ["X Y Z 7 8 8", "no", "X Y Z 7 8 9", "yes"]},
+    # Unknown plate twice: operator
+    {"utterances": ["Q Q 1", "yes", "Q Q 1", "yes"]},
+]
+
+
+def load_scripts(path: Optional[Path]) -> list[dict[str, Any]]:
+    """
+    Dialogue scripts from a JSONL file, one dialogue per line:
+    {"camera_plate": "ABC123", "utterances": ["A B C 1 2 3", "yes", "clips/no.wav"]}.
+    Utterances ending in .wav are transcribed with Whisper; relative paths
+    are resolved against the script's folder. No path - `DEFAULT_SCRIPTS`.
+    """
+    if path is None:
+        return DEFAULT_SCRIPTS
+    path = Path(path)
+    scripts = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            script = json.loads(line)
+            script["utterances"] = [
+                str(path.parent / u) if u.lower().endswith(".wav") and not Path(u).is_absolute() else u
+                for u in script.get("utterances", [])
+            ]
+            scripts.append(script)
+    if not scripts:
+        raise ValueError(f"no dialogue scripts in {path}")
+    return scripts
+
+
+class ScriptedSTT:
+    """
+    Stand-in for WhisperSTT in `TreeActions.listen`: each listen takes the
+    next utterance of the current script after `latency_s`. WAV utterances
+    go through `recognizer.transcribe_file` (a WhisperSTT, created on first use).
+    """
+
+    last_detected_language = "en"
+
+    def __init__(self, latency_s: float = 0.0, recognizer=None, config: Optional[AppConfig] = None):
+        self.latency_s = latency_s
+        self.recognizer = recognizer
+        self.config = config
+        self._utterances: Iterator[str] = iter(())
+
+    def load(self, utterances: Iterable[str]) -> None:
+        self._utterances = iter(list(utterances))
+
+    def _recognize(self, path: str) -> str:
+        if self.recognizer is None:
+            from stt_module.stt import WhisperSTT
+
+            config = self.config or AppConfig.from_env()
+            self.recognizer = WhisperSTT(model_size=config.stt_model_size, preload="lazy")
+        return self.recognizer.transcribe_file(path)
+
+    def transcribe_microphone(self, duration=60, callback=None, gate=None, barge_in=None, **kwargs) -> None:
+        if gate is not None and barge_in is None:
+            gate.wait()
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        # An exhausted script answers with silence
+        text = next(self._utterances, "")
+        if text.lower().endswith(".wav"):
+            text = self._recognize(text)
+        if callback is not None:
+            callback(text, self.last_detected_language)
+
+    def request_stop(self, flush: bool = False) -> None:
+        pass
+
+    def extract_plate_num(self, text: str) -> str:
+        # Same normalization as WhisperSTT.extract_plate_num
+        return re.sub(r"[^A-Za-z0-9]", "", text).upper()
+
+
+class SilentTTS:
+    """
+    Stand-in for TTSService: "plays" each prompt for `latency_s` and returns
+    the same stats shape; playback can be interrupted per phrase token
+    (barge-in), as in `TTSWorker.interrupt`.
+    """
+
+    def __init__(self, latency_s: float = 0.0):
+        self.latency_s = latency_s
+        self._lock = threading.Lock()
+        self._interrupts: dict[Optional[int], threading.Event] = {}
+
+    def _event(self, token: Optional[int]) -> threading.Event:
+        with self._lock:
+            return self._interrupts.setdefault(token, threading.Event())
+
+    def _play(self, token: Optional[int]) -> dict[str, Any]:
+        event = self._event(token)
+        started = time.perf_counter()
+        interrupted = event.wait(self.latency_s) if self.latency_s else event.is_set()
+        with self._lock:
+            self._interrupts.pop(token, None)
+        return {
+            "first_audio_s": 0.0, "total_s": time.perf_counter() - started, "synth_s": None,
+            "played": True, "mode": "simulated", "cache": None, "cache_stats": None,
+            "segments": None, "interrupted": interrupted, "error": None,
+        }
+
+    def speak(
+        self,
+        text: str,
+        voice_path: Optional[str] = None,
+        cache: bool = False,
+        token: Optional[int] = None,
+        device: Optional[int] = None,
+    ) -> dict[str, Any]:
+        return self._play(token)
+
+    def speak_segments(
+        self,
+        segments,
+        voice_path: Optional[str] = None,
+        crossfade_ms: int = 20,
+        token: Optional[int] = None,
+        device: Optional[int] = None,
+    ) -> dict[str, Any]:
+        return self._play(token)
+
+    def interrupt(self, token: Optional[int] = None) -> None:
+        if token is None:
+            with self._lock:
+                events = list(self._interrupts.values())
+            for event in events:
+                event.set()
+        else:
+            self._event(token).set()
+
+    def prerender(self, texts: Iterable[str]) -> dict[str, int]:
+        return {"rendered": 0, "cached": 0, "failed": 0}
+
+
+def _io_write_bytes() -> Optional[int]:
+    # Bytes passed to write() by this process (Linux); None elsewhere
+    try:
+        with open("/proc/self/io", "r", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("wchar:"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+def _db_bytes(db_path: Path) -> int:
+    return sum(
+        p.stat().st_size
+        for p in (db_path, Path(f"{db_path}-wal"), Path(f"{db_path}-journal"))
+        if p.exists()
+    )
+
+
+def _node_percentiles(lanes: list[Lane]) -> dict[str, dict[str, Any]]:
+    walls: dict[str, list[float]] = {}
+    for lane in lanes:
+        for node, values in lane.stats.node_walls.items():
+            walls.setdefault(node, []).extend(values)
+    return {
+        node: {
+            "visits": len(values),
+            "p50_ms": round(percentile(values, 50) * 1000, 2),
+            "p95_ms": round(percentile(values, 95) * 1000, 2),
+            "p99_ms": round(percentile(values, 99) * 1000, 2),
+        }
+        for node, values in walls.items()
+    }
+
+
+def run_simulation(
+    config: AppConfig,
+    dialogues: int = 1000,
+    lanes: int = 1,
+    scripts: Optional[list[dict[str, Any]]] = None,
+    stt_latency_s: float = 0.0,
+    tts_latency_s: float = 0.0,
+    db_path: Optional[Path] = None,
+) -> dict[str, Any]:
+    """
+    Run `dialogues` scripted dialogues through the real tree, actions and
+    repository, with fake STT/TTS and no audio devices.
+
+    Dialogues cycle through `scripts` and are spread over `lanes`
+    (`LaneEngine`). The database is a temp SQLite file seeded with the demo
+    HISTORY rows unless `db_path` is given. Returns dialogues/s, p50/p95/p99
+    wall time per node, the lane report and DB write amplification: bytes
+    the process wrote (`/proc/self/io`, else DB file growth) per byte of
+    session text + payload (+ trace, with `TRACE_SINK=db`) stored. Dialogue
+    traces follow `config.trace_sink`; the db sink writes into the temp DB.
+    """
+    scripts = scripts or DEFAULT_SCRIPTS
+    per_lane = math.ceil(dialogues / lanes)
+    tmp = tempfile.TemporaryDirectory(prefix="orbility-sim-") if db_path is None else None
+    db_path = Path(tmp.name) / "sim.sqlite3" if tmp is not None else Path(db_path)
+    repo = None
+    try:
+        repo = ConversationRepository(Database(db_path))
+        repo.seed_history_sample()
+        before_id = repo.db.fetchall("SELECT COALESCE(MAX(id), 0) AS id FROM decisions")[0]["id"]
+        before_db = _db_bytes(db_path)
+
+        tts = SilentTTS(tts_latency_s)
+        script_cycle = itertools.cycle(scripts)
+
+        def next_script(lane: Lane) -> None:
+            script = next(script_cycle)
+            actions = lane.engine.actions
+            actions.stt.load(script.get("utterances", []))
+            if script.get("camera_plate"):
+                actions.context["BS_N_LICPLA"] = script["camera_plate"]
+
+        engine = LaneEngine(
+            config.decision_tree_path,
+            [ScriptedSTT(stt_latency_s, config=config) for _ in range(lanes)],
+            tts=tts,
+            repo=repo,
+            max_listen=lanes,
+            max_logic=lanes,
+            prefetch_ttl_s=config.prefetch_ttl_s,
+            on_dialogue=next_script,
+            trace_sink=config.trace_sink,
+        )
+        io_before = _io_write_bytes()
+        # The tree logs every node with print; keep the console for the report
+        with contextlib.redirect_stdout(io.StringIO()):
+            try:
+                report = asyncio.run(engine.run(dialogues=per_lane))
+            finally:
+                engine.close()
+        io_written = _io_write_bytes()
+        io_written = io_written - io_before if io_written is not None and io_before is not None else None
+
+        stored = repo.db.fetchall(
+            "SELECT COUNT(*) AS n, COUNT(tr.id) AS traces, "
+            "COALESCE(SUM(LENGTH(d.payload) + LENGTH(t.text) + COALESCE(LENGTH(tr.trace), 0)), 0) AS bytes "
+            "FROM decisions d JOIN transcripts t ON t.id = d.transcript_id "
+            "LEFT JOIN traces tr ON tr.decision_id = d.id WHERE d.id > ?",
+            (before_id,),
+        )[0]
+        db_growth = _db_bytes(db_path) - before_db
+        written = io_written if io_written is not None else db_growth
+        logical = stored["bytes"]
+        return {
+            "dialogues": report["dialogues"],
+            "lanes": lanes,
+            "wall_s": report["wall_s"],
+            "dialogues_per_s": report["dialogues_per_s"],
+            "errors": sum(lane["errors"] for lane in report["lanes"].values()),
+            "nodes": _node_percentiles(engine.lanes),
+            "db": {
+                "sessions": stored["n"],
+                "traces": stored["traces"],
+                "logical_bytes": logical,
+                "db_growth_bytes": db_growth,
+                "io_write_bytes": io_written,
+                "write_amplification": round(written / logical, 2) if logical else None,
+            },
+            "lane_report": report["lanes"],
+        }
+    finally:
+        if repo is not None:
+            repo.db.close()
+        if tmp is not None:
+            tmp.cleanup()
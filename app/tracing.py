@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+# Chrome trace "threads": one row per kind of work in the viewer
+TRACKS = {"dialogue": 1, "speech": 2, "prefetch": 3}
+
+
+def _us(t: float) -> int:
+    return int(t * 1_000_000)
+
+
+class Tracer:
+    """
+    In-memory span buffer of one dialogue, in Chrome trace event format.
+
+    Spans are complete events ("ph": "X") with `time.perf_counter`
+    timestamps in microseconds, so they are monotonic and comparable across
+    threads of the process. `drain()` returns the buffered spans as a trace
+    object that chrome://tracing, Perfetto or speedscope open directly, and
+    starts a new buffer. A disabled tracer records nothing.
+    """
+
+    def __init__(self, enabled: bool = True, name: str = "dialogue"):
+        self.enabled = enabled
+        self.name = name
+        self._events: list[dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def add(self, name: str, cat: str, start: float, end: float, track: str = "dialogue", **args: Any) -> None:
+        """Record a span measured elsewhere (`start`/`end` from time.perf_counter)."""
+        if not self.enabled:
+            return
+        event = {
+            "name": name, "cat": cat, "ph": "X",
+            "ts": _us(start), "dur": max(0, _us(end) - _us(start)),
+            "pid": self._pid, "tid": TRACKS[track],
+        }
+        if args:
+            event["args"] = args
+        with self._lock:
+            self._events.append(event)
+
+    @contextmanager
+    def span(self, name: str, cat: str, track: str = "dialogue", **args: Any) -> Iterator[dict[str, Any]]:
+        """
+        Time the block as one span. The yielded dict becomes the span's args,
+        so the block can attach results (`span_args["result"] = ...`).
+        """
+        started = time.perf_counter()
+        try:
+            yield args
+        finally:
+            self.add(name, cat, started, time.perf_counter(), track, **args)
+
+    def drain(self, **meta: Any) -> Optional[dict[str, Any]]:
+        """Buffered spans as a Chrome trace object (None if nothing was recorded)."""
+        with self._lock:
+            events, self._events = self._events, []
+        if not self.enabled or not events:
+            return None
+        names = [
+            {"name": "process_name", "ph": "M", "pid": self._pid, "tid": 0, "args": {"name": self.name}},
+            *(
+                {"name": "thread_name", "ph": "M", "pid": self._pid, "tid": tid, "args": {"name": track}}
+                for track, tid in TRACKS.items()
+            ),
+        ]
+        return {"traceEvents": names + events, "displayTimeUnit": "ms", "otherData": meta}
+
+
+class TraceFileSink:
+    """
+    Appends one trace object per line to a JSONL file. A line is a complete
+    Chrome trace: `sed -n 5p traces.jsonl > trace.json` opens in a viewer.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def write(self, trace: dict[str, Any]) -> None:
+        line = json.dumps(trace, ensure_ascii=False)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+def open_trace_sink(spec) -> Optional[TraceFileSink]:
+    """
+    `TRACE_SINK` value -> file sink. "" - tracing off, "db" - the `traces`
+    table (written with the session, no file sink), anything else - a JSONL
+    path. An already open sink is returned as is (lanes share one file).
+    """
+    if isinstance(spec, TraceFileSink):
+        return spec
+    if not spec or spec == "db":
+        return None
+    return TraceFileSink(spec)
+
+
+# Shared no-op tracer for actions objects without one (benchmarks, fakes)
+NULL_TRACER = Tracer(enabled=False)
@@ -0,0 +1,5 @@
+"""
+Micro-benchmarks for the OrbilityParking pipeline.
+
+Each module is runnable on its own, e.g. `python -m benchmarks.audio_buffer`.
+"""
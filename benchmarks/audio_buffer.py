@@ -0,0 +1,89 @@
+"""
+Allocation benchmark for realtime audio accumulation.
+
+Compares the old path (int16 -> float32 `astype` per chunk, `np.concatenate`
+per chunk, `astype` + divide before Whisper) with the current one
+(single-pass `pcm16_to_float32` at capture, `AudioRingBuffer` writes and a
+zero-copy window for transcription).
+
+An allocation is any new NumPy array that owns its data buffer.
+
+Usage:
+    python -m benchmarks.audio_buffer --seconds 600 --window 7
+"""
+from __future__ import annotations
+
+import argparse
+import time
+
+import numpy as np
+
+from stt_module.ring_buffer import AudioRingBuffer, pcm16_to_float32
+
+SAMPLE_RATE = 16000
+CHUNK = 1600
+
+
+class AllocCounter:
+    def __init__(self) -> None:
+        self.count = 0
+        self.bytes = 0
+
+    def track(self, arr: np.ndarray) -> np.ndarray:
+        if arr.flags.owndata:
+            self.count += 1
+            self.bytes += arr.nbytes
+        return arr
+
+
+def run_before(chunks: list[bytes], window: int, alloc: AllocCounter) -> None:
+    accumulated = alloc.track(np.array([], dtype=np.float32))
+    for data in chunks:
+        chunk = alloc.track(np.frombuffer(data, dtype=np.int16).astype(np.float32))
+        accumulated = alloc.track(np.concatenate([accumulated, chunk]))
+        if len(accumulated) >= window:
+            audio = alloc.track(accumulated.astype(np.float32))
+            audio = alloc.track(audio / 32768.0)
+            accumulated = alloc.track(np.array([], dtype=np.float32))
+
+
+def run_after(chunks: list[bytes], window: int, alloc: AllocCounter) -> None:
+    ring = AudioRingBuffer(window + 2 * SAMPLE_RATE)
+    alloc.track(ring._storage)  # one-off preallocation
+    start = 0
+    for data in chunks:
+        chunk = alloc.track(pcm16_to_float32(np.frombuffer(data, dtype=np.int16)))
+        ring.write(chunk)
+        if ring.total_written - start >= window:
+            alloc.track(ring.window(start))
+            start = ring.total_written
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Audio buffer allocation benchmark")
+    parser.add_argument("--seconds", type=int, default=600, help="Seconds of simulated audio")
+    parser.add_argument("--window", type=float, default=7.0, help="Transcription window, seconds")
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(0)
+    pcm = rng.integers(-3000, 3000, size=args.seconds * SAMPLE_RATE, dtype=np.int16)
+    chunks = [pcm[i:i + CHUNK].tobytes() for i in range(0, len(pcm), CHUNK)]
+    window = int(args.window * SAMPLE_RATE)
+
+    print(f"{args.seconds} s of audio, {CHUNK}-sample chunks, {args.window} s window")
+    print(f"{'path':<8} {'allocs/s':>10} {'MB alloc/s':>11} {'us/s audio':>11}")
+    for name, fn in (("before", run_before), ("after", run_after)):
+        alloc = AllocCounter()
+        started = time.perf_counter()
+        fn(chunks, window, alloc)
+        elapsed = time.perf_counter() - started
+        print(
+            f"{name:<8} {alloc.count / args.seconds:>10.1f} "
+            f"{alloc.bytes / args.seconds / 1e6:>11.3f} "
+            f"{elapsed / args.seconds * 1e6:>11.1f}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,135 @@
+"""
+Database: pooled WAL connections vs a new connection per call.
+
+Runs the same `ConversationRepository` workload against two fresh SQLite
+files, one per mode:
+
+- legacy: `Database.connect` as it was before the pool, a new
+  `sqlite3.connect` per call with SQLite defaults (rollback journal,
+  synchronous=FULL, no statement reuse across calls)
+- pooled: the current `Database` (one connection per thread, WAL,
+  synchronous=NORMAL, mmap, larger page cache, cached statements)
+
+For each mode it measures, in calls per second:
+
+- lookup: `get_history_by_id` (primary key, so mostly per-call overhead)
+- plate: `find_history_by_plate` over `--history` HISTORY rows
+- insert: `save_session` (transcript + decision, one transaction each)
+- mixed: `--threads` reader threads doing lookups while one thread
+  inserts, for `--seconds` (reads/s and writes/s)
+
+Usage:
+    python -m benchmarks.db_pool --history 5000 --calls 5000 --threads 4
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Callable
+
+from app.db import ConversationRepository, Database
+
+
+class LegacyDatabase(Database):
+    # Database.connect before the pool
+    def connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+
+def seed_history(db: Database, rows: int, rng: random.Random) -> list[str]:
+    letters = "ABCEHKMOPTXY"
+    plates = [
+        f"{rng.choice(letters)}{rng.randrange(1000):03d}{rng.choice(letters)}{rng.choice(letters)}"
+        for _ in range(rows)
+    ]
+    with db.connect() as conn:
+        conn.executemany(
+            "INSERT INTO HISTORY "
+            "(N_PAR, BE_N_NUMTIT, BE_D_DATTRA, BE_N_EQU, NB_TOTPAI, N_CNTPRI, T_FAMTIT, BE_N_LICPLA) "
+            "VALUES (?, ?, '2025-01-01T10:00:00', 1, 1, 'CNT', 1, ?)",
+            [(i, f"TICKET-{i}", plate) for i, plate in enumerate(plates)],
+        )
+        conn.commit()
+    return plates
+
+
+def rate(fn: Callable[[int], object], calls: int) -> float:
+    started = time.perf_counter()
+    for i in range(calls):
+        fn(i)
+    return calls / (time.perf_counter() - started)
+
+
+def mixed(repo: ConversationRepository, rows: int, threads: int, seconds: float) -> tuple[float, float]:
+    stop = threading.Event()
+    reads = [0] * threads
+    writes = [0]
+
+    def reader(slot: int) -> None:
+        rng = random.Random(slot)
+        while not stop.is_set():
+            repo.get_history_by_id(rng.randrange(1, rows + 1))
+            reads[slot] += 1
+
+    def writer() -> None:
+        while not stop.is_set():
+            repo.save_session("a b c 1 2 3", "ru", "pay", {"interactions": []})
+            writes[0] += 1
+
+    workers = [threading.Thread(target=reader, args=(i,)) for i in range(threads)]
+    workers.append(threading.Thread(target=writer))
+    for t in workers:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in workers:
+        t.join()
+    return sum(reads) / seconds, writes[0] / seconds
+
+
+def run(db_cls: type[Database], path: Path, args: argparse.Namespace) -> dict[str, float]:
+    rng = random.Random(args.seed)
+    db = db_cls(path)
+    repo = ConversationRepository(db)
+    plates = seed_history(db, args.history, rng)
+    ids = [rng.randrange(1, args.history + 1) for _ in range(args.calls)]
+    payload = {"interactions": [{"action": "say", "response": "Номер найден"}]}
+    result = {
+        "lookup": rate(lambda i: repo.get_history_by_id(ids[i]), args.calls),
+        "plate": rate(lambda i: repo.find_history_by_plate(plates[ids[i] - 1]), max(1, args.calls // 10)),
+        "insert": rate(lambda i: repo.save_session("a b c 1 2 3", "ru", "pay", payload), args.calls),
+    }
+    result["mixed_reads"], result["mixed_writes"] = mixed(repo, args.history, args.threads, args.seconds)
+    db.close()
+    return result
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--history", type=int, default=5000, help="HISTORY rows")
+    parser.add_argument("--calls", type=int, default=5000)
+    parser.add_argument("--threads", type=int, default=4, help="mixed: reader threads")
+    parser.add_argument("--seconds", type=float, default=3.0, help="mixed: duration")
+    parser.add_argument("--seed", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="db-pool-") as tmp:
+        legacy = run(LegacyDatabase, Path(tmp) / "legacy.sqlite3", args)
+        pooled = run(Database, Path(tmp) / "pooled.sqlite3", args)
+
+    print(f"history={args.history} calls={args.calls} threads={args.threads}+1 writer")
+    print(f"{'':14}{'legacy/s':>12}{'pooled/s':>12}{'speedup':>10}")
+    for key in legacy:
+        print(f"{key:14}{legacy[key]:12.0f}{pooled[key]:12.0f}{pooled[key] / legacy[key]:9.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,186 @@
+"""
+Decision tree: compiled state machine vs the legacy dict interpreter.
+
+Builds a synthetic tree (say / expression condition / method condition with
+a nested counter branch / plain action, repeated), then measures for both:
+
+- load: JSON parse (+ validation and compilation for the compiled engine)
+- run: one dialogue walking every node, best of `--repeat`
+
+Both engines print a line per node, so stdout is redirected to /dev/null
+while timing. The legacy loop below is the interpreter `DecisionTreeEngine.run`
+used before compilation (raw dicts, `say:` split per visit, `hasattr` +
+`eval` per condition), kept here only for comparison.
+
+Usage:
+    python -m benchmarks.decision_tree --nodes 10000 --repeat 5
+"""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import json
+import os
+import tempfile
+import time
+
+from app.decision.tree_engine import DecisionTreeEngine
+
+
+class BenchActions:
+    """The TreeActions surface the engine uses, without DB, STT or TTS."""
+
+    TREE_ACTIONS = frozenset({"noop"})
+    TREE_COUNTERS = frozenset({"increment_failures"})
+    TREE_CONDITIONS = frozenset({"check_ok"})
+
+    def __init__(self) -> None:
+        self.context = {"failures": 0, "CUR_TIME": 5, "DHMP": 1, "N": 20}
+        self.session_payload: dict = {"interactions": []}
+        self.speech_intervals: list = []
+        self.wait_intervals: list = []
+
+    def say(self, text: str, wait: bool = True) -> bool:
+        return True
+
+    def wait_speech(self) -> None:
+        pass
+
+    def noop(self) -> bool:
+        return True
+
+    def check_ok(self) -> bool:
+        return self.context["failures"] % 2 == 0
+
+    def increment_failures(self) -> bool:
+        self.context["failures"] += 1
+        return True
+
+    def buffer_interaction(self, action: str, response: str) -> None:
+        self.session_payload["interactions"].append(action)
+
+    def commit_session(self, final_intent: str) -> None:
+        self.session_payload = {"interactions": []}
+
+    def evaluate_condition(self, expression: str) -> bool:
+        # TreeActions.evaluate_condition before the compiler (removed there)
+        if hasattr(self, expression.replace("()", "")):
+            return getattr(self, expression.replace("()", ""))()
+        try:
+            return bool(eval(expression, {}, self.context))
+        except Exception as e:
+            print("[ERROR] eval:", expression, e)
+            return False
+
+
+def synthetic_tree(n: int) -> dict:
+    names = ["start"] + [f"n{i}" for i in range(1, n)]
+    last = names[-1]
+    tree = {}
+    for i, name in enumerate(names[:-1]):
+        nxt = names[i + 1]
+        kind = i % 4
+        if kind == 0:
+            tree[name] = {"action": f"say: Prompt number {i}, please wait.", "next": nxt}
+        elif kind == 1:
+            tree[name] = {"condition": "CUR_TIME - DHMP < N", "yes": nxt, "no": nxt}
+        elif kind == 2:
+            tree[name] = {
+                "condition": "check_ok()",
+                "yes": nxt,
+                "no": {"counter": "increment_failures", "condition": "failures >= 1000000000",
+                       "yes": last, "no": nxt},
+            }
+        else:
+            tree[name] = {"action": "noop", "next": nxt}
+    tree[last] = {"action": "end"}
+    return tree
+
+
+def legacy_run(engine: DecisionTreeEngine, start_node: str = "start", final_intent: str = "fallback") -> None:
+    current = start_node
+    engine.node_timings = []
+    while True:
+        node = engine.tree[current]
+        engine._enter_node(current)
+        print(f"\n=== NODE: {current} ===")
+        if "action" in node:
+            action = node["action"]
+            if action.startswith("say:"):
+                text = action.split("say:", 1)[1].strip()
+                engine.actions.say(text, wait=False)
+                engine.actions.buffer_interaction(action="say", response=text)
+            elif hasattr(engine.actions, action):
+                getattr(engine.actions, action)()
+                engine.actions.buffer_interaction(action=action, response="")
+            elif action == "end":
+                engine._finish(final_intent)
+                return
+            else:
+                print("[WARNING] Unknown action:", action)
+        if "condition" in node:
+            next_node = node["yes"] if engine.actions.evaluate_condition(node["condition"]) else node["no"]
+            if isinstance(next_node, dict):
+                if "counter" in next_node:
+                    getattr(engine.actions, next_node["counter"])()
+                cond2 = next_node.get("condition")
+                if cond2:
+                    current = next_node["yes"] if engine.actions.evaluate_condition(cond2) else next_node["no"]
+                    continue
+            else:
+                current = next_node
+                continue
+        elif "next" in node:
+            current = node["next"]
+            continue
+        else:
+            engine._finish(final_intent)
+            return
+
+
+def _best(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Compiled vs legacy decision tree engine")
+    parser.add_argument("--nodes", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    tree = synthetic_tree(args.nodes)
+    fd, path = tempfile.mkstemp(suffix=".json")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(tree, f)
+
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            def load_legacy():
+                with open(path, "r", encoding="utf-8") as f:
+                    json.load(f)
+
+            legacy_load = _best(load_legacy, args.repeat)
+            compiled_load = _best(lambda: DecisionTreeEngine(path, actions=BenchActions()), args.repeat)
+
+            engine = DecisionTreeEngine(path, actions=BenchActions())
+            legacy = _best(lambda: legacy_run(engine), args.repeat)
+            compiled = _best(engine.run, args.repeat)
+    finally:
+        os.remove(path)
+
+    steps = args.nodes
+    print(f"nodes={args.nodes}")
+    print(f"load:  legacy={legacy_load * 1000:.1f}ms  compiled={compiled_load * 1000:.1f}ms (parse + validate + compile)")
+    print(f"run:   legacy={legacy * 1000:.1f}ms ({legacy / steps * 1e6:.2f}us/node)  "
+          f"compiled={compiled * 1000:.1f}ms ({compiled / steps * 1e6:.2f}us/node)  "
+          f"speedup={legacy / compiled:.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,166 @@
+"""
+HISTORY plate lookups: HISTORY_PLATES index vs the legacy five-column scan.
+
+For each `--rows` size, fills a fresh HISTORY with synthetic entries/exits
+(plates in any of the five plate columns, some lower-cased, a few debts)
+as a database from before the migration, then measures:
+
+- backfill: `Database.initialize` running migration 1 (HISTORY_PLATES,
+  triggers, one INSERT ... SELECT over the whole table)
+- insert/update: `--writes` new rows, then their exits (BS_N_LICPLA set),
+  through the maintenance triggers
+- indexed: `find_history_by_plate` and `has_no_debt` per call, on
+  existing plates and on unknown ones
+- legacy: the `UPPER(col) = ?` OR-query used before, on
+  `--legacy-lookups` plates only (a full scan each), checked to return the
+  same rows
+
+Usage:
+    python -m benchmarks.history_plates --rows 1000000 10000000
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable
+
+from app.db import ConversationRepository, Database
+from app.db.database import PLATE_COLUMNS
+
+# find_history_by_plate before HISTORY_PLATES
+LEGACY_QUERY = "SELECT * FROM HISTORY WHERE " + " OR ".join(f"UPPER({col}) = ?" for col in PLATE_COLUMNS)
+LETTERS = "ABCEHKMOPTXY"
+CHUNK = 100_000
+
+
+def random_plate(rng: random.Random) -> str:
+    letters = "".join(rng.choice(LETTERS) for _ in range(3))
+    return f"{letters[0]}{rng.randrange(1000):03d}{letters[1:]}{rng.randrange(100):02d}"
+
+
+def history_row(i: int, plates: list[str], rng: random.Random) -> tuple:
+    plate = rng.choice(plates)
+    entry = plate.lower() if rng.random() < 0.05 else plate
+    roll = rng.random()
+    exit_plate = plate if roll < 0.7 else (None if roll < 0.9 else rng.choice(plates))
+    corrected = rng.choice(plates) if rng.random() < 0.05 else None
+    bis = rng.choice(plates) if rng.random() < 0.02 else None
+    debt = round(rng.uniform(1, 50), 2) if rng.random() < 0.03 else None
+    return (i, f"TICKET-{i}", entry, exit_plate, corrected, bis, debt)
+
+
+def fill_legacy(path: Path, rows: int, plates: list[str], rng: random.Random) -> None:
+    # A database as it was before migration 1: no HISTORY_PLATES, no triggers
+    db = Database(path)
+    ConversationRepository(db)
+    with db.connect() as conn:
+        conn.executescript(
+            "DROP TRIGGER history_plates_insert; DROP TRIGGER history_plates_update; "
+            "DROP TRIGGER history_plates_delete; DROP TABLE HISTORY_PLATES; PRAGMA user_version = 0;"
+        )
+        for start in range(0, rows, CHUNK):
+            conn.executemany(
+                "INSERT INTO HISTORY (N_PAR, BE_N_NUMTIT, BE_D_DATTRA, BE_N_EQU, NB_TOTPAI, N_CNTPRI, "
+                "T_FAMTIT, BE_N_LICPLA, BS_N_LICPLA, BE_N_LICPLA_CR, N_LICPLA_BIS, MT_TELBAD) "
+                "VALUES (?, ?, '2025-01-01T10:00:00', 1, 1, 'CNT', 1, ?, ?, ?, ?, ?)",
+                [history_row(i, plates, rng) for i in range(start, min(rows, start + CHUNK))],
+            )
+            conn.commit()
+    db.close()
+
+
+def per_call(fn: Callable[[str], object], plates: list[str]) -> float:
+    started = time.perf_counter()
+    for plate in plates:
+        fn(plate)
+    return (time.perf_counter() - started) / len(plates)
+
+
+def run(rows: int, args: argparse.Namespace, tmp: Path) -> None:
+    rng = random.Random(args.seed)
+    plates = [random_plate(rng) for _ in range(max(1, rows // 4))]
+    path = tmp / f"history-{rows}.sqlite3"
+
+    started = time.perf_counter()
+    fill_legacy(path, rows, plates, rng)
+    fill_s = time.perf_counter() - started
+
+    db = Database(path)
+    started = time.perf_counter()
+    repo = ConversationRepository(db)
+    backfill_s = time.perf_counter() - started
+    indexed = db.fetchall("SELECT COUNT(*) AS n FROM HISTORY_PLATES")[0]["n"]
+
+    with db.connect() as conn:
+        started = time.perf_counter()
+        first = conn.execute("SELECT MAX(ID_HISTORY) + 1 AS id FROM HISTORY").fetchone()["id"]
+        conn.executemany(
+            "INSERT INTO HISTORY (N_PAR, BE_N_NUMTIT, BE_D_DATTRA, BE_N_EQU, NB_TOTPAI, N_CNTPRI, "
+            "T_FAMTIT, BE_N_LICPLA) VALUES (?, ?, '2025-01-01T10:00:00', 1, 1, 'CNT', 1, ?)",
+            [(i, f"NEW-{i}", rng.choice(plates)) for i in range(args.writes)],
+        )
+        conn.commit()
+        insert_s = (time.perf_counter() - started) / args.writes
+        started = time.perf_counter()
+        conn.execute(
+            "UPDATE HISTORY SET BS_N_LICPLA = BE_N_LICPLA, BS_D_DATTRA = '2025-01-01T12:00:00' "
+            "WHERE ID_HISTORY >= ?",
+            (first,),
+        )
+        conn.commit()
+        update_s = (time.perf_counter() - started) / args.writes
+
+    known = [rng.choice(plates) for _ in range(args.lookups)]
+    known = [p.lower() if i % 10 == 0 else p for i, p in enumerate(known)]
+    unknown = [random_plate(rng) + "Z" for _ in range(args.lookups)]
+    find_s = per_call(repo.find_history_by_plate, known)
+    miss_s = per_call(repo.find_history_by_plate, unknown)
+    debt_s = per_call(repo.has_no_debt, known)
+
+    def legacy(plate: str) -> list:
+        normalized = plate.strip().upper()
+        return db.fetchall(LEGACY_QUERY, (normalized,) * len(PLATE_COLUMNS))
+
+    sample = known[: args.legacy_lookups]
+    legacy_s = per_call(legacy, sample)
+    same = all(
+        [r["ID_HISTORY"] for r in legacy(p)] == [r["ID_HISTORY"] for r in repo.find_history_by_plate(p)]
+        for p in sample
+    )
+    plan = db.fetchall(
+        "EXPLAIN QUERY PLAN SELECT * FROM HISTORY "
+        "WHERE ID_HISTORY IN (SELECT ID_HISTORY FROM HISTORY_PLATES WHERE plate = ?)",
+        ("X",),
+    )
+    db.close()
+
+    print(f"rows={rows:,}  HISTORY_PLATES={indexed:,}  fill={fill_s:.1f}s  backfill={backfill_s:.1f}s")
+    print(f"  triggers: insert={insert_s * 1e6:.1f}us/row  exit update={update_s * 1e6:.1f}us/row")
+    print(
+        f"  indexed: find={find_s * 1e6:.1f}us  miss={miss_s * 1e6:.1f}us  has_no_debt={debt_s * 1e6:.1f}us  "
+        f"legacy find={legacy_s * 1e3:.1f}ms  speedup={legacy_s / find_s:,.0f}x  same={same}"
+    )
+    print("  plan: " + "; ".join(row["detail"] for row in plan))
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000_000])
+    parser.add_argument("--writes", type=int, default=10_000)
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--legacy-lookups", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=11)
+    parser.add_argument("--tmp", type=Path, default=None, help="folder for the databases (10M rows: ~3 GB)")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="history-plates-", dir=args.tmp) as tmp:
+        for rows in args.rows:
+            run(rows, args, Path(tmp))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
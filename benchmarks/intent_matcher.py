@@ -0,0 +1,118 @@
+"""
+IntentClassifier: compiled single-pass matcher vs the legacy pattern loop.
+
+Builds synthetic rules with `--intents` intents and a growing number of
+patterns (up to `--patterns`): literal keyword phrases plus a fixed set of
+`--regex` regex patterns with named groups. For each size it measures:
+
+- build: compiling the rules into an `IntentMatcher`
+- compiled: `IntentClassifier.predict` per utterance (all matches + slots)
+- legacy: the loop `predict` used before, `re.search` on every pattern
+  string in order until the first match (Python's regex cache holds 512
+  patterns, so large rule sets are recompiled on every call), measured on
+  `--legacy-utterances` utterances only because it gets slow
+
+Literal keywords go through one Aho-Corasick pass, so their count barely
+matters; regex patterns share one alternation, which `re` still tries
+alternative by alternative, hence the fixed regex count.
+
+Usage:
+    python -m benchmarks.intent_matcher --intents 1000 --patterns 20000
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import re
+import statistics
+import time
+from typing import Any
+
+from app.nlu.intent_classifier import IntentClassifier
+
+
+def legacy_predict(rules: dict[str, Any], text: str) -> dict[str, Any]:
+    # IntentClassifier.predict before the compiled matcher
+    lowered = text.lower().strip()
+    for intent, pattern_config in rules.get("intents", {}).items():
+        patterns = pattern_config if isinstance(pattern_config, list) else pattern_config.get("patterns", [])
+        for pattern in patterns:
+            if re.search(pattern, lowered):
+                return {"intent": intent, "confidence": 0.8, "slots": {}}
+    return {"intent": "fallback", "confidence": 0.2, "slots": {}}
+
+
+def synthetic_rules(intents: int, patterns: int, regexes: int, rng: random.Random) -> dict[str, Any]:
+    # The vocabulary grows with the rules, so an utterance matches about as many intents at every size
+    vocab = [
+        "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(6, 9)))
+        for _ in range(patterns * 4)
+    ]
+    rules: dict[str, list[str]] = {f"intent_{i}": [] for i in range(intents)}
+    names = list(rules)
+    for n in range(patterns - regexes):
+        words = rng.sample(vocab, rng.randint(1, 3))
+        rules[names[n % intents]].append(" ".join(words))
+    for n in range(regexes):
+        word = rng.choice(vocab)
+        rules[names[rng.randrange(intents)]].append(rf"{word} (?P<slot_{n % 5}>\d+)")
+    return {"intents": rules, "_vocab": vocab}
+
+
+def utterances(rules: dict[str, Any], n: int, rng: random.Random) -> list[str]:
+    vocab = rules["_vocab"]
+    patterns = [p for ps in rules["intents"].values() for p in ps]
+    texts = []
+    for _ in range(n):
+        words = rng.sample(vocab, 8)
+        if rng.random() < 0.7:
+            # Most utterances contain a pattern somewhere (regex ones get a number)
+            pattern = rng.choice(patterns)
+            phrase = re.sub(r" \(\?P<\w+>\\d\+\)", " 42", pattern)
+            words.insert(rng.randrange(len(words)), phrase)
+        texts.append(" ".join(words))
+    return texts
+
+
+def time_per_call(fn, texts: list[str]) -> float:
+    started = time.perf_counter()
+    for text in texts:
+        fn(text)
+    return (time.perf_counter() - started) / len(texts)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--intents", type=int, default=1000)
+    parser.add_argument("--patterns", type=int, default=20000)
+    parser.add_argument("--regex", type=int, default=50, help="regex patterns among them")
+    parser.add_argument("--utterances", type=int, default=2000)
+    parser.add_argument("--legacy-utterances", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+
+    sizes = sorted({max(args.intents, args.patterns * k // 20) for k in (1, 5, 10, 20)})
+    print(f"intents={args.intents} regex={args.regex} utterances={args.utterances}")
+    for size in sizes:
+        rng = random.Random(args.seed)
+        rules = synthetic_rules(args.intents, size, args.regex, rng)
+        texts = utterances(rules, args.utterances, rng)
+
+        started = time.perf_counter()
+        classifier = IntentClassifier()
+        classifier._use_rules({"intents": rules["intents"]})
+        build_s = time.perf_counter() - started
+
+        compiled = time_per_call(classifier.predict, texts)
+        legacy = time_per_call(lambda t: legacy_predict(rules, t), texts[: args.legacy_utterances])
+        matched = statistics.mean(len(classifier.predict(t)["matches"]) for t in texts[:200])
+        print(
+            f"patterns={size:>6}  build={build_s * 1000:7.1f}ms  "
+            f"compiled={compiled * 1e6:8.1f}us  legacy={legacy * 1e6:10.1f}us  "
+            f"speedup={legacy / compiled:7.1f}x  intents/utterance={matched:.2f}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,163 @@
+"""
+fp32 vs int8 Whisper benchmark on a folder of WAV files.
+
+For every (model size, mode) pair a fresh process loads `WhisperSTT`,
+decodes every WAV once (after one untimed warm-up) and reports:
+
+- RTF: decode time / audio duration (lower is better, < 1 is faster than realtime)
+- peak RSS of the worker process
+- WER against `<clip>.txt` reference transcripts, if present
+- plate error rate against `<clip>.plate` references, if present
+  (compared after `extract_plate_num` normalization)
+
+Usage:
+    python -m benchmarks.stt_quantization --wav-dir data/clips --models tiny base small
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing as mp
+import queue
+import re
+import threading
+import time
+from pathlib import Path
+
+SAMPLE_RATE = 16000
+
+
+def word_errors(reference: str, hypothesis: str) -> tuple[int, int]:
+    """Return (word edit distance, reference word count)."""
+    ref = re.findall(r"\w+", reference.lower())
+    hyp = re.findall(r"\w+", hypothesis.lower())
+    prev = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, start=1):
+        cur = [i] + [0] * len(hyp)
+        for j, h in enumerate(hyp, start=1):
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (r != h))
+        prev = cur
+    return prev[-1], len(ref)
+
+
+class PeakRSS:
+    """Samples the process RSS in a background thread and keeps the maximum."""
+
+    def __init__(self, interval: float = 0.05) -> None:
+        import psutil
+
+        self._process = psutil.Process()
+        self._interval = interval
+        self._stop = threading.Event()
+        self.peak = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self._process.memory_info().rss)
+            self._stop.wait(self._interval)
+
+    def __enter__(self) -> "PeakRSS":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self._process.memory_info().rss)
+
+
+def _run_config(model_size: str, mode: str, num_threads: int | None, wavs: list[str], out) -> None:
+    import whisper
+
+    from stt_module.stt import WhisperSTT
+
+    with PeakRSS() as rss:
+        load_started = time.perf_counter()
+        stt = WhisperSTT(
+            model_size=model_size,
+            device="cpu",
+            quantization="int8" if mode == "int8" else None,
+            num_threads=num_threads,
+        )
+        load_s = time.perf_counter() - load_started
+
+        clips = [(path, whisper.load_audio(path)) for path in wavs]
+        stt.transcribe_buffer(clips[0][1])  # warm-up
+
+        audio_s = decode_s = 0.0
+        errors = ref_words = plate_errors = plate_total = 0
+        for path, audio in clips:
+            started = time.perf_counter()
+            text, _ = stt.transcribe_buffer(audio)
+            decode_s += time.perf_counter() - started
+            audio_s += len(audio) / SAMPLE_RATE
+
+            ref_path = Path(path).with_suffix(".txt")
+            if ref_path.exists():
+                e, n = word_errors(ref_path.read_text(encoding="utf-8"), text)
+                errors += e
+                ref_words += n
+            plate_path = Path(path).with_suffix(".plate")
+            if plate_path.exists():
+                expected = stt.extract_plate_num(plate_path.read_text(encoding="utf-8"))
+                plate_total += 1
+                plate_errors += stt.extract_plate_num(text) != expected
+
+    out.put({
+        "model": model_size,
+        "mode": mode,
+        "clips": len(clips),
+        "load_s": round(load_s, 2),
+        "rtf": round(decode_s / audio_s, 3) if audio_s else None,
+        "peak_rss_mb": round(rss.peak / (1024 * 1024), 1),
+        "wer": round(errors / ref_words, 3) if ref_words else None,
+        "plate_err": round(plate_errors / plate_total, 3) if plate_total else None,
+    })
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Whisper fp32 vs int8 CPU benchmark")
+    parser.add_argument("--wav-dir", required=True, help="Folder with .wav clips (+ optional .txt/.plate)")
+    parser.add_argument("--models", nargs="+", default=["tiny", "base", "small"])
+    parser.add_argument("--modes", nargs="+", default=["fp32", "int8"], choices=["fp32", "int8"])
+    parser.add_argument("--threads", type=int, default=None, help="torch intra-op threads")
+    parser.add_argument("--json", help="Also write results to this JSON file")
+    args = parser.parse_args(argv)
+
+    wavs = sorted(str(p) for p in Path(args.wav_dir).glob("*.wav"))
+    if not wavs:
+        parser.error(f"no .wav files in {args.wav_dir}")
+
+    # One process per configuration: clean peak RSS and no shared torch state
+    ctx = mp.get_context("spawn")
+    results = []
+    for model_size in args.models:
+        for mode in args.modes:
+            out = ctx.Queue()
+            proc = ctx.Process(target=_run_config, args=(model_size, mode, args.threads, wavs, out))
+            proc.start()
+            result = None
+            while result is None and (proc.is_alive() or not out.empty()):
+                try:
+                    result = out.get(timeout=1)
+                except queue.Empty:
+                    continue
+            proc.join()
+            if result is None:
+                print(f"{model_size:<6} {mode:<5} failed (exit code {proc.exitcode})")
+                continue
+            results.append(result)
+            print(
+                f"{result['model']:<6} {result['mode']:<5} rtf={result['rtf']} "
+                f"peak_rss={result['peak_rss_mb']}MB wer={result['wer']} "
+                f"plate_err={result['plate_err']} load={result['load_s']}s"
+            )
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,92 @@
+"""
+Vector intent classifier: training, memory-mapped startup and latency.
+
+Trains `VectorIntentClassifier` on synthetic intents (`--intents` x
+`--examples` short phrases), saves it and measures:
+
+- train: fitting from scratch (what startup would cost without a saved model)
+- load: `VectorIntentClassifier.load`, i.e. memory-mapping the .npy files
+- predict: one utterance (sparse features @ intent matrix)
+- predict_many: per utterance, in batches of `--batch`
+- accuracy on held-out paraphrases (examples with a typo and word dropped)
+
+Usage:
+    python -m benchmarks.vector_intents --intents 200 --examples 20 --batch 256
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import tempfile
+import time
+
+from app.nlu.vector_classifier import VectorIntentClassifier
+
+
+def synthetic_examples(intents: int, examples: int, rng: random.Random) -> list[tuple[str, str]]:
+    vocab = ["".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(3, 8))) for _ in range(3000)]
+    data = []
+    for i in range(intents):
+        # Each intent has its own key words, mixed with common ones
+        keys = rng.sample(vocab, 4)
+        for _ in range(examples):
+            words = rng.sample(keys, 2) + rng.sample(vocab[:200], 3)
+            rng.shuffle(words)
+            data.append((" ".join(words), f"intent_{i}"))
+    return data
+
+
+def noisy(text: str, rng: random.Random) -> str:
+    words = text.split()
+    words.pop(rng.randrange(len(words)))
+    word = rng.randrange(len(words))
+    chars = list(words[word])
+    chars[rng.randrange(len(chars))] = rng.choice("abcdefghijklmnopqrstuvwxyz")
+    words[word] = "".join(chars)
+    return " ".join(words)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--intents", type=int, default=200)
+    parser.add_argument("--examples", type=int, default=20)
+    parser.add_argument("--batch", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    data = synthetic_examples(args.intents, args.examples, rng)
+    queries = [rng.choice(data) for _ in range(args.queries)]
+    texts = [noisy(text, rng) for text, _ in queries]
+
+    started = time.perf_counter()
+    model = VectorIntentClassifier.train(data)
+    train_s = time.perf_counter() - started
+
+    with tempfile.TemporaryDirectory(prefix="intent-model-") as tmp:
+        model.save(tmp)
+        started = time.perf_counter()
+        model = VectorIntentClassifier.load(tmp)
+        load_s = time.perf_counter() - started
+
+        started = time.perf_counter()
+        single = [model.predict(t)["intent"] for t in texts]
+        single_s = (time.perf_counter() - started) / len(texts)
+
+        started = time.perf_counter()
+        batched = [r["intent"] for r in model.predict_many(texts, chunk=args.batch)]
+        batched_s = (time.perf_counter() - started) / len(texts)
+
+    accuracy = sum(p == label for p, (_, label) in zip(single, queries)) / len(queries)
+    print(f"intents={args.intents} examples={len(data)} dim={model.dim}")
+    print(f"train={train_s * 1000:.1f}ms  load(mmap)={load_s * 1000:.2f}ms")
+    print(
+        f"predict={single_s * 1e6:.1f}us  predict_many={batched_s * 1e6:.1f}us/utterance "
+        f"(batch {args.batch})  accuracy={accuracy:.3f}  same={single == batched}"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
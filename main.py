@@ -1,12 +1,12 @@
 import argparse
+import json
 import logging
 from pathlib import Path
 
 from app.config import AppConfig
 from app.decision import engine
+from app.logging_config import init_logging
 from app.orchestrator import VoiceOrchestrator
-from stt_module.stt import WhisperSTT
-from app.services.tts_service import TTSService
 
 from app.decision.tree_engine import DecisionTreeEngine
 
@@ -14,9 +14,12 @@ def build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(description="OrbilityParking voice pipeline")
     parser.add_argument(
         "--mode",
-        choices=["listen"],
+        choices=["listen", "batch", "lanes", "simulate", "reclassify"],
         default="listen",
-        help="listen: realtime microphone mode",
+        help="listen: realtime microphone mode; batch: offline transcription of recorded clips; "
+        "lanes: one dialogue per parking lane in one process; "
+        "simulate: scripted dialogues with fake STT/TTS against a temp DB; "
+        "reclassify: re-score stored transcripts with the current intents into decisions_shadow",
     )
     parser.add_argument(
         "--duration",
@@ -29,14 +32,201 @@ def build_parser() -> argparse.ArgumentParser:
         action="store_true",
         help="Показывать использование ресурсов во время прослушивания",
     )
+    parser.add_argument(
+        "--input",
+        type=Path,
+        help="batch: каталог с аудио или манифест (.txt / .jsonl с полем path)",
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        help="batch: JSONL-файл результатов (дописывается, используется для resume); "
+        "reclassify: JSON-файл с отчётом о расхождениях",
+    )
+    parser.add_argument(
+        "--to-db",
+        action="store_true",
+        help="batch: сохранять результаты в transcripts/decisions",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="batch: число процессов (по одной модели Whisper на процесс); "
+        "reclassify: число процессов (0 - в текущем)",
+    )
+    parser.add_argument(
+        "--no-resume",
+        action="store_true",
+        help="batch: не пропускать уже обработанные файлы",
+    )
+    parser.add_argument(
+        "--lanes",
+        type=int,
+        default=2,
+        help="lanes: число дорожек (микрофоны - LANE_MIC_DEVICES)",
+    )
+    parser.add_argument(
+        "--dialogues",
+        type=int,
+        default=None,
+        help="lanes: диалогов на дорожку (по умолчанию - до Ctrl+C); simulate: всего диалогов (1000)",
+    )
+    parser.add_argument(
+        "--script",
+        type=Path,
+        help="simulate: JSONL со сценариями диалогов (по умолчанию - встроенные)",
+    )
+    parser.add_argument(
+        "--stt-latency-ms",
+        type=float,
+        default=0.0,
+        help="simulate: искусственная задержка распознавания на реплику",
+    )
+    parser.add_argument(
+        "--tts-latency-ms",
+        type=float,
+        default=0.0,
+        help="simulate: искусственная длительность фразы",
+    )
+    parser.add_argument(
+        "--run-id",
+        default=None,
+        help="reclassify: имя прогона в decisions_shadow (по умолчанию - время запуска); "
+        "повторный запуск с тем же именем продолжает прогон",
+    )
+    parser.add_argument(
+        "--page-size",
+        type=int,
+        default=500,
+        help="reclassify: строк transcripts на страницу (задачу воркера и транзакцию)",
+    )
     return parser
 
 
+def run_batch_mode(args: argparse.Namespace, config: AppConfig) -> None:
+    from app.batch import run_batch
+
+    if args.input is None:
+        raise SystemExit("--mode batch требует --input")
+    init_logging(config)
+    summary = run_batch(
+        config,
+        source=args.input,
+        output=args.output,
+        to_db=args.to_db,
+        workers=args.workers,
+        resume=not args.no_resume,
+    )
+    print(json.dumps(summary, ensure_ascii=False))
+
+
+def run_simulate_mode(args: argparse.Namespace, config: AppConfig) -> None:
+    from app.simulate import load_scripts, run_simulation
+
+    init_logging(config)
+    report = run_simulation(
+        config,
+        dialogues=args.dialogues or 1000,
+        lanes=args.lanes,
+        scripts=load_scripts(args.script),
+        stt_latency_s=args.stt_latency_ms / 1000,
+        tts_latency_s=args.tts_latency_ms / 1000,
+    )
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+def run_reclassify_mode(args: argparse.Namespace, config: AppConfig) -> None:
+    from app.reclassify import run_reclassify
+
+    init_logging(config)
+    report = run_reclassify(
+        config,
+        run_id=args.run_id,
+        workers=args.workers,
+        page_size=args.page_size,
+        output=args.output,
+    )
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+def watch_tree(orchestrator: VoiceOrchestrator) -> None:
+    """
+    Горячая перезагрузка decision_tree.json: новая версия дерева компилируется
+    в фоне и подхватывается между диалогами; изменившиеся фразы сразу
+    рендерятся в кэш TTS.
+    """
+    store = orchestrator.tree_store
+    tts = orchestrator.tts_service
+    if store is None:
+        return
+    if tts is not None:
+        def rerender(old, new) -> None:
+            known = set(old.prompts)
+            changed = [p for p in new.prompts if p not in known]
+            if changed:
+                tts.prerender(changed)
+
+        store.subscribe(rerender)
+    store.start()
+
+
+def preload_confirmation(config: AppConfig) -> None:
+    """
+    Модель да/нет (запасной вариант для неоднозначных ответов) грузится в фоне
+    сейчас, а не на первом таком ответе посреди диалога.
+    """
+    if config.sentiment_preload:
+        from app.nlu.confirmation import get_confirmation_model
+
+        get_confirmation_model(config).preload()
+
+
+def run_lanes_mode(args: argparse.Namespace, orchestrator: VoiceOrchestrator) -> None:
+    import asyncio
+
+    from app.decision.lanes import LaneEngine
+
+    config = orchestrator.config
+    tts = orchestrator.tts_service
+    lanes = LaneEngine.from_config(
+        config, args.lanes, tts=tts, repo=orchestrator.repo, store=orchestrator.tree_store
+    )
+    # Модели Whisper общие для всех дорожек (stt_module.registry) - грузим один раз
+    orchestrator.stt_service.engine.load_models(lanes.stt_model_sizes(), background=True)
+    preload_confirmation(config)
+    if tts is not None:
+        tts.prerender(lanes.static_prompts())
+    watch_tree(orchestrator)
+    try:
+        report = asyncio.run(lanes.run(dialogues=args.dialogues))
+    except KeyboardInterrupt:
+        report = lanes.report()
+    finally:
+        if orchestrator.tree_store is not None:
+            orchestrator.tree_store.stop()
+        lanes.close()
+        if tts is not None:
+            tts.close()
+        orchestrator.db.close()
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
 def main() -> None:
     args = build_parser().parse_args()
     config = AppConfig.from_env()
     log = logging.getLogger("main")
 
+    if args.mode == "batch":
+        run_batch_mode(args, config)
+        return
+    if args.mode == "simulate":
+        run_simulate_mode(args, config)
+        return
+    if args.mode == "reclassify":
+        run_reclassify_mode(args, config)
+        return
+
     if not config.tts_voice_path:
         default_voice = Path("tts_module/models/en_US-ryan-low.onnx")
         if default_voice.exists():
@@ -46,17 +236,18 @@ def main() -> None:
             log.warning("TTS voice не задан (env TTS_VOICE_PATH) и файл по умолчанию не найден.")
 
     orchestrator = VoiceOrchestrator(config)
-    try:
-        stt = WhisperSTT(model_size=config.stt_model_size)
-        # orchestrator.set_stt_service(stt)
-    except Exception as e:
-        log.error("Не удалось инициализировать STT-модуль: %s", e)
+    if args.mode == "lanes":
+        run_lanes_mode(args, orchestrator)
+        return
 
-    try:
-        tts = TTSService(voice_path=config.tts_voice_path)
-            # orchestrator.set_tts_service(tts)
-    except Exception as e:
-        log.error("Не удалось инициализировать TTS-модуль: %s", e)
+    # STT уже создан оркестратором; модели Whisper общие на процесс
+    # (stt_module.registry), поэтому повторной загрузки нет.
+    stt = orchestrator.stt_service.engine
+
+    # TTS-воркер (процесс с загруженным голосом) тоже создан оркестратором
+    tts = orchestrator.tts_service
+    if tts is None:
+        log.error("TTS-модуль не инициализирован: нет голоса")
 
     # plate = input("Камера: введите номер авто: ").strip()
     # if plate:
@@ -95,11 +286,27 @@ def main() -> None:
     #     log.info("Interrupted by user, stopping...")
     # finally:
     #     log.info("Завершение работы.")
-    engine = DecisionTreeEngine("decision_tree.json")
+    engine = DecisionTreeEngine(
+        config.decision_tree_path, barge_in=config.barge_in, store=orchestrator.tree_store
+    )
+    stt.load_models(engine.stt_model_sizes(), background=True)
+    preload_confirmation(config)
     engine.actions.stt = stt
     engine.actions.tts = tts
+    if tts is not None:
+        # Статичные фразы дерева рендерятся в кэш заранее (уже готовые — пропускаются)
+        tts.prerender(engine.static_prompts())
+    watch_tree(orchestrator)
 
-    engine.run()
+    try:
+        engine.run()
+    finally:
+        if orchestrator.tree_store is not None:
+            orchestrator.tree_store.stop()
+        if tts is not None:
+            tts.close()
+        engine.actions.repo.db.close()
+        orchestrator.db.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,153 @@
+"""
+Общий на процесс реестр моделей Whisper.
+
+Модель — самый большой объект процесса, поэтому каждая комбинация
+(model_size, device, dtype, quantization) загружается один раз и раздаётся
+всем потребителям (WhisperSTT, сервисы, дорожки) как ModelHandle.
+
+Использование:
+    handle = get_registry().get("small")          # ленивая загрузка
+    handle.transcribe(audio, language=None)       # потокобезопасно
+    get_registry().warm_up([handle])              # фоновая загрузка заранее
+"""
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+import psutil
+import torch
+import whisper
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ModelKey:
+    model_size: str
+    device: str
+    dtype: str
+    quantization: Optional[str] = None
+
+    @classmethod
+    def resolve(cls, model_size, device=None, quantization=None):
+        if device is None:
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+        dtype = "float16" if device == "cuda" else "float32"
+        return cls(model_size, device, dtype, quantization if device == "cpu" else None)
+
+
+class ModelHandle:
+    """
+    Общий доступ к одной модели: ленивая загрузка и сериализованный инференс
+    (transcribe Whisper вешает hooks на модель и не реентерабелен).
+    """
+
+    def __init__(self, key: ModelKey):
+        self.key = key
+        self._model = None
+        self._load_lock = threading.Lock()
+        self._infer_lock = threading.Lock()
+        self.load_s = None
+        self.rss_delta_mb = None
+
+    @property
+    def loaded(self):
+        return self._model is not None
+
+    @property
+    def model(self):
+        if self._model is None:
+            self.load()
+        return self._model
+
+    def load(self):
+        with self._load_lock:
+            if self._model is not None:
+                return self._model
+            process = psutil.Process(os.getpid())
+            rss_before = process.memory_info().rss
+            started = time.perf_counter()
+
+            dtype = getattr(torch, self.key.dtype)
+            model = whisper.load_model(self.key.model_size, device=self.key.device).to(dtype=dtype)
+            if self.key.quantization == "int8":
+                model = quantize_dynamic_int8(model)
+
+            self.load_s = time.perf_counter() - started
+            self.rss_delta_mb = (process.memory_info().rss - rss_before) / (1024 * 1024)
+            logger.info(
+                "Loaded Whisper %s in %.2fs, resident +%.1f MB",
+                self.key, self.load_s, self.rss_delta_mb,
+            )
+            self._model = model
+            return model
+
+    def transcribe(self, audio, **options):
+        model = self.model
+        with self._infer_lock:
+            return model.transcribe(audio, **options)
+
+
+class ModelRegistry:
+    def __init__(self):
+        self._handles = {}
+        self._lock = threading.Lock()
+
+    def get(self, model_size, device=None, quantization=None, eager=False):
+        """
+        Возвращает общий handle; eager=True - загрузить сразу (блокирующе).
+        """
+        key = ModelKey.resolve(model_size, device=device, quantization=quantization)
+        with self._lock:
+            handle = self._handles.get(key)
+            if handle is None:
+                handle = ModelHandle(key)
+                self._handles[key] = handle
+        if eager:
+            handle.load()
+        return handle
+
+    def warm_up(self, handles, background=True):
+        """
+        Загружает модели заранее; background=True - в фоновом потоке (возвращает его).
+        Потребитель, обратившийся к модели раньше, просто дождётся окончания загрузки.
+        """
+        def _load_all():
+            for handle in handles:
+                try:
+                    handle.load()
+                except Exception:
+                    logger.exception("Whisper warm-up failed for %s", handle.key)
+
+        if not background:
+            _load_all()
+            return None
+        thread = threading.Thread(target=_load_all, name="whisper-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def handles(self):
+        with self._lock:
+            return list(self._handles.values())
+
+
+def quantize_dynamic_int8(model):
+    """
+    Динамическая int8-квантизация всех Linear-слоёв модели Whisper (CPU).
+    whisper.model.Linear лишь переопределяет forward (приведение dtype), поэтому
+    приводим такие слои к torch.nn.Linear, иначе quantize_dynamic их пропустит.
+    """
+    for module in model.modules():
+        if isinstance(module, torch.nn.Linear):
+            module.__class__ = torch.nn.Linear
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+_registry = ModelRegistry()
+
+
+def get_registry():
+    return _registry
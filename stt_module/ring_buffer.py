@@ -0,0 +1,81 @@
+"""
+Кольцевой буфер фиксированной ёмкости для накопления аудио (float32).
+
+Хранилище выделяется один раз и имеет двойной размер: каждый сэмпл пишется
+дважды (в позицию i и i + capacity). Благодаря этому любые последние N <= capacity
+сэмплов всегда лежат в памяти непрерывно и отдаются как view без копирования.
+"""
+import numpy as np
+
+
+class AudioRingBuffer:
+    def __init__(self, capacity, dtype=np.float32):
+        """
+        capacity: максимальное количество хранимых сэмплов
+        """
+        self.capacity = int(capacity)
+        self._storage = np.zeros(2 * self.capacity, dtype=dtype)
+        self._head = 0          # позиция записи внутри [0, capacity)
+        self.total_written = 0  # абсолютное количество записанных сэмплов
+
+    def __len__(self):
+        return min(self.total_written, self.capacity)
+
+    @property
+    def oldest(self):
+        """Абсолютный индекс самого старого сэмпла, который ещё хранится."""
+        return self.total_written - len(self)
+
+    def clear(self):
+        self._head = 0
+        self.total_written = 0
+
+    def write(self, chunk):
+        """
+        Дописывает chunk в буфер (копирование только в преаллоцированную память).
+        """
+        n = len(chunk)
+        if n == 0:
+            return
+        if n > self.capacity:
+            self.total_written += n - self.capacity
+            chunk = chunk[-self.capacity:]
+            n = self.capacity
+
+        cap = self.capacity
+        first = min(n, cap - self._head)
+        for offset, part in ((self._head, chunk[:first]), (0, chunk[first:])):
+            if len(part):
+                self._storage[offset:offset + len(part)] = part
+                self._storage[offset + cap:offset + cap + len(part)] = part
+
+        self._head = (self._head + n) % cap
+        self.total_written += n
+
+    def latest(self, n):
+        """
+        Zero-copy view на последние n сэмплов. View действителен до следующей записи.
+        """
+        n = min(int(n), len(self))
+        end = self._head + self.capacity
+        return self._storage[end - n:end]
+
+    def window(self, start, end=None):
+        """
+        Zero-copy view на сэмплы [start, end) в абсолютных индексах
+        (end=None - до текущего конца).
+        """
+        start = max(int(start), self.oldest)
+        end = self.total_written if end is None else min(int(end), self.total_written)
+        return self.latest(self.total_written - start)[:max(0, end - start)]
+
+
+def pcm16_to_float32(pcm, out=None):
+    """
+    Конвертация int16 PCM в float32 [-1, 1] за один проход, без промежуточных копий.
+    out: преаллоцированный float32-массив той же длины (иначе выделяется новый).
+    """
+    if out is None:
+        out = np.empty(len(pcm), dtype=np.float32)
+    np.multiply(pcm, np.float32(1.0 / 32768.0), out=out, casting="unsafe")
+    return out
@@ -0,0 +1,58 @@
+"""
+Политика local agreement для потоковых (partial) гипотез Whisper.
+
+Скользящее окно аудио перекодируется каждые N сотен миллисекунд. Слова,
+совпавшие в последних n гипотезах подряд, считаются стабильными: они
+фиксируются (commit), их аудио больше не декодируется, а сам текст уходит
+в initial_prompt следующих проходов.
+"""
+import re
+from collections import deque
+
+
+def _norm(word):
+    return re.sub(r"[^\w]", "", word.get("word", "").lower())
+
+
+class LocalAgreement:
+    def __init__(self, n=2):
+        """
+        n: в скольких последних гипотезах подряд должен совпасть префикс
+        """
+        self.n = max(2, int(n))
+        self.reset()
+
+    def reset(self):
+        self._history = deque(maxlen=self.n - 1)
+        self.tentative = []
+
+    def update(self, words):
+        """
+        words: гипотеза после зафиксированной части,
+        список словарей Whisper {"word", "start", "end", ...}.
+        Возвращает список только что зафиксированных слов.
+        """
+        words = [w for w in words if _norm(w)]
+        agreed = len(words)
+        for previous in self._history:
+            common = 0
+            for a, b in zip(previous, words):
+                if _norm(a) != _norm(b):
+                    break
+                common += 1
+            agreed = min(agreed, common)
+        if len(self._history) < self._history.maxlen:
+            agreed = 0
+
+        committed = words[:agreed]
+        # Все гипотезы выровнены по общему префиксу — обрезаем его
+        self._history = deque(
+            (h[agreed:] for h in self._history), maxlen=self.n - 1
+        )
+        self._history.append(words[agreed:])
+        self.tentative = words[agreed:]
+        return committed
+
+
+def join_words(words):
+    return "".join(w.get("word", "") for w in words).strip()
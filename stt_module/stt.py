@@ -1,4 +1,3 @@
-import whisper
 import torch
 import numpy as np
 import threading
@@ -7,24 +6,87 @@ import pyaudio
 import psutil
 import os
 import re
+import time
+from collections import deque
+
+from stt_module.registry import get_registry
+from stt_module.ring_buffer import AudioRingBuffer, pcm16_to_float32
+from stt_module.streaming import LocalAgreement, join_words
+from stt_module.vad import EnergyVAD
+from stt_module.worker import InferenceWorker
 
 
 class WhisperSTT:
-    def __init__(self, model_size="small", device=None):
+    def __init__(self, model_size="small", device=None, vad_options=None, pre_roll_ms=300,
+                 stream_interval_ms=500, agreement_n=2, quantization=None, num_threads=None,
+                 preload="eager", inference_process=False, input_device=None):
         """
         Инициализация модели Whisper.
         model_size: tiny, base, small (medium и large > 2 ГБ)
+        vad_options: параметры EnergyVAD (пороги, тишина для закрытия фразы и т.д.)
+        pre_roll_ms: сколько аудио до начала речи добавлять к фразе
+        stream_interval_ms: как часто перекодировать окно в потоковом режиме
+        agreement_n: сколько гипотез подряд должны совпасть для фиксации слов
+        quantization: None или "int8" - динамическая int8-квантизация Linear-слоёв (только CPU)
+        num_threads: число intra-op потоков torch (None - по умолчанию torch)
+        preload: "eager" - загрузить модель сейчас, "background" - в фоновом потоке,
+        "lazy" - при первом распознавании. Модели общие на процесс (stt_module.registry).
+        inference_process: выполнять VAD и Whisper в отдельном процессе-воркере
+        (stt_module.worker); в этом процессе модель тогда не загружается.
+        input_device: индекс входного устройства PyAudio (None - по умолчанию);
+        у каждой дорожки парковки свой микрофон.
         """
+        worker_kwargs = dict(
+            model_size=model_size, device=device, vad_options=vad_options,
+            pre_roll_ms=pre_roll_ms, stream_interval_ms=stream_interval_ms,
+            agreement_n=agreement_n, quantization=quantization, num_threads=num_threads,
+        )
         if device is None:
             device = "cuda" if torch.cuda.is_available() else "cpu"
+        if num_threads:
+            torch.set_num_threads(int(num_threads))
+        if quantization and quantization != "int8":
+            raise ValueError(f"Неподдерживаемый режим квантизации: {quantization}")
+        self.quantization = quantization if device == "cpu" else None
 
-        # Загружаем модель в нужном dtype в зависимости от устройства
-        dtype = torch.float16 if device == "cuda" else torch.float32
-        self.model = whisper.load_model(model_size, device=device).to(dtype=dtype)
+        self.device = device
+        self.model_size = model_size
+        self.input_device = input_device
+        # Handle общей модели (dtype по устройству, квантизация); transcribe потокобезопасен
+        self.model = self.get_model(model_size)
+        self.inference_worker = None
+        if inference_process:
+            self.inference_worker = InferenceWorker(worker_kwargs)
+        elif preload == "eager":
+            self.model.load()
+        elif preload == "background":
+            get_registry().warm_up([self.model])
+        # Счётчики захвата: переполнения входного буфера PortAudio и потерянные сэмплы
+        self.capture_stats = {"chunks": 0, "overflows": 0, "dropped_samples": 0}
+        # Каскад моделей для текущей записи (см. transcribe_microphone)
+        self.cascade = None
         self.sample_rate = 16000
         self.buffer_queue = queue.Queue()
         self.is_listening = False
         self.transcript_callback = None
+        self.vad_options = dict(vad_options or {})
+        self.vad = EnergyVAD(sample_rate=self.sample_rate, full_scale=1.0, **self.vad_options)
+        self.pre_roll_samples = int(self.sample_rate * pre_roll_ms / 1000)
+        # Ёмкость: самая длинная фраза + pre-roll + запас в пару секунд
+        self.ring = AudioRingBuffer(
+            self.vad.max_utterance_samples + self.pre_roll_samples + 2 * self.sample_rate
+        )
+        # Выставляется после обработки каждой фразы (для раннего завершения записи)
+        self.utterance_event = threading.Event()
+        # Запрос на досрочную остановку записи (например, из partial_callback)
+        self.stop_event = threading.Event()
+        self._flush_on_stop = True
+        self.last_utterance_stats = None
+        # Потоковый режим (partial-гипотезы)
+        self.partial_callback = None
+        self.stream_interval_samples = int(self.sample_rate * stream_interval_ms / 1000)
+        self.agreement = LocalAgreement(n=agreement_n)
+        self._reset_stream(0)
 
     def transcribe_file(self, audio_path):
         """
@@ -36,18 +98,77 @@ class WhisperSTT:
     def transcribe_buffer(self, audio_buffer):
         """
         Транскрибация аудио-буфера (numpy array).
+        float32 ожидается уже нормированным в [-1, 1] и передаётся в Whisper без копий;
+        int16 PCM конвертируется здесь.
         """
-        audio = audio_buffer.astype(np.float32)
-        audio = audio / 32768.0
-        result = self.model.transcribe(audio, language=None)
+        result = self._decode(audio_buffer)
         return result["text"], result["language"]
 
-    def start_realtime_transcription(self, callback=None):
+    def get_model(self, model_size):
+        """
+        Возвращает handle общей модели нужного размера (загрузка при первом обращении).
+        "default" - основная модель (model_size из конструктора).
+        """
+        if model_size == "default":
+            model_size = self.model_size
+        return get_registry().get(model_size, device=self.device, quantization=self.quantization)
+
+    def load_models(self, model_sizes, background=False):
+        """
+        Заранее загружает модели каскада, чтобы первая реплика не ждала загрузки.
+        """
+        handles = [self.get_model(model_size) for model_size in model_sizes]
+        return get_registry().warm_up(handles, background=background)
+
+    def _decode(self, audio, model_size=None, **options):
+        if audio.dtype != np.float32:
+            audio = pcm16_to_float32(audio)
+        options.setdefault("language", None)
+        model = self.get_model(model_size) if model_size else self.model
+        return model.transcribe(audio, **options)
+
+    def _cascade_models(self):
+        if self.cascade and self.cascade.get("models"):
+            return list(self.cascade["models"])
+        return [self.model_size]
+
+    def _decode_cascade(self, audio, **options):
+        """
+        Прогоняет фразу через каскад моделей: следующая (большая) модель
+        запускается только если уверенность предыдущей ниже порогов каскада.
+        """
+        models = [self.model_size if m == "default" else m for m in self._cascade_models()]
+        cascade = self.cascade or {}
+        min_logprob = cascade.get("min_avg_logprob", -1.0)
+        max_no_speech = cascade.get("max_no_speech_prob", 0.6)
+
+        for i, model_size in enumerate(models):
+            result = self._decode(audio, model_size=model_size, **options)
+            avg_logprob, no_speech_prob = result_confidence(result)
+            result["model"] = model_size
+            result["escalations"] = i
+            confident = avg_logprob >= min_logprob and no_speech_prob <= max_no_speech
+            if confident or i == len(models) - 1:
+                return result
+            print(
+                f"[CASCADE] {model_size}: avg_logprob={avg_logprob:.2f} "
+                f"no_speech={no_speech_prob:.2f} -> {models[i + 1]}"
+            )
+        return result
+
+    def start_realtime_transcription(self, callback=None, partial_callback=None):
         """
         Начать транскрибацию в реальном времени из буфера.
         callback(text, language) - вызывается при завершении фразы.
+        partial_callback(committed, tentative, language) - включает потоковый режим:
+        вызывается при каждом перекодировании окна; committed уже не изменится.
         """
         self.transcript_callback = callback
+        self.partial_callback = partial_callback
+        self.buffer_queue = queue.Queue()
+        self.utterance_event.clear()
+        self.stop_event.clear()
+        self._flush_on_stop = True
         self.is_listening = True
         self.listen_thread = threading.Thread(target=self._process_buffer_stream)
         self.listen_thread.start()
@@ -55,42 +176,174 @@ class WhisperSTT:
     def stop_realtime_transcription(self):
         """
         Остановить транскрибацию в реальном времени.
+        Недослушанная фраза в буфере дообрабатывается перед остановкой
+        (если остановка не была запрошена через request_stop(flush=False)).
         """
         self.is_listening = False
         if hasattr(self, 'listen_thread'):
+            self.buffer_queue.put(None)
             self.listen_thread.join()
 
+    def request_stop(self, flush=False):
+        """
+        Досрочно завершить запись с микрофона (безопасно вызывать из callback'ов).
+        flush: дорасшифровать недослушанную фразу при остановке.
+        """
+        self._flush_on_stop = flush
+        self.stop_event.set()
+
     def _process_buffer_stream(self):
         """
         Внутренний метод для обработки буфера в реальном времени.
+        Фраза открывается по началу речи (VAD) и закрывается по тишине после неё;
+        чистая тишина в Whisper не попадает.
         """
-        accumulated_audio = np.array([], dtype=np.float32)
+        self.vad.reset()
+        self.ring.clear()
+        utterance_start = None
+        last_voiced_at = time.monotonic()
 
-        while self.is_listening:
+        while True:
             try:
                 chunk = self.buffer_queue.get(timeout=0.1)
-                if chunk is None:
+            except queue.Empty:
+                if not self.is_listening:
                     break
-                accumulated_audio = np.concatenate([accumulated_audio, chunk])
+                continue
+            if chunk is None:
+                break
 
-                # Если накоплено >= 4 секунд — транскрибировать
-                if len(accumulated_audio) >= self.sample_rate * 7:
-                    text, lang = self.transcribe_buffer(accumulated_audio)
-                    if text.strip():
-                        if self.transcript_callback:
-                            self.transcript_callback(text, lang)
-                    accumulated_audio = np.array([], dtype=np.float32)
+            now = time.monotonic()
+            self.ring.write(chunk)
+            voiced_before = self.vad.last_voiced_sample
+            events = self.vad.process(chunk)
+            if self.vad.last_voiced_sample != voiced_before:
+                last_voiced_at = now
 
-            except queue.Empty:
-                continue
+            for event in events:
+                if event.kind == "start" and utterance_start is None:
+                    utterance_start = max(event.sample - self.pre_roll_samples, self.ring.oldest)
+                    self._reset_stream(utterance_start)
+                elif event.kind == "start":
+                    utterance_start = event.sample
+                    self._reset_stream(utterance_start)
+                elif event.kind == "end" and utterance_start is not None:
+                    self._finish_utterance(event.sample, event.reason, last_voiced_at, now)
+                    utterance_start = event.sample if event.reason == "max_length" else None
+
+            if (
+                self.partial_callback
+                and utterance_start is not None
+                and self.ring.total_written - self._last_partial_at >= self.stream_interval_samples
+            ):
+                self._stream_partial()
+
+        if (
+            self._flush_on_stop
+            and utterance_start is not None
+            and self.ring.total_written > self._committed_sample
+        ):
+            now = time.monotonic()
+            self._finish_utterance(None, "stream_end", min(last_voiced_at, now), now)
+
+    def _reset_stream(self, start):
+        self.agreement.reset()
+        self._committed_words = []
+        self._committed_sample = start
+        self._last_partial_at = start
+        self._stream_lang = None
+
+    def _stream_partial(self):
+        """
+        Перекодирует окно от последнего зафиксированного слова до текущего конца
+        и фиксирует стабильный префикс по политике local agreement.
+        """
+        start = self._committed_sample
+        self._last_partial_at = self.ring.total_written
+        result = self._decode(
+            self.ring.window(start),
+            model_size=self._cascade_models()[0],
+            language=self._stream_lang,
+            word_timestamps=True,
+            initial_prompt=join_words(self._committed_words) or None,
+            condition_on_previous_text=False,
+        )
+        self._stream_lang = self._stream_lang or result["language"]
+        words = [w for seg in result.get("segments", []) for w in seg.get("words", [])]
+        committed = self.agreement.update(words)
+        if committed:
+            self._committed_words.extend(committed)
+            self._committed_sample = start + int(committed[-1]["end"] * self.sample_rate)
+        self.partial_callback(
+            join_words(self._committed_words),
+            join_words(self.agreement.tentative),
+            self._stream_lang,
+        )
+
+    def _finish_utterance(self, end, reason, last_voiced_at, endpoint_at):
+        """
+        Транскрибирует закрытую фразу, отдаёт её в callback и считает задержки:
+        endpoint - от последнего кадра речи до закрытия фразы,
+        decode - работа Whisper, total - от конца речи до готового текста.
+        В потоковом режиме декодируется только хвост после зафиксированных слов.
+        """
+        audio = self.ring.window(self._committed_sample, end)
+        result = self._decode_cascade(
+            audio,
+            language=self._stream_lang,
+            initial_prompt=join_words(self._committed_words) or None,
+        )
+        text = " ".join(
+            t for t in (join_words(self._committed_words), result["text"].strip()) if t
+        )
+        lang = self._stream_lang or result["language"]
+        decoded_at = time.monotonic()
+        self.last_utterance_stats = {
+            "reason": reason,
+            "audio_s": round(len(audio) / self.sample_rate, 3),
+            "endpoint_latency_s": round(endpoint_at - last_voiced_at, 3),
+            "decode_s": round(decoded_at - endpoint_at, 3),
+            "total_s": round(decoded_at - last_voiced_at, 3),
+            "model": result["model"],
+            "escalations": result["escalations"],
+        }
+        print(
+            "[ENDPOINT] {reason}: audio={audio_s}s endpoint={endpoint_latency_s}s "
+            "decode={decode_s}s total={total_s}s model={model}".format(**self.last_utterance_stats)
+        )
+        # Пустая фраза (кашель, шум, прошедший энергетический VAD) не завершает
+        # прослушивание: ждём настоящую речь или таймаут
+        if text.strip():
+            if self.transcript_callback:
+                self.transcript_callback(text, lang)
+            self.utterance_event.set()
 
     def add_audio_chunk(self, chunk):
+        """
+        chunk: float32, нормированный в [-1, 1], или int16 PCM.
+        """
+        if chunk.dtype != np.float32:
+            chunk = pcm16_to_float32(chunk)
         self.buffer_queue.put(chunk)
 
-    def transcribe_microphone(self, duration=60, callback=None, show_resources=True):
+    def transcribe_microphone(self, duration=60, callback=None, show_resources=True, stop_on_utterance=False,
+                              partial_callback=None, cascade=None, gate=None, barge_in=None):
         """
         Метод для транскрибации с микрофона.
         Запускает микрофон и транскрибацию в реальном времени.
+        stop_on_utterance: завершить запись сразу после первой распознанной фразы
+        (duration тогда работает как верхняя граница).
+        partial_callback: см. start_realtime_transcription; для досрочной остановки
+        из него можно вызвать request_stop().
+        cascade: {"models": ["base", "small"], "min_avg_logprob": -1.0,
+        "max_no_speech_prob": 0.6} - каскад моделей для этой записи
+        (None - только основная модель).
+        gate: threading.Event - "предвзведённая" запись: микрофон и распознавание
+        готовы сразу, но звук до gate.set() (например, пока играет TTS) отбрасывается,
+        а отсчёт duration начинается с открытия gate.
+        barge_in: callable - при gate звук не отбрасывается; как только VAD
+        услышит речь до открытия gate, вызывается barge_in() (прервать TTS),
+        и запись считается открытой.
         """
         def default_callback(text, lang):
             print(f"[{lang.upper()}] -> {text}")
@@ -105,7 +358,62 @@ class WhisperSTT:
             resource_thread = threading.Thread(target=resource_monitor, args=(stop_event,), daemon=True)
             resource_thread.start()
 
-        self.start_realtime_transcription(callback=callback)
+        self.cascade = cascade
+        self.stop_event.clear()
+        self._flush_on_stop = True
+        worker = self.inference_worker
+        if worker is not None:
+            try:
+                worker.start(callback=callback, partial_callback=partial_callback, cascade=cascade)
+            except RuntimeError as e:
+                # Воркер упал и не перезапустился - дальше декодируем в этом процессе
+                print(f"[WARN] {e}; falling back to in-process decoding")
+                self.close()
+                worker = None
+        if worker is not None:
+            utterance_event = worker.utterance_event
+            push = worker.push_pcm
+        else:
+            self.start_realtime_transcription(callback=callback, partial_callback=partial_callback)
+            utterance_event = self.utterance_event
+
+            def push(pcm):
+                # int16 -> float32 [-1, 1] один раз, прямо при захвате
+                self.buffer_queue.put(pcm16_to_float32(pcm))
+
+        stats = self.capture_stats
+        dropped_before = worker.dropped_samples if worker is not None else 0
+        opened = threading.Event()
+        if gate is None or gate.is_set():
+            opened.set()
+        barge_vad = EnergyVAD(sample_rate=self.sample_rate, **self.vad_options) if barge_in else None
+        # Последние ~0.5 с до открытия: при barge-in начало фразы не теряется
+        held = deque(maxlen=5)
+
+        def on_audio(in_data, frame_count, time_info, status):
+            # Выполняется в потоке PortAudio: только копия в буфер, никакой тяжёлой работы
+            if status & pyaudio.paInputOverflow:
+                stats["overflows"] += 1
+            stats["chunks"] += 1
+            pcm = np.frombuffer(in_data, dtype=np.int16)
+            if not opened.is_set():
+                if gate.is_set():
+                    opened.set()
+                elif barge_vad is None:
+                    return None, pyaudio.paContinue  # ещё говорит TTS - звук не нужен
+                else:
+                    held.append(pcm)
+                    # Энергетический VAD на один кусок - дёшево даже в потоке PortAudio
+                    if not any(e.kind == "start" for e in barge_vad.process(pcm)):
+                        return None, pyaudio.paContinue
+                    print("[BARGE-IN] Речь во время воспроизведения")
+                    opened.set()
+                    barge_in()
+                    while held:
+                        push(held.popleft())
+                    return None, pyaudio.paContinue
+            push(pcm)
+            return None, pyaudio.paContinue
 
         p = pyaudio.PyAudio()
         stream = p.open(
@@ -113,15 +421,23 @@ class WhisperSTT:
             channels=1,
             rate=self.sample_rate,
             input=True,
-            frames_per_buffer=1600
+            input_device_index=self.input_device,
+            frames_per_buffer=1600,
+            stream_callback=on_audio,
         )
         print("Запись начата... Говорите!")
 
         try:
-            for _ in range(0, int(self.sample_rate / 1600 * duration)):
-                data = stream.read(1600, exception_on_overflow=False)
-                audio_chunk = np.frombuffer(data, dtype=np.int16).astype(np.float32)
-                self.add_audio_chunk(audio_chunk)
+            while not opened.is_set() and stream.is_active():
+                if gate.wait(0.02):
+                    opened.set()
+            deadline = time.monotonic() + duration
+            while time.monotonic() < deadline and stream.is_active():
+                if self.stop_event.is_set():
+                    break
+                if stop_on_utterance and utterance_event.is_set():
+                    break
+                time.sleep(0.02)
         except KeyboardInterrupt:
             print("\nОстановка по прерыванию пользователя...")
         finally:
@@ -129,12 +445,27 @@ class WhisperSTT:
             stream.stop_stream()
             stream.close()
             p.terminate()
-            self.stop_realtime_transcription()
+            if worker is not None:
+                worker.stop(flush=self._flush_on_stop)
+                self.last_utterance_stats = worker.last_utterance_stats
+                stats["dropped_samples"] += worker.dropped_samples - dropped_before
+            else:
+                self.stop_realtime_transcription()
+            if stats["overflows"] or stats["dropped_samples"]:
+                print(f"[CAPTURE] overflows={stats['overflows']} dropped_samples={stats['dropped_samples']}")
             if show_resources:
                 stop_event.set()
                 if resource_thread:
                     resource_thread.join()
-    
+
+    def close(self):
+        """
+        Останавливает процесс-воркер инференса (если он используется).
+        """
+        if self.inference_worker is not None:
+            self.inference_worker.shutdown()
+            self.inference_worker = None
+
     def extract_plate_num(self, text: str) -> str:
         # Оставляем только буквы и цифры
         cleaned = re.sub(r"[^A-Za-z0-9]", "", text)
@@ -143,6 +474,20 @@ class WhisperSTT:
         return cleaned.upper()
 
 
+def result_confidence(result):
+    """
+    Уверенность Whisper по сегментам результата: (средний avg_logprob, средний no_speech_prob).
+    Без сегментов (пустое декодирование фразы, которую VAD счёл речью) -
+    наименьшая уверенность, чтобы каскад перешёл к модели побольше.
+    """
+    segments = result.get("segments") or []
+    if not segments:
+        return float("-inf"), 1.0
+    avg_logprob = sum(seg.get("avg_logprob", 0.0) for seg in segments) / len(segments)
+    no_speech_prob = sum(seg.get("no_speech_prob", 0.0) for seg in segments) / len(segments)
+    return avg_logprob, no_speech_prob
+
+
 def print_resources():
     process = psutil.Process(os.getpid())
     mem = process.memory_info().rss / (1024*1024)
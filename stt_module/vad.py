@@ -0,0 +1,126 @@
+"""
+Энергетический VAD (voice activity detection) и endpointing для realtime-потока.
+
+Детектор работает по кадрам фиксированной длины: считает RMS кадра в dBFS,
+сравнивает с порогом (абсолютным и адаптивным относительно уровня шума) и
+ведёт простую машину состояний "тишина" -> "речь" -> "конец фразы".
+
+Использование:
+    vad = EnergyVAD(sample_rate=16000)
+    for event in vad.process(chunk):
+        if event.kind == "start": ...
+        if event.kind == "end": ...
+"""
+from dataclasses import dataclass
+
+import numpy as np
+
+
+@dataclass
+class VADEvent:
+    kind: str          # "start" | "end"
+    sample: int        # абсолютный номер сэмпла, на котором сработало событие
+    reason: str = ""   # для "end": "silence" | "max_length"
+
+
+class EnergyVAD:
+    def __init__(
+        self,
+        sample_rate=16000,
+        frame_ms=20,
+        threshold_db=-45.0,
+        noise_margin_db=10.0,
+        min_speech_ms=120,
+        trailing_silence_ms=600,
+        max_utterance_s=15.0,
+        full_scale=32768.0,
+    ):
+        """
+        sample_rate: частота дискретизации входного потока
+        frame_ms: длина кадра анализа
+        threshold_db: абсолютный порог речи (dBFS); кадр тише — всегда тишина
+        noise_margin_db: насколько кадр должен быть громче оценки шума
+        min_speech_ms: минимальная длительность речи для начала фразы
+        trailing_silence_ms: сколько тишины после речи закрывает фразу
+        max_utterance_s: принудительное закрытие слишком длинной фразы
+        full_scale: значение, соответствующее 0 dBFS во входных данных
+        """
+        self.sample_rate = sample_rate
+        self.frame_len = max(1, int(sample_rate * frame_ms / 1000))
+        self.threshold_db = threshold_db
+        self.noise_margin_db = noise_margin_db
+        self.min_speech_frames = max(1, int(min_speech_ms / frame_ms))
+        self.trailing_silence_frames = max(1, int(trailing_silence_ms / frame_ms))
+        self.max_utterance_samples = int(max_utterance_s * sample_rate)
+        self.full_scale = float(full_scale)
+        self.reset()
+
+    def reset(self):
+        self.noise_db = self.threshold_db - self.noise_margin_db
+        self.in_speech = False
+        self.speech_run = 0
+        self.silence_run = 0
+        self.utterance_start = 0
+        self.last_voiced_sample = 0
+        self.samples_seen = 0
+        self._remainder = np.zeros(0, dtype=np.float32)
+
+    def frame_db(self, frame):
+        rms = np.sqrt(np.mean(np.square(frame, dtype=np.float64)))
+        return 20.0 * np.log10(max(rms / self.full_scale, 1e-10))
+
+    def is_voiced(self, db):
+        return db > max(self.threshold_db, self.noise_db + self.noise_margin_db)
+
+    def _update_noise(self, db):
+        # Медленно следим за уровнем шума только на "тихих" кадрах
+        self.noise_db = 0.95 * self.noise_db + 0.05 * db
+
+    def process(self, chunk):
+        """
+        Обрабатывает очередной кусок аудио, возвращает список VADEvent.
+        """
+        if self._remainder.size:
+            chunk = np.concatenate([self._remainder, chunk])
+        n_frames = len(chunk) // self.frame_len
+        events = []
+
+        for i in range(n_frames):
+            frame = chunk[i * self.frame_len:(i + 1) * self.frame_len]
+            frame_end = self.samples_seen + self.frame_len
+            db = self.frame_db(frame)
+            voiced = self.is_voiced(db)
+
+            if not self.in_speech:
+                if voiced:
+                    self.speech_run += 1
+                    if self.speech_run >= self.min_speech_frames:
+                        self.in_speech = True
+                        self.silence_run = 0
+                        self.utterance_start = frame_end - self.speech_run * self.frame_len
+                        self.last_voiced_sample = frame_end
+                        events.append(VADEvent("start", self.utterance_start))
+                else:
+                    self.speech_run = 0
+                    self._update_noise(db)
+            else:
+                if voiced:
+                    self.silence_run = 0
+                    self.last_voiced_sample = frame_end
+                else:
+                    self.silence_run += 1
+
+                if self.silence_run >= self.trailing_silence_frames:
+                    events.append(VADEvent("end", frame_end, "silence"))
+                    self.in_speech = False
+                    self.speech_run = 0
+                elif frame_end - self.utterance_start >= self.max_utterance_samples:
+                    events.append(VADEvent("end", frame_end, "max_length"))
+                    # Речь продолжается: сразу открываем следующую фразу
+                    self.utterance_start = frame_end
+                    events.append(VADEvent("start", frame_end))
+
+            self.samples_seen = frame_end
+
+        self._remainder = chunk[n_frames * self.frame_len:].copy()
+        return events
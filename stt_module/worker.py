@@ -0,0 +1,275 @@
+"""
+Инференс Whisper в отдельном процессе.
+
+Захват с микрофона (PyAudio) остаётся в основном процессе и только пишет
+сэмплы в кольцо в shared memory. Воркер-процесс читает кольцо, выполняет
+VAD/endpointing и Whisper (собственный WhisperSTT) и возвращает результаты
+через очередь. Долгий model.transcribe больше не конкурирует с захватом за GIL.
+
+Протокол:
+    control: ("start", cascade, streaming) | ("stop", flush) | ("shutdown",)
+    results: ("ready", None) | ("partial", (committed, tentative, lang))
+             | ("final", (text, lang, stats)) | ("stopped", None) | ("error", message)
+"""
+import multiprocessing as mp
+import queue
+import threading
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from stt_module.ring_buffer import pcm16_to_float32
+
+_HEADER = 2  # int64: [0] записано сэмплов всего, [1] потеряно читателем (переполнение кольца)
+
+
+class SharedAudioRing:
+    """
+    Кольцо float32 в shared memory: один писатель (захват), один читатель (воркер).
+    Писатель никогда не ждёт: если читатель отстал больше чем на capacity,
+    старые сэмплы перезаписываются и учитываются в счётчике dropped.
+    """
+
+    def __init__(self, capacity, name=None):
+        self.capacity = int(capacity)
+        size = _HEADER * 8 + self.capacity * 4
+        self._owner = name is None
+        self._shm = shared_memory.SharedMemory(name=name, create=self._owner, size=size)
+        self._header = np.ndarray((_HEADER,), dtype=np.int64, buffer=self._shm.buf)
+        self._data = np.ndarray(
+            (self.capacity,), dtype=np.float32, buffer=self._shm.buf, offset=_HEADER * 8
+        )
+        if self._owner:
+            self._header[:] = 0
+        self.read_pos = int(self._header[0])
+
+    @property
+    def name(self):
+        return self._shm.name
+
+    @property
+    def total_written(self):
+        return int(self._header[0])
+
+    @property
+    def dropped(self):
+        return int(self._header[1])
+
+    def write_pcm16(self, pcm):
+        """
+        Пишет int16 PCM, конвертируя в float32 прямо в разделяемую память.
+        """
+        n = len(pcm)
+        if n > self.capacity:
+            pcm = pcm[-self.capacity:]
+            self._header[0] += n - self.capacity
+            n = self.capacity
+        head = int(self._header[0]) % self.capacity
+        first = min(n, self.capacity - head)
+        pcm16_to_float32(pcm[:first], out=self._data[head:head + first])
+        if first < n:
+            pcm16_to_float32(pcm[first:], out=self._data[:n - first])
+        # Счётчик двигаем после данных: читатель не увидит недописанный кусок
+        self._header[0] += n
+
+    def read(self):
+        """
+        Копия новых сэмплов с позиции read_pos (None, если новых нет).
+        """
+        total = int(self._header[0])
+        if total - self.read_pos > self.capacity:
+            self._header[1] += total - self.capacity - self.read_pos
+            self.read_pos = total - self.capacity
+        n = total - self.read_pos
+        if n <= 0:
+            return None
+        start = self.read_pos % self.capacity
+        first = min(n, self.capacity - start)
+        chunk = np.empty(n, dtype=np.float32)
+        chunk[:first] = self._data[start:start + first]
+        chunk[first:] = self._data[:n - first]
+        # Писатель мог обогнать нас во время копирования — такие сэмплы испорчены
+        lapped = int(self._header[0]) - self.capacity - self.read_pos
+        if lapped > 0:
+            self._header[1] += lapped
+            chunk = chunk[lapped:]
+        self.read_pos = total
+        return chunk if len(chunk) else None
+
+    def skip_to_end(self):
+        self.read_pos = int(self._header[0])
+
+    def close(self):
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
+
+def _worker_main(ring_name, capacity, stt_kwargs, control, results):
+    from stt_module.stt import WhisperSTT
+
+    ring = SharedAudioRing(capacity, name=ring_name)
+    try:
+        stt = WhisperSTT(**stt_kwargs)
+    except Exception as e:
+        results.put(("error", f"{type(e).__name__}: {e}"))
+        ring.close()
+        return
+    results.put(("ready", None))
+
+    def on_final(text, lang):
+        results.put(("final", (text, lang, stt.last_utterance_stats)))
+
+    def on_partial(committed, tentative, lang):
+        results.put(("partial", (committed, tentative, lang)))
+
+    try:
+        while True:
+            msg = control.get()
+            if msg[0] == "shutdown":
+                break
+            if msg[0] != "start":
+                continue
+
+            _, cascade, streaming = msg
+            stt.cascade = cascade
+            ring.skip_to_end()
+            stt.start_realtime_transcription(
+                callback=on_final, partial_callback=on_partial if streaming else None
+            )
+            while True:
+                chunk = ring.read()
+                if chunk is not None:
+                    stt.add_audio_chunk(chunk)
+                try:
+                    msg = control.get(timeout=0.02) if chunk is None else control.get_nowait()
+                except queue.Empty:
+                    continue
+                if msg[0] in ("stop", "shutdown"):
+                    # Добираем хвост, записанный до остановки захвата
+                    chunk = ring.read()
+                    if chunk is not None:
+                        stt.add_audio_chunk(chunk)
+                    stt._flush_on_stop = msg[0] == "stop" and msg[1]
+                    stt.stop_realtime_transcription()
+                    results.put(("stopped", None))
+                    break
+            if msg[0] == "shutdown":
+                break
+    finally:
+        ring.close()
+
+
+class InferenceWorker:
+    """
+    Родительская сторона: процесс-воркер с моделью, кольцо в shared memory
+    и поток-диспетчер, вызывающий callback'и в основном процессе.
+    Упавший процесс перезапускается при следующем start(); если и новый не
+    поднялся, start() бросает RuntimeError.
+    """
+
+    def __init__(self, stt_kwargs, capacity_s=30, sample_rate=16000, start_timeout=600):
+        self.ring = SharedAudioRing(int(capacity_s * sample_rate))
+        self.worker_kwargs = dict(stt_kwargs, inference_process=False, preload="eager")
+        self.start_timeout = start_timeout
+        self.restarts = 0
+        self.callback = None
+        self.partial_callback = None
+        self.utterance_event = threading.Event()
+        self.last_utterance_stats = None
+        self._stopped = threading.Event()
+        try:
+            self._spawn()
+        except RuntimeError:
+            self.ring.close()
+            raise
+
+    def _spawn(self):
+        # Свежие очереди на каждый процесс: в старых могут остаться команды мёртвому
+        ctx = mp.get_context("spawn")
+        self.control = ctx.Queue()
+        self.results = ctx.Queue()
+        self.process = ctx.Process(
+            target=_worker_main,
+            args=(self.ring.name, self.ring.capacity, self.worker_kwargs, self.control, self.results),
+            name="whisper-inference",
+            daemon=True,
+        )
+        self._ready = threading.Event()
+        self._error = None
+        self.process.start()
+        self._dispatcher = threading.Thread(
+            target=self._dispatch, args=(self.process, self.results), name="whisper-results", daemon=True
+        )
+        self._dispatcher.start()
+        if not self._ready.wait(self.start_timeout) or self._error:
+            self._stop_process()
+            raise RuntimeError(f"Whisper inference worker failed to start: {self._error}")
+
+    def _dispatch(self, process, results):
+        # process/results - свои для каждого запуска: после перезапуска старый поток просто завершается
+        while True:
+            try:
+                kind, payload = results.get(timeout=0.5)
+            except queue.Empty:
+                if not process.is_alive():
+                    self._error = self._error or f"worker exited with code {process.exitcode}"
+                    self._ready.set()
+                    self._stopped.set()
+                    return
+                continue
+            if kind == "ready":
+                self._ready.set()
+            elif kind == "error":
+                self._error = payload
+                self._ready.set()
+            elif kind == "partial" and self.partial_callback:
+                self.partial_callback(*payload)
+            elif kind == "final":
+                text, lang, self.last_utterance_stats = payload
+                if self.callback:
+                    self.callback(text, lang)
+                self.utterance_event.set()
+            elif kind == "stopped":
+                self._stopped.set()
+
+    @property
+    def alive(self):
+        return self.process.is_alive()
+
+    def start(self, callback=None, partial_callback=None, cascade=None):
+        if not self.alive:
+            print(f"[WARN] Whisper inference worker is down ({self._error}), restarting")
+            self.restarts += 1
+            self._spawn()
+        self.callback = callback
+        self.partial_callback = partial_callback
+        self.utterance_event.clear()
+        self._stopped.clear()
+        self.control.put(("start", cascade, partial_callback is not None))
+
+    def push_pcm(self, pcm):
+        self.ring.write_pcm16(pcm)
+
+    def stop(self, flush=True, timeout=60):
+        """
+        Останавливает текущую запись и ждёт, пока воркер отдаст последние результаты.
+        """
+        self.control.put(("stop", flush))
+        if not self._stopped.wait(timeout):
+            print("[WARN] Whisper inference worker did not stop in time")
+
+    @property
+    def dropped_samples(self):
+        return self.ring.dropped
+
+    def _stop_process(self, timeout=5):
+        if self.process.is_alive():
+            self.control.put(("shutdown",))
+            self.process.join(timeout)
+            if self.process.is_alive():
+                self.process.terminate()
+
+    def shutdown(self, timeout=5):
+        self._stop_process(timeout)
+        self.ring.close()
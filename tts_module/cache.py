@@ -0,0 +1,123 @@
+"""
+Дисковый кэш синтезированных фраз (content-addressed).
+
+Ключ — sha256 от отпечатка модели голоса и текста, значение — WAV (PCM int16)
+в cache_dir/<ключ>.wav, который плееры проигрывают напрямую. Размер каталога
+ограничен max_bytes; при переполнении удаляются давно не использованные
+файлы (LRU по времени последнего доступа, оно же mtime файла — переживает
+перезапуск).
+
+Кэш рассчитан на одного владельца (процесс TTS-воркера).
+"""
+import hashlib
+import os
+from collections import OrderedDict
+
+_fingerprints = {}
+
+
+def voice_fingerprint(voice_path):
+    """
+    sha256 содержимого модели голоса (пересчитывается, только если файл изменился).
+    Другая модель или её новая версия дают другие ключи.
+    """
+    voice_path = os.path.abspath(voice_path)
+    st = os.stat(voice_path)
+    stamp = (st.st_size, st.st_mtime_ns)
+    cached = _fingerprints.get(voice_path)
+    if cached and cached[0] == stamp:
+        return cached[1]
+    digest = hashlib.sha256()
+    with open(voice_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    _fingerprints[voice_path] = (stamp, digest.hexdigest())
+    return digest.hexdigest()
+
+
+def prompt_key(voice_path, text):
+    payload = voice_fingerprint(voice_path) + "\0" + " ".join(text.split())
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class PromptAudioCache:
+    def __init__(self, cache_dir, max_bytes=200 * 1024 * 1024):
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.max_bytes = int(max_bytes)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # ключ -> размер файла, от давно использованных к недавним
+        self._entries = OrderedDict()
+        self.total_bytes = 0
+        files = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".wav"):
+                st = os.stat(os.path.join(self.cache_dir, name))
+                files.append((st.st_mtime_ns, name[:-4], st.st_size))
+            elif name.endswith(".tmp"):
+                os.remove(os.path.join(self.cache_dir, name))  # недописанный при падении
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+            self.total_bytes += size
+
+    def path_for(self, key):
+        return os.path.join(self.cache_dir, key + ".wav")
+
+    def get(self, key):
+        """
+        Путь к WAV или None. Попадание обновляет позицию в LRU.
+        """
+        if key not in self._entries or not os.path.exists(self.path_for(key)):
+            if key in self._entries:
+                self.total_bytes -= self._entries.pop(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        os.utime(self.path_for(key))
+        self.hits += 1
+        return self.path_for(key)
+
+    def put(self, key, render):
+        """
+        render(tmp_path) пишет WAV во временный файл; затем он атомарно
+        становится записью кэша. Возвращает путь к записи.
+        """
+        path = self.path_for(key)
+        tmp = path + f".{os.getpid()}.tmp"
+        try:
+            render(tmp)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        size = os.path.getsize(path)
+        if key in self._entries:
+            self.total_bytes -= self._entries.pop(key)
+        self._entries[key] = size
+        self.total_bytes += size
+        self._evict(keep=key)
+        return path
+
+    def _evict(self, keep=None):
+        while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+            key, size = next(iter(self._entries.items()))
+            if key == keep:
+                break
+            self._entries.pop(key)
+            self.total_bytes -= size
+            try:
+                os.remove(self.path_for(key))
+            except FileNotFoundError:
+                pass
+            self.evictions += 1
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes": self.total_bytes,
+        }
@@ -1,15 +1,79 @@
 """Runner script to call PiperTTS in a separate process.
 
-This module is executed by `app/services/tts_service.py` via subprocess
-to isolate crashes in the native TTS stack from the main process.
+`python -m tts_module.runner "text" --voice model.onnx` synthesizes and plays
+one phrase. `play_wav` is also used by the long-lived worker
+(`tts_module/worker.py`) that `app/services/tts_service.py` talks to.
 """
 import argparse
 import logging
+import subprocess
 import sys
 
 from tts_module.tts import PiperTTS
 
 
+def play_wav(tmp: str, tts: PiperTTS, on_start=None) -> bool:
+    """
+    Play a WAV file with a platform system player, falling back to Python playback.
+
+    `on_start` is called right before a player is launched (time-to-first-audio).
+    Returns True if some player succeeded.
+    """
+    # choose player by platform
+    plat = sys.platform
+    player_cmds = []
+    if plat.startswith("darwin"):
+        # macOS: afplay
+        player_cmds = [["afplay", tmp]]
+    elif plat.startswith("linux"):
+        # Linux: try paplay (PulseAudio), aplay (ALSA), ffplay (ffmpeg), play (sox)
+        player_cmds = [
+            ["paplay", tmp],
+            ["aplay", tmp],
+            ["ffplay", "-nodisp", "-autoexit", tmp],
+            ["play", tmp],
+        ]
+    elif plat.startswith("win") or plat.startswith("cygwin"):
+        # Windows: use PowerShell SoundPlayer sync call
+        ps_cmd = [
+            "powershell",
+            "-Command",
+            f"(New-Object Media.SoundPlayer '{tmp}').PlaySync();",
+        ]
+        player_cmds = [ps_cmd]
+    else:
+        player_cmds = []
+
+    played = False
+    last_exc = None
+    for cmd in player_cmds:
+        try:
+            if on_start:
+                on_start()
+            # On some players (ffplay) we don't need output, so allow it
+            subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            played = True
+            break
+        except FileNotFoundError as fe:
+            last_exc = fe
+            continue
+        except subprocess.CalledProcessError as cpe:
+            last_exc = cpe
+            continue
+
+    if not played:
+        logging.warning("No suitable system player found or playback failed: %s; falling back to Python playback", last_exc)
+        # final fallback: use Python playback which may load native libs
+        try:
+            if on_start:
+                on_start()
+            tts.play_file(tmp)
+            played = True
+        except Exception:
+            logging.exception("Fallback Python playback failed")
+    return played
+
+
 def main(argv=None) -> int:
     parser = argparse.ArgumentParser(description="TTS runner")
     parser.add_argument("text", help="Text to speak")
@@ -18,7 +82,6 @@ def main(argv=None) -> int:
 
     import tempfile
     import os
-    import subprocess
 
     try:
         tts = PiperTTS(voice=args.voice)
@@ -31,55 +94,7 @@ def main(argv=None) -> int:
         try:
             tts.synthesize_to_file(args.text, tmp, voice=args.voice)
 
-            # choose player by platform
-            plat = sys.platform
-            player_cmds = []
-            if plat.startswith("darwin"):
-                # macOS: afplay
-                player_cmds = [["afplay", tmp]]
-            elif plat.startswith("linux"):
-                # Linux: try paplay (PulseAudio), aplay (ALSA), ffplay (ffmpeg), play (sox)
-                player_cmds = [
-                    ["paplay", tmp],
-                    ["aplay", tmp],
-                    ["ffplay", "-nodisp", "-autoexit", tmp],
-                    ["play", tmp],
-                ]
-            elif plat.startswith("win") or plat.startswith("cygwin"):
-                # Windows: use PowerShell SoundPlayer sync call
-                ps_cmd = [
-                    "powershell",
-                    "-Command",
-                    f"(New-Object Media.SoundPlayer '{tmp}').PlaySync();",
-                ]
-                player_cmds = [ps_cmd]
-            else:
-                player_cmds = []
-
-            played = False
-            last_exc = None
-            for cmd in player_cmds:
-                try:
-                    # On some players (ffplay) we don't need output, so allow it
-                    subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-                    played = True
-                    break
-                except FileNotFoundError as fe:
-                    last_exc = fe
-                    continue
-                except subprocess.CalledProcessError as cpe:
-                    last_exc = cpe
-                    continue
-
-            if not played:
-                logging.warning("No suitable system player found or playback failed: %s; falling back to Python playback", last_exc)
-                # final fallback: use Python playback which may load native libs
-                try:
-                    tts.play_file(tmp)
-                    played = True
-                except Exception:
-                    logging.exception("Fallback Python playback failed")
-
+            play_wav(tmp, tts)
         finally:
             if os.path.exists(tmp):
                 os.remove(tmp)
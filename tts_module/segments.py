@@ -0,0 +1,61 @@
+"""
+Склейка фразы из заранее синтезированных фрагментов.
+
+Фраза-шаблон ("Is your license plate: {PLATE} correct?") озвучивается как
+последовательность сегментов: статичные куски берутся из кэша, слоты
+синтезируются на лету. Piper добавляет тишину по краям каждого синтеза,
+поэтому края сегментов подрезаются, а стыки сглаживаются коротким
+кроссфейдом, чтобы не было щелчков.
+"""
+import numpy as np
+
+
+def trim_silence(pcm, threshold=300, pad=160):
+    """
+    Срезает тишину (|x| < threshold) по краям int16-сигнала, оставляя pad сэмплов.
+    Возвращает view без копии.
+    """
+    loud = np.flatnonzero(np.abs(pcm) >= threshold)
+    if len(loud) == 0:
+        return pcm[:0]
+    start = max(0, loud[0] - pad)
+    end = min(len(pcm), loud[-1] + 1 + pad)
+    return pcm[start:end]
+
+
+def crossfade_join(segments, fade):
+    """
+    Генератор int16-блоков: сегменты идут подряд, на стыке последние `fade`
+    сэмплов предыдущего сегмента смешиваются с первыми `fade` следующего
+    (линейный кроссфейд).
+
+    segments — итерируемое (pcm, gap_before); при gap_before > 0 вместо
+    кроссфейда вставляется пауза в gap_before сэмплов (например, между
+    буквами номера, произносимого по буквам). Блок отдаётся, как только он
+    не может измениться, поэтому проигрывание начинается до готовности
+    следующих сегментов.
+    """
+    tail = None
+    ramp = np.linspace(0.0, 1.0, fade, dtype=np.float32) if fade > 0 else None
+    for pcm, gap_before in segments:
+        if len(pcm) == 0:
+            continue
+        if tail is None:
+            head = pcm
+        elif gap_before or ramp is None or len(tail) < fade or len(pcm) < fade:
+            yield tail
+            if gap_before:
+                yield np.zeros(gap_before, dtype=np.int16)
+            head = pcm
+        else:
+            mixed = tail.astype(np.float32) * ramp[::-1] + pcm[:fade].astype(np.float32) * ramp
+            yield np.clip(mixed, -32768, 32767).astype(np.int16)
+            head = pcm[fade:]
+        # Хвост придерживаем до следующего сегмента
+        if fade > 0 and len(head) > fade:
+            yield head[:-fade]
+            tail = head[-fade:]
+        else:
+            tail = head
+    if tail is not None and len(tail):
+        yield tail
@@ -15,13 +15,22 @@ piper_tts_module.py
     tts.play_file("out.wav")
 
     tts.synth_and_play("Hello world!")
+    tts.stream_speak("Hello world!")   # без WAV: чанки сразу в аудиоустройство
 """
 import threading
 
 import os
+import time
 import wave
 import tempfile
 from typing import Optional
+
+import numpy as np
+# PyAudio для потокового вывода (уже нужен STT для захвата микрофона)
+try:
+    import pyaudio
+except ImportError:
+    pyaudio = None
 # pygame for playback; winsound as a minimal built-in fallback on Windows
 try:
     import pygame
@@ -42,7 +51,24 @@ class PiperTTS:
         sample_rate: частота дискретизации выходного WAV-файла
         """
         self.voice = voice
+        self._voices = {}
+        self._pa = None
+        self._streams = {}  # (sample_rate, device) -> открытый выходной поток
 
+    def load_voice(self, voice: Optional[str] = None) -> PiperVoice:
+        """
+        Загружает модель голоса один раз и держит её в памяти процесса.
+        """
+        model_path = voice or self.voice
+        if model_path is None:
+            raise RuntimeError(
+                "Не указан путь к модели (.onnx). Передайте voice='model.onnx' в PiperTTS()."
+            )
+        voice_obj = self._voices.get(model_path)
+        if voice_obj is None:
+            voice_obj = PiperVoice.load(model_path)
+            self._voices[model_path] = voice_obj
+        return voice_obj
 
     def synthesize_to_file(self, text: str, out_path: str, voice: Optional[str] = None) -> str:
         """
@@ -51,15 +77,9 @@ class PiperTTS:
         out_path = os.path.abspath(out_path)
         os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
 
-        model_path = voice or self.voice
-        if model_path is None:
-            raise RuntimeError(
-                "Не указан путь к модели (.onnx). Передайте voice='model.onnx' в PiperTTS()."
-            )
+        # Загружаем модель (один раз на процесс)
+        voice_obj = self.load_voice(voice)
 
-        # Загружаем модель
-        voice_obj = PiperVoice.load(model_path)
-    
         # Синтезируем
         audio = voice_obj.synthesize(text)
 
@@ -97,6 +117,132 @@ class PiperTTS:
         else:
             raise RuntimeError("Audio playback unavailable: install pygame or run on Windows with winsound.")
 
+    def open_output(self, rate, device=None):
+        """
+        Выходной поток PyAudio на частоту модели; открывается один раз и
+        переиспользуется, чтобы не платить за открытие устройства на каждую фразу.
+        device: индекс выходного устройства PyAudio (None - по умолчанию).
+        """
+        if pyaudio is None:
+            raise RuntimeError("Streaming playback unavailable: install pyaudio.")
+        stream = self._streams.get((rate, device))
+        if stream is None:
+            if self._pa is None:
+                self._pa = pyaudio.PyAudio()
+            stream = self._pa.open(
+                format=pyaudio.paInt16, channels=1, rate=rate, output=True, output_device_index=device
+            )
+            self._streams[(rate, device)] = stream
+        return stream
+
+    def stream_speak(self, text: str, voice: Optional[str] = None, on_first_sample=None,
+                     should_stop=None, device=None) -> dict:
+        """
+        Синтезирует и сразу проигрывает: каждый чанк Piper пишется в выходной
+        поток, как только готов, без WAV и файловой системы. Буфер чанка
+        передаётся как read-only memoryview — без копии в bytes (PyAudio
+        принимает только read-only буферы, отсюда toreadonly()).
+
+        on_first_sample вызывается перед записью первого чанка.
+        Возвращает {"first_sample_s", "total_s", "samples", "interrupted"} от начала вызова.
+        """
+        voice_obj = self.load_voice(voice)
+        blocks = (chunk.audio_int16_array for chunk in voice_obj.synthesize(text))
+        return self.stream_pcm(
+            blocks, voice_obj.config.sample_rate,
+            on_first_sample=on_first_sample, should_stop=should_stop, device=device,
+        )
+
+    def stream_pcm(self, blocks, rate: int, on_first_sample=None, should_stop=None,
+                   write_frames: int = 2048, device=None) -> dict:
+        """
+        Пишет int16-блоки (numpy) в выходной поток по мере их появления.
+        Блоки пишутся кусками по write_frames (срезы memoryview, без копий),
+        между ними проверяется should_stop() — прерывание (barge-in) срабатывает
+        за ~write_frames сэмплов, а не в конце длинного чанка.
+        device - выходное устройство (open_output).
+        Возвращает {"first_sample_s", "total_s", "samples", "interrupted"} от начала вызова.
+        """
+        started = time.perf_counter()
+        stream = self.open_output(rate, device)
+
+        first_sample_s = None
+        samples = 0
+        interrupted = False
+        for pcm in blocks:
+            if not len(pcm):
+                continue
+            if first_sample_s is None:
+                first_sample_s = time.perf_counter() - started
+                if on_first_sample:
+                    on_first_sample()
+            # write блокируется, пока устройство не примет данные, —
+            # следующий блок готовится сразу после
+            view = memoryview(np.ascontiguousarray(pcm)).cast("B").toreadonly()
+            for offset in range(0, len(pcm), write_frames):
+                if should_stop is not None and should_stop():
+                    interrupted = True
+                    break
+                part = view[offset * 2:(offset + write_frames) * 2]
+                stream.write(part, len(part) // 2)
+                samples += len(part) // 2
+            if interrupted:
+                break
+        return {
+            "first_sample_s": first_sample_s,
+            "total_s": time.perf_counter() - started,
+            "samples": samples,
+            "interrupted": interrupted,
+        }
+
+    def synthesize_pcm(self, text: str, voice: Optional[str] = None):
+        """
+        Синтезирует фразу в память: (int16 numpy-массив, sample_rate).
+        """
+        voice_obj = self.load_voice(voice)
+        chunks = [chunk.audio_int16_array for chunk in voice_obj.synthesize(text)]
+        pcm = np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.int16)
+        return pcm, voice_obj.config.sample_rate
+
+    @staticmethod
+    def write_wav(path: str, blocks, rate: int) -> str:
+        """
+        Пишет int16-блоки в WAV (mono).
+        """
+        with wave.open(path, "wb") as wf:
+            wf.setnchannels(1)
+            wf.setsampwidth(2)
+            wf.setframerate(rate)
+            for pcm in blocks:
+                wf.writeframes(np.ascontiguousarray(pcm).tobytes())
+        return path
+
+    @staticmethod
+    def read_pcm(path: str):
+        """
+        Читает WAV (int16 mono) в память: (int16 numpy-массив, sample_rate).
+        """
+        with wave.open(path, "rb") as wf:
+            return np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16), wf.getframerate()
+
+    def stream_file(self, path: str, on_first_sample=None, should_stop=None, device=None) -> dict:
+        """
+        Проигрывает WAV (int16 mono, например из кэша фраз) через тот же выходной поток.
+        """
+        pcm, rate = self.read_pcm(path)
+        return self.stream_pcm(
+            [pcm], rate, on_first_sample=on_first_sample, should_stop=should_stop, device=device
+        )
+
+    def close(self) -> None:
+        for stream in self._streams.values():
+            stream.stop_stream()
+            stream.close()
+        self._streams.clear()
+        if self._pa is not None:
+            self._pa.terminate()
+            self._pa = None
+
     def synth_and_play(self, text: str, voice: Optional[str] = None) -> None:
         """
         Синтезирует текст во временный файл и сразу воспроизводит его.
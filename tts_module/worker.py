@@ -0,0 +1,357 @@
+"""
+Долгоживущий процесс синтеза речи (Piper).
+
+Нативный стек TTS (onnxruntime, аудио-библиотеки) может уронить процесс,
+поэтому синтез и воспроизведение остаются в отдельном процессе — но теперь
+он один на всё приложение: интерпретатор, импорт piper и PiperVoice.load
+оплачиваются один раз, а не на каждую фразу. Если процесс падает,
+TTSWorker перезапускает его при следующем запросе.
+
+Статичные фразы (cache=True) берутся из дискового кэша tts_module.cache:
+синтез только при промахе, op "render" заполняет кэш без воспроизведения.
+
+По умолчанию звук идёт потоком в выходное устройство PyAudio (чанки Piper
+пишутся по мере синтеза, без временного WAV и запуска плеера). Если
+устройство не открылось при старте, воркер работает через WAV + системный плеер.
+
+op "speak_segments" озвучивает фразу-шаблон по сегментам: статичные куски
+(cache=True) — из кэша, слоты — синтез на лету; сегменты подрезаются по
+тишине и склеиваются кроссфейдом (tts_module.segments).
+
+Протокол (multiprocessing.Pipe, словари):
+    запрос: {"id", "op": "load" | "speak" | "render" | "speak_segments", "voice", "text", "cache",
+             "segments": [{"text", "cache", "gap_ms"}], "crossfade_ms",
+             "device"}                                 # выходное устройство PyAudio или None
+    ответы: {"id", "event": "playing"}              # перед запуском плеера
+            {"id", "event": "done", "synth_s", "played", "mode", "cache", "cache_stats",
+             "segments": {"hits", "misses", "synth"}, "interrupted", "error"}
+    прерывание: общий mp.Value с id запроса, который надо оборвать (TTSWorker.interrupt);
+                воркер сверяет его с id своего запроса между блоками вывода
+"""
+import collections
+import logging
+import multiprocessing as mp
+import os
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def _cached_render(tts, cache, req, reply):
+    """
+    Путь к WAV фразы из кэша; при промахе синтезирует её в кэш.
+    """
+    from tts_module.cache import prompt_key
+
+    key = prompt_key(req.get("voice") or tts.voice, req["text"])
+    path = cache.get(key)
+    reply["cache"] = "hit" if path else "miss"
+    if path is None:
+        started = time.perf_counter()
+        path = cache.put(
+            key, lambda tmp: tts.synthesize_to_file(req["text"], tmp, voice=req.get("voice"))
+        )
+        reply["synth_s"] = time.perf_counter() - started
+    reply["cache_stats"] = cache.stats()
+    return path
+
+
+def _segment_blocks(tts, cache, req, reply, rate):
+    """
+    Генератор int16-блоков фразы-шаблона для crossfade_join: сегменты
+    готовятся по одному, так что первый звучит, пока синтезируется следующий.
+    """
+    from tts_module.segments import crossfade_join, trim_silence
+
+    counts = reply["segments"] = {"hits": 0, "misses": 0, "synth": 0}
+    synth_s = 0.0
+
+    def pcm_segments():
+        nonlocal synth_s
+        for seg in req["segments"]:
+            started = time.perf_counter()
+            if cache is not None and seg.get("cache"):
+                seg_reply = {}
+                path = _cached_render(tts, cache, {"text": seg["text"], "voice": req.get("voice")}, seg_reply)
+                counts["hits" if seg_reply["cache"] == "hit" else "misses"] += 1
+                reply["cache_stats"] = seg_reply["cache_stats"]
+                pcm, _ = tts.read_pcm(path)
+            else:
+                counts["synth"] += 1
+                pcm, _ = tts.synthesize_pcm(seg["text"], voice=req.get("voice"))
+            synth_s += time.perf_counter() - started
+            reply["synth_s"] = synth_s
+            yield trim_silence(pcm), int(seg.get("gap_ms", 0) * rate / 1000)
+
+    fade = int(req.get("crossfade_ms", 20) * rate / 1000)
+    yield from crossfade_join(pcm_segments(), fade)
+    reply["cache"] = "miss" if counts["misses"] or counts["synth"] else "hit"
+
+
+def _worker_main(conn, voices, cache_dir=None, cache_max_bytes=None, streaming=True, stop_id=None):
+    from tts_module.cache import PromptAudioCache
+    from tts_module.runner import play_wav
+    from tts_module.tts import PiperTTS
+
+    tts = PiperTTS(voice=voices[0] if voices else None)
+    for voice in voices:
+        tts.load_voice(voice)
+    cache = PromptAudioCache(cache_dir, cache_max_bytes) if cache_dir else None
+    if streaming and voices:
+        # Устройство открываем сразу: и проверка, и первая фраза без задержки на open
+        try:
+            tts.open_output(tts.load_voice().config.sample_rate)
+        except Exception:
+            logger.exception("TTS streaming output unavailable, falling back to WAV players")
+            streaming = False
+    conn.send({"id": None, "event": "ready"})
+
+    while True:
+        try:
+            req = conn.recv()
+        except EOFError:
+            break
+        if req is None:
+            break
+
+        reply = {"id": req["id"], "event": "done", "synth_s": None, "played": False,
+                 "mode": None, "cache": None, "cache_stats": None, "segments": None,
+                 "interrupted": False, "error": None}
+
+        def on_start():
+            conn.send({"id": req["id"], "event": "playing"})
+
+        def should_stop():
+            return stop_id is not None and stop_id.value == req["id"]
+
+        try:
+            use_cache = cache is not None and req.get("cache")
+            if req["op"] == "load":
+                tts.load_voice(req.get("voice"))
+            elif req["op"] == "render":
+                if use_cache:
+                    _cached_render(tts, cache, req, reply)
+            elif req["op"] == "speak" and use_cache:
+                path = _cached_render(tts, cache, req, reply)
+                if streaming:
+                    played = tts.stream_file(
+                        path, on_first_sample=on_start, should_stop=should_stop, device=req.get("device")
+                    )
+                    reply.update(played=True, mode="stream", interrupted=played["interrupted"])
+                else:
+                    reply.update(played=play_wav(path, tts, on_start=on_start), mode="file")
+            elif req["op"] == "speak":
+                if streaming:
+                    played = tts.stream_speak(
+                        req["text"], voice=req.get("voice"), on_first_sample=on_start, should_stop=should_stop,
+                        device=req.get("device"),
+                    )
+                    reply.update(played=True, mode="stream", interrupted=played["interrupted"])
+                else:
+                    reply["mode"] = "file"
+                    fd, tmp = tempfile.mkstemp(suffix=".wav")
+                    os.close(fd)
+                    try:
+                        started = time.perf_counter()
+                        tts.synthesize_to_file(req["text"], tmp, voice=req.get("voice"))
+                        reply["synth_s"] = time.perf_counter() - started
+                        reply["played"] = play_wav(tmp, tts, on_start=on_start)
+                    finally:
+                        if os.path.exists(tmp):
+                            os.remove(tmp)
+            elif req["op"] == "speak_segments":
+                rate = tts.load_voice(req.get("voice")).config.sample_rate
+                blocks = _segment_blocks(tts, cache, req, reply, rate)
+                if streaming:
+                    played = tts.stream_pcm(
+                        blocks, rate, on_first_sample=on_start, should_stop=should_stop, device=req.get("device")
+                    )
+                    reply.update(played=True, mode="stream", interrupted=played["interrupted"])
+                else:
+                    reply["mode"] = "file"
+                    fd, tmp = tempfile.mkstemp(suffix=".wav")
+                    os.close(fd)
+                    try:
+                        tts.write_wav(tmp, list(blocks), rate)
+                        reply["played"] = play_wav(tmp, tts, on_start=on_start)
+                    finally:
+                        if os.path.exists(tmp):
+                            os.remove(tmp)
+            else:
+                reply["error"] = f"unknown op {req['op']!r}"
+        except Exception as e:
+            logger.exception("TTS worker request failed")
+            reply["error"] = f"{type(e).__name__}: {e}"
+        conn.send(reply)
+    tts.close()
+
+
+class TTSWorker:
+    """
+    Родительская сторона: процесс с загруженными голосами и pipe к нему.
+    Запросы сериализуются (один говорящий), падение процесса — перезапуск.
+    Процесс запускается при первом запросе, а не в конструкторе: если голос
+    не грузится, приложение всё равно стартует, а каждый запрос возвращает
+    ошибку (start_error) — как и до постоянного воркера.
+    """
+
+    def __init__(self, voices=(), cache_dir=None, cache_max_bytes=200 * 1024 * 1024,
+                 streaming=True, start_timeout=120):
+        self.voices = [v for v in voices if v]
+        self.streaming = streaming
+        self.cache_dir = cache_dir
+        self.cache_max_bytes = cache_max_bytes
+        self.start_timeout = start_timeout
+        self.restarts = 0
+        self.start_error = None  # последняя ошибка запуска процесса
+        self.process = None
+        self._conn = None
+        self._lock = threading.Lock()
+        self._next_id = 0
+        # Прерывание адресное: id запроса, который надо оборвать (ids не повторяются,
+        # поэтому значение никогда не сбрасывается); token - фраза вызывающего
+        self._stop_id = mp.get_context("spawn").Value("q", 0, lock=False)
+        self._state_lock = threading.Lock()
+        self._playing = None  # (token, id) запроса, отправленного воркеру
+        self._cancelled = collections.OrderedDict()  # token -> прерван до отправки
+
+    def _start(self):
+        ctx = mp.get_context("spawn")
+        parent_conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_worker_main,
+            args=(child_conn, self.voices, self.cache_dir, self.cache_max_bytes, self.streaming,
+                  self._stop_id),
+            name="piper-tts", daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self._conn = parent_conn
+        if not parent_conn.poll(self.start_timeout):
+            self._kill()
+            raise RuntimeError("TTS worker did not start in time")
+        try:
+            parent_conn.recv()
+        except EOFError:
+            self.process.join(5)
+            code = self.process.exitcode
+            self._kill()
+            raise RuntimeError(f"TTS worker failed to start (exit code {code})")
+
+    def _kill(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+        if self.process is not None and self.process.is_alive():
+            self.process.terminate()
+            self.process.join(5)
+
+    def _ensure_alive(self):
+        if self.process is not None and self.process.is_alive() and self._conn is not None:
+            return
+        if self.process is not None:
+            logger.warning("TTS worker is down (exit code %s), restarting", self.process.exitcode)
+            self._kill()
+            self.restarts += 1
+        try:
+            self._start()
+        except RuntimeError as e:
+            self.process = None  # следующий запрос - снова первый запуск
+            self.start_error = str(e)
+            raise
+        self.start_error = None
+
+    def request(self, op, text=None, voice=None, cache=False, segments=None, crossfade_ms=20, timeout=120,
+                token=None, device=None):
+        """
+        Выполняет запрос и ждёт "done". token - метка фразы для interrupt(token):
+        прерывание, пришедшее, пока запрос ждал своей очереди, не теряется -
+        фраза тогда не играет вовсе (interrupted=True). device - выходное
+        устройство PyAudio (только потоковый режим). Возвращает статистику:
+        first_audio_s (от запроса до первого сэмпла / старта плеера), total_s,
+        synth_s, played, mode ("stream" / "file"), cache ("hit" / "miss" / None),
+        cache_stats, segments (счётчики по сегментам для speak_segments),
+        interrupted, error.
+        Упавший во время запроса процесс перезапускается; сама фраза не повторяется.
+        """
+        with self._lock:
+            started = time.perf_counter()
+            stats = {"first_audio_s": None, "total_s": None, "synth_s": None,
+                     "played": False, "mode": None, "cache": None, "cache_stats": None,
+                     "segments": None, "interrupted": False, "error": None}
+            try:
+                self._ensure_alive()
+            except RuntimeError as e:
+                stats["error"] = f"RuntimeError: {e}"
+                stats["total_s"] = time.perf_counter() - started
+                logger.error("TTS worker unavailable for %s request: %s", op, e)
+                return stats
+            self._next_id += 1
+            req_id = self._next_id
+            with self._state_lock:
+                if token is not None and self._cancelled.pop(token, False):
+                    stats.update(interrupted=True, total_s=time.perf_counter() - started)
+                    return stats
+                self._playing = (token, req_id)
+            try:
+                self._conn.send({
+                    "id": req_id, "op": op, "text": text, "voice": voice, "cache": cache,
+                    "segments": segments, "crossfade_ms": crossfade_ms, "device": device,
+                })
+                while True:
+                    if not self._conn.poll(timeout):
+                        raise TimeoutError(f"no reply from TTS worker in {timeout}s")
+                    msg = self._conn.recv()
+                    if msg["id"] != req_id:
+                        continue  # хвост запроса, прерванного таймаутом
+                    if msg["event"] == "playing":
+                        if stats["first_audio_s"] is None:
+                            stats["first_audio_s"] = time.perf_counter() - started
+                    elif msg["event"] == "done":
+                        stats.update(
+                            synth_s=msg["synth_s"], played=msg["played"], mode=msg["mode"],
+                            cache=msg["cache"],
+                            cache_stats=msg["cache_stats"], segments=msg["segments"],
+                            interrupted=msg["interrupted"], error=msg["error"],
+                        )
+                        if not msg["played"]:
+                            stats["first_audio_s"] = None  # плееры запускались, но звука не было
+                        break
+            except (EOFError, OSError, TimeoutError) as e:
+                stats["error"] = f"{type(e).__name__}: {e}"
+                logger.error("TTS worker lost during %s request: %s", op, stats["error"])
+                self._kill()
+            finally:
+                with self._state_lock:
+                    self._playing = None
+            stats["total_s"] = time.perf_counter() - started
+            return stats
+
+    def interrupt(self, token=None):
+        """
+        Прерывает потоковое воспроизведение фразы token (barge-in); без token -
+        то, что играет сейчас. Фразы других вызывающих (дорожек) не трогает.
+        Если фраза token ещё ждёт очереди к воркеру, она отменяется и не
+        зазвучит. Не берёт lock запросов: вызывается из другого потока, пока
+        request ждёт ответа. Системный плеер (mode "file") не прерывается.
+        """
+        with self._state_lock:
+            playing = self._playing
+            if playing is not None and (token is None or playing[0] == token):
+                self._stop_id.value = playing[1]
+            elif token is not None:
+                self._cancelled[token] = True
+                while len(self._cancelled) > 256:  # прерывания уже сыгранных фраз
+                    self._cancelled.popitem(last=False)
+
+    def close(self, timeout=5):
+        with self._lock:
+            if self._conn is not None and self.process.is_alive():
+                try:
+                    self._conn.send(None)
+                except OSError:
+                    pass
+                self.process.join(timeout)
+            self._kill()